@@ -0,0 +1,273 @@
+"""Near-duplicate detection of documents with MinHash and LSH.
+
+The OCR text of a document is reduced to the set of its word 3-grams
+(shingles), hashed by ``NUM_PERM`` universal hash functions to keep the
+minimum of each: the fraction of equal MinHash values between two
+documents estimates the Jaccard similarity of their shingle sets.
+
+Signatures are cut into ``BANDS`` bands of ``ROWS`` values. Documents
+sharing at least one band bucket are candidates, so a lookup is a single
+indexed query instead of a comparison with the whole corpus.
+"""
+
+import hashlib
+import re
+import zlib
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.documents.models import Document, DocumentSignature, SignatureBand
+from apps.documents.utils.cache_utils import bump_generation
+
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+
+# Shorter texts are too small to compare reliably
+MIN_SHINGLES = 10
+
+WORD_RE = re.compile(r'\w+')
+
+# Fixed multiply-shift hash parameters, identical in every process
+_rng = np.random.default_rng(20240521)
+_A = _rng.integers(1, 2 ** 63, NUM_PERM, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_B = _rng.integers(0, 2 ** 63, NUM_PERM, dtype=np.uint64)
+
+
+def get_threshold():
+    """Return the estimated similarity above which documents are duplicates."""
+    return getattr(settings, 'DEDUP_THRESHOLD', 0.8)
+
+
+def shingle_hashes(text):
+    """Return the 32-bit hashes of the word 3-grams of a text."""
+    words = WORD_RE.findall((text or '').lower())
+    if len(words) < SHINGLE_SIZE:
+        shingles = {' '.join(words)} if words else set()
+    else:
+        shingles = {
+            ' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)
+        }
+    return np.fromiter(
+        (zlib.crc32(shingle.encode('utf-8')) for shingle in shingles),
+        dtype=np.uint64, count=len(shingles)
+    )
+
+
+def minhash(text, chunk_size=4096):
+    """
+    Compute the MinHash signature of a text.
+
+    Returns:
+        uint32 array of NUM_PERM values, or None for texts too short to compare
+    """
+    hashes = shingle_hashes(text)
+    if len(hashes) < MIN_SHINGLES:
+        return None
+
+    signature = np.full(NUM_PERM, np.iinfo(np.uint32).max, dtype=np.uint64)
+    for start in range(0, len(hashes), chunk_size):
+        chunk = hashes[start:start + chunk_size, None]
+        # (a * x + b) mod 2^64, keeping the high 32 bits
+        permuted = (chunk * _A + _B) >> np.uint64(32)
+        np.minimum(signature, permuted.min(axis=0), out=signature)
+    return signature.astype(np.uint32)
+
+
+def band_buckets(signature):
+    """Return the LSH bucket of every band of a signature."""
+    return [
+        int.from_bytes(
+            hashlib.blake2b(signature[band * ROWS:(band + 1) * ROWS].tobytes(), digest_size=8).digest(),
+            'little', signed=True
+        )
+        for band in range(BANDS)
+    ]
+
+
+def similarity(signature, other):
+    """Estimate the Jaccard similarity of two signatures."""
+    return float(np.mean(signature == other))
+
+
+def to_bytes(signature):
+    return signature.astype('<u4').tobytes()
+
+
+def from_bytes(data):
+    return np.frombuffer(bytes(data), dtype='<u4')
+
+
+def save_signature(document_id, signature):
+    """Store a document's signature and LSH buckets, replacing older ones."""
+    with transaction.atomic():
+        DocumentSignature.objects.update_or_create(
+            document_id=document_id, defaults={'minhash': to_bytes(signature)}
+        )
+        SignatureBand.objects.filter(document_id=document_id).delete()
+        SignatureBand.objects.bulk_create([
+            SignatureBand(document_id=document_id, band=band, bucket=bucket)
+            for band, bucket in enumerate(band_buckets(signature))
+        ])
+
+
+def find_original(document_id, signature, threshold=None):
+    """
+    Find the earlier document a signature is a near-duplicate of.
+
+    Only documents with a lower id are considered, so the first copy
+    ingested is always the original.
+
+    Returns:
+        (document_id, similarity) of the closest match, or (None, None)
+    """
+    threshold = get_threshold() if threshold is None else threshold
+    lookup = Q()
+    for band, bucket in enumerate(band_buckets(signature)):
+        lookup |= Q(band=band, bucket=bucket)
+
+    candidate_ids = set(
+        SignatureBand.objects.filter(lookup, document_id__lt=document_id)
+        .values_list('document_id', flat=True)
+    )
+    best_id, best_similarity = None, None
+    for candidate_id, data in DocumentSignature.objects.filter(
+        document_id__in=candidate_ids
+    ).values_list('document_id', 'minhash'):
+        score = similarity(signature, from_bytes(data))
+        if score >= threshold and (best_similarity is None or score > best_similarity):
+            best_id, best_similarity = candidate_id, score
+    return best_id, best_similarity
+
+
+def check_document(document, text):
+    """
+    Sign a document's OCR text and record whether it is a near-duplicate.
+
+    Sets ``duplicate_of`` and ``duplicate_similarity`` on the instance;
+    the caller saves it.
+    """
+    signature = minhash(text)
+    if signature is None:
+        SignatureBand.objects.filter(document_id=document.id).delete()
+        DocumentSignature.objects.filter(document_id=document.id).delete()
+        document.duplicate_of_id, document.duplicate_similarity = None, None
+        return
+
+    save_signature(document.id, signature)
+    document.duplicate_of_id, document.duplicate_similarity = find_original(document.id, signature)
+
+
+def scan_documents(batch_size=500, threshold=None, log=print):
+    """
+    Sign every document with OCR text and flag the near-duplicates.
+
+    The corpus is streamed in id order, one batch at a time: each batch is
+    signed, stored and matched against the documents stored before it with
+    a single band lookup, then its duplicate flags are written in bulk.
+
+    Returns:
+        dict with the number of scanned documents and duplicates found
+    """
+    from apps.documents.models import DocumentOCR
+
+    threshold = get_threshold() if threshold is None else threshold
+    rows = (
+        DocumentOCR.objects.exclude(full_text='')
+        .order_by('document_id')
+        .values_list('document_id', 'full_text')
+        .iterator(chunk_size=batch_size)
+    )
+
+    scanned = 0
+    duplicates = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            duplicates += _scan_batch(batch, threshold)
+            scanned += len(batch)
+            batch = []
+            log(f"Scanned {scanned} documents, {duplicates} near-duplicates")
+    if batch:
+        duplicates += _scan_batch(batch, threshold)
+        scanned += len(batch)
+
+    # bulk_update bypasses the signals invalidating cached responses
+    bump_generation('documents')
+    return {"scanned": scanned, "duplicates": duplicates}
+
+
+def _scan_batch(batch, threshold):
+    """Sign, store and match one batch of (document_id, text) rows."""
+    signatures = {}
+    for document_id, text in batch:
+        signature = minhash(text)
+        if signature is not None:
+            signatures[document_id] = signature
+    buckets = {document_id: band_buckets(signature) for document_id, signature in signatures.items()}
+    batch_ids = [document_id for document_id, _ in batch]
+
+    with transaction.atomic():
+        SignatureBand.objects.filter(document_id__in=batch_ids).delete()
+        DocumentSignature.objects.filter(document_id__in=batch_ids).delete()
+        DocumentSignature.objects.bulk_create([
+            DocumentSignature(document_id=document_id, minhash=to_bytes(signature))
+            for document_id, signature in signatures.items()
+        ])
+        SignatureBand.objects.bulk_create([
+            SignatureBand(document_id=document_id, band=band, bucket=bucket)
+            for document_id, document_buckets in buckets.items()
+            for band, bucket in enumerate(document_buckets)
+        ])
+
+    # Every document sharing a bucket with the batch, earlier batches included
+    members = {}
+    all_buckets = {bucket for document_buckets in buckets.values() for bucket in document_buckets}
+    for document_id, band, bucket in SignatureBand.objects.filter(
+        bucket__in=all_buckets
+    ).values_list('document_id', 'band', 'bucket'):
+        members.setdefault((band, bucket), set()).add(document_id)
+
+    candidates = {
+        document_id: {
+            candidate_id
+            for band, bucket in enumerate(document_buckets)
+            for candidate_id in members.get((band, bucket), ())
+            if candidate_id < document_id
+        }
+        for document_id, document_buckets in buckets.items()
+    }
+    candidate_signatures = {
+        document_id: from_bytes(data)
+        for document_id, data in DocumentSignature.objects.filter(
+            document_id__in=set().union(*candidates.values())
+        ).values_list('document_id', 'minhash')
+    }
+
+    documents = list(Document.objects.filter(id__in=batch_ids).only('id', 'duplicate_of', 'duplicate_similarity'))
+    changed = []
+    now = timezone.now()
+    duplicates = 0
+    for document in documents:
+        previous = (document.duplicate_of_id, document.duplicate_similarity)
+        document.duplicate_of_id, document.duplicate_similarity = None, None
+        signature = signatures.get(document.id)
+        for candidate_id in candidates.get(document.id, ()):
+            score = similarity(signature, candidate_signatures[candidate_id])
+            if score >= threshold and (document.duplicate_similarity is None or score > document.duplicate_similarity):
+                document.duplicate_of_id, document.duplicate_similarity = candidate_id, score
+        if document.duplicate_of_id:
+            duplicates += 1
+        if (document.duplicate_of_id, document.duplicate_similarity) != previous:
+            # bulk_update skips auto_now, which the document ETags rely on
+            document.updated_at = now
+            changed.append(document)
+
+    Document.objects.bulk_update(changed, ['duplicate_of', 'duplicate_similarity', 'updated_at'])
+    return duplicates
@@ -0,0 +1,45 @@
+"""
+Management command to build the similar documents index.
+"""
+
+from django.core.management.base import BaseCommand
+
+from apps.ai.similarity import build_similarity_index
+
+
+class Command(BaseCommand):
+    """Build the similar documents index from the OCR text of all documents."""
+    
+    help = 'Fits the similarity model on the OCR texts and indexes every document'
+    
+    def add_arguments(self, parser):
+        """Add command arguments."""
+        parser.add_argument(
+            '--sample-size',
+            type=int,
+            default=None,
+            help='Number of documents used to fit the model'
+        )
+        
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of OCR texts loaded per query'
+        )
+    
+    def handle(self, *args, **options):
+        """Handle command execution."""
+        self.stdout.write('Building the similarity index...')
+        
+        try:
+            index = build_similarity_index(
+                sample_size=options['sample_size'],
+                batch_size=options['batch_size'],
+                log=self.stdout.write
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f'Successfully indexed {len(index.doc_ids)} documents'
+            ))
+        except Exception as e:
+            self.stderr.write(self.style.ERROR(f'Error building the similarity index: {str(e)}'))
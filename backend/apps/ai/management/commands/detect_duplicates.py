@@ -0,0 +1,45 @@
+"""
+Management command to flag near-duplicate documents in the existing archive.
+"""
+
+from django.core.management.base import BaseCommand
+
+from apps.ai.dedup import scan_documents
+
+
+class Command(BaseCommand):
+    """Compute MinHash signatures for all documents and flag near-duplicates."""
+    
+    help = 'Signs the OCR text of every document and flags near-duplicates'
+    
+    def add_arguments(self, parser):
+        """Add command arguments."""
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of documents signed and matched per batch'
+        )
+        
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=None,
+            help='Estimated similarity above which documents are duplicates'
+        )
+    
+    def handle(self, *args, **options):
+        """Handle command execution."""
+        self.stdout.write('Scanning documents for near-duplicates...')
+        
+        try:
+            result = scan_documents(
+                batch_size=options['batch_size'],
+                threshold=options['threshold'],
+                log=self.stdout.write
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f"Scanned {result['scanned']} documents, found {result['duplicates']} near-duplicates"
+            ))
+        except Exception as e:
+            self.stderr.write(self.style.ERROR(f'Error scanning documents: {str(e)}'))
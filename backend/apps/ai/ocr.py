@@ -9,6 +9,7 @@ from django.conf import settings
 from celery import shared_task
 
 from apps.documents.models import Document
+from apps.documents.utils.ocr_utils import PAGE_MARKER_RE
 
 
 def extract_text_from_image(image_path):
@@ -63,12 +64,72 @@ def extract_text_from_pdf(pdf_path):
         return ""
 
 
+def split_ocr_pages(text):
+    """
+    Split OCR text into its pages.
+    
+    Args:
+        text: Text produced by extract_text_from_pdf or extract_text_from_image
+    
+    Returns:
+        List of (page_number, page_text) tuples. Text without page markers
+        (e.g. from a single image) is returned as page 1.
+    """
+    if not text:
+        return []
+    
+    parts = PAGE_MARKER_RE.split(text)
+    pages = []
+    
+    # Anything before the first marker belongs to page 1
+    if parts[0].strip():
+        pages.append((1, parts[0]))
+    
+    for i in range(1, len(parts), 2):
+        pages.append((int(parts[i]), parts[i + 1]))
+    
+    return pages
+
+
 @shared_task(name="process_document_ocr")
 def process_document_ocr(document_id):
     """Celery task to process OCR for a document."""
     return process_document_ocr_sync(document_id)
 
 
+@shared_task(name="process_documents_ocr")
+def process_documents_ocr(document_ids):
+    """Celery task to process OCR for a batch of documents, one after the other."""
+    return process_documents_ocr_sync(document_ids)
+
+
+def process_documents_ocr_sync(document_ids):
+    """Synchronous OCR processing of a batch of documents."""
+    results = [process_document_ocr_sync(document_id) for document_id in document_ids]
+    processed = sum(1 for result in results if result.get("status") == "success")
+    return {"status": "success", "processed": processed, "failed": len(results) - processed}
+
+
+def queue_documents_ocr(document_ids):
+    """
+    Queue a single OCR task for a batch of documents.
+    
+    Falls back to a background thread when the task can't be queued, so
+    the request is not blocked by the OCR of the whole batch.
+    """
+    document_ids = list(document_ids)
+    if not document_ids:
+        return
+    try:
+        from config.celery import app
+        app.send_task('process_documents_ocr', args=[document_ids])
+    except Exception as e:
+        print(f"Error queuing OCR task: {str(e)}")
+        import threading
+        thread = threading.Thread(target=process_documents_ocr_sync, args=(document_ids,), daemon=True)
+        thread.start()
+
+
 def process_document_ocr_sync(document_id):
     """Synchronous OCR processing function."""
     try:
@@ -101,7 +162,25 @@ def process_document_ocr_sync(document_id):
         # Update the document status
         document.content_text = text[:1000]  # Store a preview of the text
         document.is_ocr_processed = True
-        document.save(update_fields=['content_text', 'is_ocr_processed'])
+        
+        # Flag near-duplicates of documents already in the archive
+        if not text.startswith('OCR processing failed'):
+            try:
+                from apps.ai.dedup import check_document
+                check_document(document, text)
+            except Exception as e:
+                print(f"Error checking for near-duplicates: {str(e)}")
+        
+        document.save(update_fields=[
+            'content_text', 'is_ocr_processed', 'duplicate_of', 'duplicate_similarity', 'updated_at'
+        ])
+        
+        # Keep the similar documents index up to date
+        try:
+            from apps.ai.similarity import update_document
+            update_document(document.id, text)
+        except Exception as e:
+            print(f"Error updating the similarity index: {str(e)}")
         
         return {"status": "success", "document_id": document_id}
     
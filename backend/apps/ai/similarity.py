@@ -0,0 +1,587 @@
+"""Local "similar documents" engine over OCR text.
+
+Documents are represented by LSA vectors: hashed TF-IDF term weights
+projected on a low-rank basis computed with a randomized SVD. Vectors are
+unit-normalized float32 rows, so cosine similarity is a dot product.
+An inverted-file index partitions them by k-means clusters and a query
+only scores the documents of the closest clusters.
+
+The index is stored in a .npz file built by the ``build_similarity_index``
+command. When OCR completes, the new vector of the document is appended to
+a side log next to it (``<index>.log``) instead of rewriting the whole
+index; every process reloads the index when the file changes and replays
+the records appended to the log since its last read. Rebuilding merges the
+log into the new index and starts a new, empty one. Writers are serialized
+by a lock on ``<index>.lock`` (flock, or msvcrt.locking on Windows).
+"""
+
+import os
+import re
+import tempfile
+import threading
+import time
+import zlib
+from collections import Counter
+from contextlib import contextmanager, suppress
+
+import numpy as np
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+TOKEN_RE = re.compile(r'[^\W\d_]{2,}')
+
+# The side log starts with the build id and dimensions of its index
+LOG_HEADER = np.dtype([('build_id', '<i8'), ('dimensions', '<i8')])
+
+
+def get_index_path():
+    """Return the path of the similarity index file."""
+    return getattr(
+        settings, 'SIMILARITY_INDEX_PATH',
+        os.path.join(settings.BASE_DIR, 'similarity_index.npz')
+    )
+
+
+def get_log_path(path):
+    """Return the path of the side log of an index file."""
+    return f"{path}.log"
+
+
+def log_record_dtype(dimensions):
+    """Record of the side log: a document id and its vector, all zeros to remove it."""
+    return np.dtype([('doc_id', '<i8'), ('vector', '<f4', (dimensions,))])
+
+
+def new_build_id():
+    """Return a random id telling builds of the index apart."""
+    return int.from_bytes(os.urandom(7), 'little')
+
+
+def replace_file(path, write):
+    """
+    Write a file atomically.
+
+    ``write(f)`` fills a temporary file private to this writer, in the same
+    directory, which then replaces ``path``.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with suppress(FileNotFoundError):
+            os.remove(tmp_path)
+        raise
+
+
+def hash_terms(text, n_features):
+    """
+    Count the words of a text in hashed feature buckets.
+
+    Returns:
+        (indices, counts) arrays of the non-empty buckets
+    """
+    counts = Counter(
+        zlib.crc32(token.encode('utf-8')) % n_features
+        for token in TOKEN_RE.findall((text or '').lower())
+    )
+    indices = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+    values = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+    return indices, values
+
+
+def normalize(matrix):
+    """Scale the rows of a matrix (or a vector) to unit length."""
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def _sparse_dot(rows, matrix):
+    """Multiply sparse rows [(indices, values)] by a dense matrix."""
+    return np.stack([values @ matrix[indices] for indices, values in rows])
+
+
+def _sparse_dot_transposed(rows, matrix, n_features):
+    """Multiply the transpose of sparse rows by a dense matrix."""
+    result = np.zeros((n_features, matrix.shape[1]), dtype=np.float32)
+    for (indices, values), row in zip(rows, matrix):
+        # Indices are unique within a row
+        result[indices] += np.outer(values, row)
+    return result
+
+
+def spherical_kmeans(vectors, n_clusters, n_iter=10, seed=0):
+    """
+    Cluster unit vectors by cosine similarity.
+
+    Returns:
+        (centroids, assignments) arrays
+    """
+    rng = np.random.default_rng(seed)
+    n_clusters = max(1, min(n_clusters, len(vectors)))
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+
+    for _ in range(n_iter):
+        assignments = assign_clusters(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        # Empty clusters keep their previous centroid
+        filled = np.linalg.norm(sums, axis=1) > 0
+        centroids[filled] = normalize(sums[filled])
+
+    return centroids, assign_clusters(vectors, centroids)
+
+
+def assign_clusters(vectors, centroids, chunk_size=10000):
+    """Return the index of the closest centroid of every vector."""
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), chunk_size):
+        chunk = vectors[start:start + chunk_size]
+        assignments[start:start + chunk_size] = np.argmax(chunk @ centroids.T, axis=1)
+    return assignments
+
+
+class SimilarityIndex:
+    """LSA model and clustered vectors of the indexed documents."""
+
+    def __init__(self, idf, components, doc_ids, vectors, centroids, assignments, build_id=0):
+        self.idf = idf
+        self.components = components
+        self.doc_ids = doc_ids
+        self.vectors = vectors
+        self.centroids = centroids
+        self.assignments = assignments
+        self.build_id = build_id
+        self._rows = None
+        self._lists = None
+
+    @property
+    def dimensions(self):
+        return self.components.shape[1]
+
+    @property
+    def n_features(self):
+        return len(self.idf)
+
+    @classmethod
+    def fit(cls, texts, n_features=2 ** 15, dimensions=100, n_iter=2, seed=0):
+        """
+        Compute the IDF weights and the LSA basis from a sample of texts.
+
+        The basis is the top right singular vectors of the TF-IDF matrix,
+        computed with a randomized SVD (Halko et al.) so the dense
+        documents x features matrix is never materialized.
+
+        Returns:
+            An empty index holding the fitted model
+        """
+        rows = [row for row in (hash_terms(text, n_features) for text in texts) if len(row[0])]
+        if not rows:
+            raise ValueError("No text to fit the similarity model on")
+
+        document_frequency = np.zeros(n_features, dtype=np.float32)
+        for indices, _ in rows:
+            document_frequency[indices] += 1
+        idf = (np.log((1 + len(rows)) / (1 + document_frequency)) + 1).astype(np.float32)
+        rows = [(indices, cls._weigh(values, idf[indices])) for indices, values in rows]
+
+        # Randomized range finder with a few power iterations
+        rank = min(dimensions + 10, len(rows))
+        rng = np.random.default_rng(seed)
+        basis = rng.standard_normal((n_features, rank), dtype=np.float32)
+        sample_range, _ = np.linalg.qr(_sparse_dot(rows, basis))
+        for _ in range(n_iter):
+            basis = _sparse_dot_transposed(rows, sample_range, n_features)
+            sample_range, _ = np.linalg.qr(_sparse_dot(rows, basis))
+
+        projected = _sparse_dot_transposed(rows, sample_range, n_features)
+        _, _, vt = np.linalg.svd(projected.T, full_matrices=False)
+        components = np.ascontiguousarray(vt[:dimensions].T, dtype=np.float32)
+
+        dimensions = components.shape[1]
+        return cls(
+            idf=idf,
+            components=components,
+            doc_ids=np.empty(0, dtype=np.int64),
+            vectors=np.empty((0, dimensions), dtype=np.float32),
+            centroids=np.empty((0, dimensions), dtype=np.float32),
+            assignments=np.empty(0, dtype=np.int32),
+            build_id=new_build_id(),
+        )
+
+    @staticmethod
+    def _weigh(counts, idf):
+        """Sublinear TF-IDF weights, L2-normalized."""
+        return normalize((1 + np.log(counts)) * idf).astype(np.float32)
+
+    def embed(self, text):
+        """
+        Project a text on the LSA basis.
+
+        Returns:
+            Unit float32 vector, or None if the text has no known words
+        """
+        indices, counts = hash_terms(text, self.n_features)
+        if not len(indices):
+            return None
+        vector = self._weigh(counts, self.idf[indices]) @ self.components[indices]
+        if not np.any(vector):
+            return None
+        return normalize(vector).astype(np.float32)
+
+    def set_vectors(self, doc_ids, vectors, n_clusters=None, seed=0):
+        """
+        Set the vectors of many documents at once and re-cluster them.
+
+        Args:
+            doc_ids: Array of document ids
+            vectors: Matching unit vectors
+            n_clusters: Number of clusters (default: about sqrt(n))
+        """
+        self.doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        self.vectors = np.asarray(vectors, dtype=np.float32)
+        if n_clusters is None:
+            n_clusters = int(np.sqrt(len(self.vectors))) or 1
+        if len(self.vectors):
+            # Train on a sample, then assign every vector
+            rng = np.random.default_rng(seed)
+            sample_size = min(len(self.vectors), max(n_clusters * 50, 10000))
+            sample = self.vectors[rng.choice(len(self.vectors), sample_size, replace=False)]
+            self.centroids, _ = spherical_kmeans(sample, n_clusters, seed=seed)
+            self.assignments = assign_clusters(self.vectors, self.centroids)
+        self._rows = None
+        self._lists = None
+
+    def with_updates(self, doc_ids, vectors):
+        """
+        Return a copy of the index with some documents added, replaced or removed.
+
+        The index itself is left untouched, as other threads may be searching
+        it. New vectors are assigned to their closest cluster.
+
+        Args:
+            doc_ids: Array of document ids; the last update of a document wins
+            vectors: Matching unit vectors, all zeros to remove the document
+        """
+        doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(doc_ids), self.dimensions)
+        _, last = np.unique(doc_ids[::-1], return_index=True)
+        last = len(doc_ids) - 1 - last
+        doc_ids, vectors = doc_ids[last], vectors[last]
+
+        keep = ~np.isin(self.doc_ids, doc_ids)
+        added = np.any(vectors, axis=1) if len(self.centroids) else np.zeros(len(doc_ids), dtype=bool)
+        return SimilarityIndex(
+            idf=self.idf,
+            components=self.components,
+            doc_ids=np.concatenate([self.doc_ids[keep], doc_ids[added]]),
+            vectors=np.concatenate([self.vectors[keep], vectors[added]]),
+            centroids=self.centroids,
+            assignments=np.concatenate([
+                self.assignments[keep], assign_clusters(vectors[added], self.centroids)
+            ]),
+            build_id=self.build_id,
+        )
+
+    @property
+    def rows(self):
+        """Map of document id to row number."""
+        if self._rows is None:
+            self._rows = {int(doc_id): row for row, doc_id in enumerate(self.doc_ids)}
+        return self._rows
+
+    def get_vector(self, doc_id):
+        """Return the stored vector of a document, or None."""
+        row = self.rows.get(doc_id)
+        return None if row is None else self.vectors[row]
+
+    def _cluster_lists(self):
+        """Rows sorted by cluster, with the offset of each cluster."""
+        if self._lists is None:
+            order = np.argsort(self.assignments, kind='stable')
+            offsets = np.searchsorted(self.assignments[order], np.arange(len(self.centroids) + 1))
+            self._lists = (order, offsets)
+        return self._lists
+
+    def search(self, vector, k=10, nprobe=8, exclude=None):
+        """
+        Find the documents most similar to a vector.
+
+        Only the documents of the ``nprobe`` clusters closest to the vector
+        are scored, so results are approximate.
+
+        Returns:
+            List of (document_id, cosine similarity), best first
+        """
+        if not len(self.doc_ids):
+            return []
+
+        order, offsets = self._cluster_lists()
+        nprobe = min(nprobe, len(self.centroids))
+        clusters = np.argpartition(-(self.centroids @ vector), nprobe - 1)[:nprobe]
+        candidates = np.concatenate([order[offsets[c]:offsets[c + 1]] for c in clusters])
+        if exclude is not None:
+            candidates = candidates[self.doc_ids[candidates] != exclude]
+        if not len(candidates):
+            return []
+
+        scores = self.vectors[candidates] @ vector
+        k = min(k, len(candidates))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(int(self.doc_ids[candidates[i]]), float(scores[i])) for i in best]
+
+    def save(self, path):
+        """Atomically write the index to a .npz file."""
+        replace_file(path, lambda f: np.savez(
+            f, idf=self.idf, components=self.components, doc_ids=self.doc_ids,
+            vectors=self.vectors, centroids=self.centroids, assignments=self.assignments,
+            build_id=np.int64(self.build_id),
+        ))
+
+    @classmethod
+    def load(cls, path):
+        """Read an index written by save()."""
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in data.files}
+        return cls(build_id=int(arrays.pop('build_id', 0)), **arrays)
+
+
+def read_log(f, offset=0):
+    """
+    Read the records of a side log.
+
+    Args:
+        f: The log file, opened in binary mode
+        offset: Position after the last record already read, 0 to read
+            the whole log
+
+    Returns:
+        (header, records, offset after the last complete record), or
+        (None, None, 0) if the log is empty
+    """
+    f.seek(0)
+    header = np.frombuffer(f.read(LOG_HEADER.itemsize), dtype=LOG_HEADER)
+    if not len(header):
+        return None, None, 0
+    header = header[0]
+    record = log_record_dtype(int(header['dimensions']))
+
+    offset = max(offset, LOG_HEADER.itemsize)
+    f.seek(offset)
+    data = f.read()
+    # A record being appended is left for the next read
+    count = len(data) // record.itemsize
+    records = np.frombuffer(data[:count * record.itemsize], dtype=record)
+    return header, records, offset + count * record.itemsize
+
+
+def write_log_header(f, index):
+    """Start a side log for a build of the index."""
+    f.write(np.array([(index.build_id, index.dimensions)], dtype=LOG_HEADER).tobytes())
+
+
+_cached = {'index': None, 'key': None, 'log_key': None, 'log_offset': 0}
+_cache_lock = threading.Lock()
+
+
+def get_similarity_index():
+    """
+    Return the similarity index, reloading it if the file changed.
+
+    Updates appended to the side log since the last call are applied to it.
+
+    Returns:
+        SimilarityIndex, or None if the index has not been built
+    """
+    path = get_index_path()
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+
+    key = (path, stat.st_ino, stat.st_mtime_ns)
+    with _cache_lock:
+        if _cached['key'] != key:
+            _cached.update(index=SimilarityIndex.load(path), key=key, log_key=None, log_offset=0)
+        _replay_log(path)
+        return _cached['index']
+
+
+def _replay_log(path):
+    """Apply the new records of the side log to the cached index (_cache_lock held)."""
+    index = _cached['index']
+    try:
+        with open(get_log_path(path), 'rb') as f:
+            log_key = os.fstat(f.fileno()).st_ino
+            if _cached['log_key'] != log_key:
+                # Replaying a log again is harmless: the last update of a document wins
+                _cached.update(log_key=log_key, log_offset=0)
+            header, records, offset = read_log(f, _cached['log_offset'])
+    except FileNotFoundError:
+        return
+
+    # The log of another build is ignored until this process sees that build
+    if header is None or header['build_id'] != index.build_id or header['dimensions'] != index.dimensions:
+        return
+    if len(records):
+        _cached['index'] = index.with_updates(records['doc_id'], records['vector'])
+    _cached['log_offset'] = offset
+
+
+def _lock_file(lock_file):
+    """Take an exclusive lock on an open file without waiting; raises OSError if it is held."""
+    if fcntl is not None:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    else:
+        lock_file.seek(0)
+        msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+
+
+def _unlock_file(lock_file):
+    """Release a lock taken by _lock_file()."""
+    if fcntl is not None:
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+    else:
+        lock_file.seek(0)
+        msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def index_lock(path=None, timeout=30):
+    """Serialize writers of the index files across processes, with a lock on a file next to them."""
+    path = path or get_index_path()
+    with open(f"{path}.lock", 'a') as lock_file:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                _lock_file(lock_file)
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise TimeoutError("Could not lock the similarity index")
+                time.sleep(0.1)
+        try:
+            yield
+        finally:
+            _unlock_file(lock_file)
+
+
+def update_document(document_id, text):
+    """
+    Add, replace or remove a document in the persisted index.
+
+    The new vector is appended to the side log of the index. Does nothing
+    until the index has been built. The model itself is not refitted;
+    rebuild the index periodically as the corpus evolves.
+    """
+    path = get_index_path()
+    if not os.path.exists(path):
+        return
+
+    with index_lock(path):
+        # Current build, as a rebuild may just have replaced the index
+        index = get_similarity_index()
+        if index is None:
+            return
+        vector = index.embed(text)
+        if vector is None:
+            vector = np.zeros(index.dimensions, dtype=np.float32)
+        record = np.array([(document_id, vector)], dtype=log_record_dtype(index.dimensions))
+
+        log_path = get_log_path(path)
+        with open(log_path, 'a+b') as f:
+            header, _, _ = read_log(f)
+            if header is not None and header['build_id'] != index.build_id:
+                # Left behind by an interrupted rebuild
+                f.truncate(0)
+                header = None
+            f.seek(0, os.SEEK_END)
+            if header is None:
+                write_log_header(f, index)
+            f.write(record.tobytes())
+
+
+def _merge_log(index, queryset, path):
+    """
+    Return the index with the documents of the side log embedded again.
+
+    They were updated since the last build, possibly while this one was
+    reading the OCR texts: their current text is read again.
+    """
+    try:
+        with open(get_log_path(path), 'rb') as f:
+            header, records, _ = read_log(f)
+    except FileNotFoundError:
+        return index
+    if header is None or not len(records):
+        return index
+
+    doc_ids = np.unique(records['doc_id'])
+    vectors = np.zeros((len(doc_ids), index.dimensions), dtype=np.float32)
+    texts = dict(queryset.filter(document_id__in=doc_ids.tolist()).values_list('document_id', 'full_text'))
+    for row, doc_id in enumerate(doc_ids.tolist()):
+        vector = index.embed(texts.get(doc_id))
+        if vector is not None:
+            vectors[row] = vector
+    return index.with_updates(doc_ids, vectors)
+
+
+def _iter_texts(queryset, doc_ids, batch_size):
+    """Yield the OCR texts of the given documents, batch by batch."""
+    for start in range(0, len(doc_ids), batch_size):
+        chunk = doc_ids[start:start + batch_size]
+        yield from queryset.filter(document_id__in=chunk).values_list('full_text', flat=True)
+
+
+def build_similarity_index(sample_size=None, batch_size=500, log=print):
+    """
+    Fit the model on a sample of OCR texts, embed every document and save.
+
+    Returns:
+        The new SimilarityIndex
+    """
+    from apps.documents.models import DocumentOCR
+
+    sample_size = sample_size or getattr(settings, 'SIMILARITY_SAMPLE_SIZE', 5000)
+    queryset = DocumentOCR.objects.exclude(full_text='')
+    doc_ids = list(queryset.order_by('document_id').values_list('document_id', flat=True))
+    if not doc_ids:
+        raise ValueError("No OCR text to index")
+
+    rng = np.random.default_rng(0)
+    sample_ids = sorted(rng.choice(doc_ids, min(sample_size, len(doc_ids)), replace=False).tolist())
+    log(f"Fitting the model on {len(sample_ids)} of {len(doc_ids)} documents")
+    index = SimilarityIndex.fit(
+        _iter_texts(queryset, sample_ids, batch_size),
+        n_features=getattr(settings, 'SIMILARITY_FEATURES', 2 ** 15),
+        dimensions=getattr(settings, 'SIMILARITY_DIMENSIONS', 100),
+    )
+
+    indexed_ids, vectors = [], []
+    rows = queryset.order_by('document_id').values_list('document_id', 'full_text')
+    for count, (doc_id, text) in enumerate(rows.iterator(chunk_size=batch_size), 1):
+        vector = index.embed(text)
+        if vector is not None:
+            indexed_ids.append(doc_id)
+            vectors.append(vector)
+        if count % 10000 == 0:
+            log(f"Embedded {count} documents")
+
+    index.set_vectors(indexed_ids, np.vstack(vectors) if vectors else index.vectors)
+    log(f"Clustered {len(indexed_ids)} documents into {len(index.centroids)} clusters")
+
+    path = get_index_path()
+    with index_lock(path):
+        index = _merge_log(index, queryset, path)
+        index.save(path)
+        replace_file(get_log_path(path), lambda f: write_log_header(f, index))
+    return index
@@ -3,18 +3,18 @@
 import os
 import tempfile
 from unittest.mock import patch
-from django.test import TestCase
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.contrib.auth import get_user_model
 
 from apps.documents.models import Document
 from apps.ai.ocr import extract_text_from_image, extract_text_from_pdf, process_document_ocr
+from config.testing import TemporaryMediaTestCase
 
 User = get_user_model()
 
 
-class OCRTestCase(TestCase):
+class OCRTestCase(TemporaryMediaTestCase):
     """Test cases for OCR functionality."""
     
     def setUp(self):
@@ -44,6 +44,7 @@ class OCRTestCase(TestCase):
     
     def tearDown(self):
         """Clean up after tests."""
+        super().tearDown()
         if os.path.exists(self.temp_file_path):
             os.remove(self.temp_file_path)
     
@@ -100,3 +101,208 @@ class OCRTestCase(TestCase):
         
         # Check OCR data was saved
         self.assertEqual(self.document.ocr_data.full_text, 'Document OCR text result')
+    
+    def test_split_ocr_pages(self):
+        """Test splitting OCR text back into pages."""
+        from apps.ai.ocr import split_ocr_pages
+        
+        text = "\n--- Page 1 ---\nFirst page\n--- Page 2 ---\nSecond page"
+        self.assertEqual(split_ocr_pages(text), [(1, 'First page'), (2, 'Second page')])
+        self.assertEqual(split_ocr_pages('Single image text'), [(1, 'Single image text')])
+        self.assertEqual(split_ocr_pages(''), [])
+
+
+class SimilarityIndexTestCase(TemporaryMediaTestCase):
+    """Test cases for the similar documents engine."""
+    
+    TEXTS = {
+        'invoice': 'invoice amount due payment total tax supplier customer net thirty days',
+        'contract': 'contract agreement parties clause termination obligations signed term',
+        'payroll': 'payroll salary employee month gross net deductions social security',
+    }
+    
+    def setUp(self):
+        """Set up test environment."""
+        self.user = User.objects.create_user(username='archivist', password='testpassword')
+        self.other = User.objects.create_user(username='other', password='testpassword')
+        self.index_dir = tempfile.mkdtemp()
+        self.index_path = os.path.join(self.index_dir, 'similarity_index.npz')
+        
+        self.documents = {}
+        for kind, text in self.TEXTS.items():
+            for i in range(4):
+                document = self.create_document(f'{kind} {i}', self.user, f'{text} {kind}{i} reference {i}')
+                self.documents.setdefault(kind, []).append(document)
+    
+    def tearDown(self):
+        """Clean up after tests."""
+        import shutil
+        super().tearDown()
+        shutil.rmtree(self.index_dir, ignore_errors=True)
+    
+    def create_document(self, title, user, text):
+        """Create a document with OCR text."""
+        from apps.documents.models import DocumentOCR
+        
+        document = Document.objects.create(
+            title=title, uploaded_by=user, is_ocr_processed=True,
+            file=SimpleUploadedFile('doc.pdf', b'%PDF-1.4', content_type='application/pdf'),
+        )
+        DocumentOCR.objects.create(document=document, full_text=text)
+        return document
+    
+    def build(self):
+        """Build the index into the temporary directory."""
+        from apps.ai.similarity import build_similarity_index
+        
+        with self.settings(SIMILARITY_INDEX_PATH=self.index_path, SIMILARITY_DIMENSIONS=8):
+            return build_similarity_index(log=lambda message: None)
+    
+    def test_similar_documents_share_a_topic(self):
+        """Test that the closest documents are about the same topic."""
+        index = self.build()
+        invoice = self.documents['invoice'][0]
+        
+        matches = index.search(index.get_vector(invoice.id), k=3, nprobe=len(index.centroids), exclude=invoice.id)
+        expected = {document.id for document in self.documents['invoice'][1:]}
+        self.assertEqual({doc_id for doc_id, _ in matches}, expected)
+        self.assertTrue(all(score > 0.5 for _, score in matches))
+    
+    def test_incremental_update_and_reload(self):
+        """Test that OCR completion adds a document to the persisted index."""
+        from apps.ai.similarity import get_similarity_index, update_document
+        
+        self.build()
+        with self.settings(SIMILARITY_INDEX_PATH=self.index_path):
+            contract = self.create_document('new contract', self.user, self.TEXTS['contract'])
+            update_document(contract.id, self.TEXTS['contract'])
+            
+            index = get_similarity_index()
+            self.assertIsNotNone(index.get_vector(contract.id))
+            best_id, _ = index.search(index.get_vector(contract.id), k=1, exclude=contract.id)[0]
+            self.assertIn(best_id, {document.id for document in self.documents['contract']})
+    
+    def test_updates_are_logged_and_merged_on_rebuild(self):
+        """Test that updates are appended to the side log until the next build."""
+        from apps.ai.similarity import get_log_path, get_similarity_index, update_document
+        
+        self.build()
+        log_path = get_log_path(self.index_path)
+        index_mtime = os.stat(self.index_path).st_mtime_ns
+        with self.settings(SIMILARITY_INDEX_PATH=self.index_path):
+            removed = self.documents['payroll'][0]
+            contract = self.create_document('new contract', self.user, self.TEXTS['contract'])
+            update_document(contract.id, self.TEXTS['contract'])
+            update_document(removed.id, '')
+            
+            self.assertEqual(os.stat(self.index_path).st_mtime_ns, index_mtime)
+            index = get_similarity_index()
+            self.assertIsNotNone(index.get_vector(contract.id))
+            self.assertIsNone(index.get_vector(removed.id))
+        
+        log_size = os.path.getsize(log_path)
+        index = self.build()
+        self.assertIsNotNone(index.get_vector(contract.id))
+        self.assertLess(os.path.getsize(log_path), log_size)
+        with self.settings(SIMILARITY_INDEX_PATH=self.index_path):
+            self.assertIsNotNone(get_similarity_index().get_vector(contract.id))
+    
+    def test_index_lock_is_exclusive(self):
+        """Test that a writer waits for the lock, then gives up."""
+        from apps.ai.similarity import index_lock
+        
+        with index_lock(self.index_path):
+            with self.assertRaises(TimeoutError):
+                with index_lock(self.index_path, timeout=0.2):
+                    pass
+        with index_lock(self.index_path, timeout=0.2):
+            pass
+    
+    def test_similar_action_respects_visibility(self):
+        """Test that the endpoint only returns documents visible to the user."""
+        from rest_framework.test import APIClient
+        
+        hidden = self.create_document('hidden payroll', self.other, self.TEXTS['payroll'])
+        self.build()
+        
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with self.settings(SIMILARITY_INDEX_PATH=self.index_path):
+            response = client.get(f"/api/documents/{self.documents['payroll'][0].id}/similar/?limit=3")
+        
+        self.assertEqual(response.status_code, 200)
+        ids = [item['id'] for item in response.data]
+        self.assertEqual(len(ids), 3)
+        self.assertNotIn(hidden.id, ids)
+        self.assertTrue(set(ids) <= {document.id for document in self.documents['payroll']})
+
+
+class NearDuplicateTestCase(TemporaryMediaTestCase):
+    """Test cases for MinHash near-duplicate detection."""
+    
+    ORIGINAL = (
+        'Bill of lading number 4471 shipper MAFCI consignee Atlantic Trading port of loading '
+        'Sfax port of discharge Marseille vessel Carthage voyage 12 containers of cement '
+        'gross weight 24000 kg freight prepaid issued at Sfax on the first of June'
+    )
+    
+    def setUp(self):
+        """Set up test environment."""
+        self.user = User.objects.create_user(username='archivist', password='testpassword')
+    
+    def create_document(self, title, text):
+        """Create a document with OCR text."""
+        from apps.documents.models import DocumentOCR
+        
+        document = Document.objects.create(
+            title=title, uploaded_by=self.user, is_ocr_processed=True,
+            file=SimpleUploadedFile('scan.pdf', b'%PDF-1.4', content_type='application/pdf'),
+        )
+        DocumentOCR.objects.create(document=document, full_text=text)
+        return document
+    
+    def test_signature_estimates_similarity(self):
+        """Test that near-identical scans have close signatures and others do not."""
+        from apps.ai.dedup import minhash, similarity
+        
+        rescan = self.ORIGINAL.replace('4471', '4A71').replace('Marseille', 'Marsei1le')
+        other = 'Employment contract between MAFCI and the employee for the position of accountant ' * 2
+        
+        self.assertGreater(similarity(minhash(self.ORIGINAL), minhash(rescan)), 0.6)
+        self.assertLess(similarity(minhash(self.ORIGINAL), minhash(other)), 0.1)
+        self.assertIsNone(minhash('too short'))
+    
+    @patch('apps.ai.ocr.extract_text_from_image')
+    def test_duplicate_flagged_on_ocr_completion(self, mock_extract):
+        """Test that a rescan is linked to the original when its OCR completes."""
+        original = self.create_document('BL 4471', self.ORIGINAL)
+        mock_extract.return_value = self.ORIGINAL + ' copy'
+        rescan = Document.objects.create(
+            title='BL 4471 (rescan)', uploaded_by=self.user, is_ocr_processed=True,
+            file=SimpleUploadedFile('scan.png', b'PNG', content_type='image/png'),
+        )
+        
+        from apps.ai.dedup import scan_documents
+        scan_documents(log=lambda message: None)
+        process_document_ocr(rescan.id)
+        
+        rescan.refresh_from_db()
+        self.assertEqual(rescan.duplicate_of_id, original.id)
+        self.assertGreater(rescan.duplicate_similarity, 0.8)
+    
+    def test_bulk_scan(self):
+        """Test that the streaming scan flags later copies only."""
+        from apps.ai.dedup import scan_documents
+        
+        original = self.create_document('BL 4471', self.ORIGINAL)
+        copy = self.create_document('BL 4471 copy', self.ORIGINAL + ' stamped')
+        other = self.create_document('Contract', 'Employment contract between MAFCI and the employee ' * 3)
+        
+        result = scan_documents(batch_size=2, log=lambda message: None)
+        
+        self.assertEqual(result, {'scanned': 3, 'duplicates': 1})
+        for document in (original, copy, other):
+            document.refresh_from_db()
+        self.assertIsNone(original.duplicate_of_id)
+        self.assertEqual(copy.duplicate_of_id, original.id)
+        self.assertIsNone(other.duplicate_of_id)
@@ -0,0 +1,95 @@
+"""
+Management command comparing the two ways of rendering document lists.
+"""
+
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.documents.models import Document, Tag
+from apps.documents.serializers.document_serializers import DocumentListSerializer
+from apps.documents.serializers.export_serializers import DocumentExportSerializer
+from apps.documents.serializers.values_serializers import (
+    DocumentExportValuesSerializer, DocumentListValuesSerializer
+)
+
+
+class Command(BaseCommand):
+    """Time DocumentListSerializer against DocumentListValuesSerializer."""
+
+    help = ('Renders generated documents with the ModelSerializers and with the values() serializers, '
+            'checks that both render the same data and reports the timings. Nothing is kept in the database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000],
+                            help='Numbers of documents to render (default: 1000 10000)')
+        parser.add_argument('--tags', type=int, default=3, help='Tags per document (default: 3)')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per path, the best is reported (default: 3)')
+
+    def handle(self, *args, **options):
+        """Handle command execution."""
+        if min(options['rows']) < 1 or options['repeat'] < 1:
+            raise CommandError('--rows and --repeat must be positive')
+
+        with transaction.atomic():
+            documents = self.create_documents(max(options['rows']), options['tags'])
+            for rows in sorted(options['rows']):
+                queryset = Document.objects.filter(id__in=documents[:rows]).order_by('-created_at', '-id')
+                self.compare(
+                    f'list ({rows} rows)', options['repeat'],
+                    lambda: DocumentListSerializer(
+                        queryset.select_related('uploaded_by').prefetch_related('tags'), many=True
+                    ).data,
+                    lambda: DocumentListValuesSerializer().render_queryset(queryset),
+                )
+                self.compare(
+                    f'export ({rows} rows)', options['repeat'],
+                    lambda: DocumentExportSerializer(
+                        queryset.select_related('department', 'folder', 'uploaded_by').prefetch_related('tags'),
+                        many=True
+                    ).data,
+                    lambda: DocumentExportValuesSerializer().render_queryset(queryset),
+                )
+            transaction.set_rollback(True)
+
+    def create_documents(self, count, tags_per_document):
+        """Create the benchmark documents (bulk, so no signal fires) and return their ids."""
+        user, _ = get_user_model().objects.get_or_create(username='benchmark-document-list')
+        tags = [Tag.objects.get_or_create(name=f'benchmark-tag-{i}')[0] for i in range(max(tags_per_document * 2, 1))]
+
+        documents = Document.objects.bulk_create([
+            Document(title=f'Benchmark document {i}', reference_number=f'BENCH-{i}', uploaded_by=user)
+            for i in range(count)
+        ], batch_size=1000)
+        Through = Document.tags.through
+        Through.objects.bulk_create([
+            Through(document_id=document.id, tag_id=tags[(i + j) % len(tags)].id)
+            for i, document in enumerate(documents)
+            for j in range(tags_per_document)
+        ], batch_size=5000)
+        return [document.id for document in documents]
+
+    def compare(self, label, repeat, serializer_path, values_path):
+        """Time both paths and check they render the same data."""
+        serializer_time, serializer_data = self.best_time(serializer_path, repeat)
+        values_time, values_data = self.best_time(values_path, repeat)
+
+        if [dict(item) for item in serializer_data] != values_data:
+            self.stderr.write(self.style.ERROR(f'{label}: the two paths render different data'))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'{label}: ModelSerializer {serializer_time * 1000:.1f} ms, '
+            f'values() {values_time * 1000:.1f} ms ({serializer_time / values_time:.1f}x)'
+        ))
+
+    def best_time(self, render, repeat):
+        """Return the best time of a few runs and the rendered data."""
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            data = render()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, data
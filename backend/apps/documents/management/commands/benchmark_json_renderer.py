@@ -0,0 +1,70 @@
+"""
+Management command comparing the JSON renderers on real API payloads.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from apps.documents.models import Document, DocumentOCR
+from apps.documents.serializers.document_serializers import DocumentSerializer
+from apps.documents.serializers.ocr_serializers import DocumentOCRSerializer
+from apps.documents.serializers.values_serializers import DocumentListValuesSerializer
+from config.renderers import ORJSONRenderer, orjson
+
+
+class Command(BaseCommand):
+    """Time DRF's JSONRenderer against ORJSONRenderer."""
+
+    help = ('Renders document lists, document details and OCR texts from the database with '
+            "DRF's JSONRenderer and with ORJSONRenderer, and reports the timings")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help='Documents in the list payload (default: 1000)')
+        parser.add_argument('--details', type=int, default=100, help='Document details rendered (default: 100)')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per renderer, the best is reported (default: 5)')
+
+    def handle(self, *args, **options):
+        """Handle command execution."""
+        if orjson is None:
+            raise CommandError('orjson is not installed')
+        if not Document.objects.exists():
+            raise CommandError('No documents to render')
+
+        documents = Document.objects.order_by('-created_at', '-id')
+        payloads = {
+            f"list of {options['rows']} documents": {
+                'next': None, 'previous': None,
+                'results': DocumentListValuesSerializer().render_queryset(documents[:options['rows']]),
+            },
+            f"{options['details']} document details": DocumentSerializer(
+                documents.select_related('department', 'folder', 'uploaded_by')
+                .prefetch_related('tags', 'department__folders')[:options['details']],
+                many=True
+            ).data,
+        }
+        ocr_data = DocumentOCR.objects.order_by('-id').first()
+        if ocr_data is not None:
+            payloads[f'OCR text ({len(ocr_data.full_text)} characters)'] = DocumentOCRSerializer(ocr_data).data
+
+        for label, payload in payloads.items():
+            default_time, expected = self.best_time(JSONRenderer(), payload, options['repeat'])
+            orjson_time, rendered = self.best_time(ORJSONRenderer(), payload, options['repeat'])
+            if rendered != expected:
+                self.stderr.write(self.style.ERROR(f'{label}: the renderers produce different JSON'))
+                continue
+            self.stdout.write(self.style.SUCCESS(
+                f'{label} ({len(rendered)} bytes): JSONRenderer {default_time * 1000:.1f} ms, '
+                f'ORJSONRenderer {orjson_time * 1000:.1f} ms ({default_time / orjson_time:.1f}x)'
+            ))
+
+    def best_time(self, renderer, payload, repeat):
+        """Return the best time of a few renders and the rendered bytes."""
+        best = None
+        for _ in range(max(repeat, 1)):
+            start = time.perf_counter()
+            rendered = renderer.render(payload, 'application/json', {})
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, rendered
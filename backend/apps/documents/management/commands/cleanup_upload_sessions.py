@@ -0,0 +1,25 @@
+"""
+Management command to delete expired resumable uploads.
+"""
+
+from django.core.management.base import BaseCommand
+
+from apps.documents.utils.upload_utils import cleanup_expired_sessions
+
+
+class Command(BaseCommand):
+    """Delete expired upload sessions and their partial files."""
+    
+    help = 'Deletes expired resumable upload sessions and partial files left without a session'
+    
+    def handle(self, *args, **options):
+        """Handle command execution."""
+        self.stdout.write('Cleaning up upload sessions...')
+        
+        try:
+            result = cleanup_expired_sessions()
+            self.stdout.write(self.style.SUCCESS(
+                f"Deleted {result['sessions']} expired sessions and {result['orphans']} orphan files"
+            ))
+        except Exception as e:
+            self.stderr.write(self.style.ERROR(f'Error cleaning up upload sessions: {str(e)}'))
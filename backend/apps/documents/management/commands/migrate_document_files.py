@@ -0,0 +1,74 @@
+"""
+Management command to move document files into the content-addressed storage.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Sum
+
+from apps.documents.models import Document, StoredBlob
+from apps.documents.storage import BLOB_PREFIX, ContentAddressedStorage
+
+
+class Command(BaseCommand):
+    """Move files stored before the content-addressed storage into blobs."""
+    
+    help = 'Stores the existing document files once per distinct content and removes the duplicates'
+    
+    def add_arguments(self, parser):
+        """Add command arguments."""
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report the files that would be moved'
+        )
+        parser.add_argument(
+            '--prune',
+            action='store_true',
+            help='Also recount the references, and remove unreferenced blobs and blob files without a reference count'
+        )
+    
+    def handle(self, *args, **options):
+        """Handle command execution."""
+        storage = Document._meta.get_field('file').storage
+        if not isinstance(storage, ContentAddressedStorage):
+            raise CommandError('Document files are not content-addressed (DOCUMENTS_CONTENT_ADDRESSED is off).')
+        
+        legacy = list(
+            Document.objects.exclude(file='').exclude(file__startswith=BLOB_PREFIX + '/').values_list('id', 'file')
+        )
+        self.stdout.write(f'Moving {len(legacy)} document files into the content-addressed storage...')
+        blob_bytes_before = StoredBlob.objects.aggregate(total=Sum('size'))['total'] or 0
+        
+        moved = 0
+        legacy_bytes = 0
+        for document_id, name in legacy:
+            try:
+                size = storage.size(name)
+                if options['dry_run']:
+                    self.stdout.write(f'  {name} ({size} bytes)')
+                    continue
+                
+                with storage.open(name, 'rb') as legacy_file:
+                    blob_name = storage.save(name, legacy_file)
+                if Document.objects.filter(id=document_id, file=name).update(file=blob_name):
+                    storage.delete(name)
+                    moved += 1
+                    legacy_bytes += size
+                else:
+                    # The document changed meanwhile
+                    storage.delete(blob_name)
+            except Exception as e:
+                self.stderr.write(self.style.ERROR(f'Error moving {name}: {str(e)}'))
+        
+        if not options['dry_run']:
+            blob_bytes = (StoredBlob.objects.aggregate(total=Sum('size'))['total'] or 0) - blob_bytes_before
+            self.stdout.write(self.style.SUCCESS(
+                f'Moved {moved} files: {legacy_bytes} bytes now stored in {blob_bytes} bytes of new blobs'
+            ))
+        
+        if options['prune'] and not options['dry_run']:
+            result = storage.prune()
+            self.stdout.write(self.style.SUCCESS(
+                f"Corrected {result['recounted']} reference counts, removed {result['blobs']} unreferenced blobs "
+                f"and {result['orphans']} orphan files"
+            ))
@@ -0,0 +1,35 @@
+"""
+Management command to repair the per-department and per-folder document counters.
+"""
+
+from django.core.management.base import BaseCommand
+
+from apps.documents.utils.counter_utils import reconcile_counters
+
+
+class Command(BaseCommand):
+    """Recompute the document counters from the documents table."""
+    
+    help = 'Recounts the documents of every department and folder and repairs drifted counters'
+    
+    def add_arguments(self, parser):
+        """Add command arguments."""
+        parser.add_argument(
+            '--department',
+            type=int,
+            action='append',
+            dest='departments',
+            help='Only reconcile this department id (can be repeated)'
+        )
+    
+    def handle(self, *args, **options):
+        """Handle command execution."""
+        self.stdout.write('Reconciling document counters...')
+        
+        try:
+            result = reconcile_counters(options['departments'])
+            self.stdout.write(self.style.SUCCESS(
+                f"Checked {result['checked']} counters, repaired {result['repaired']}"
+            ))
+        except Exception as e:
+            self.stderr.write(self.style.ERROR(f'Error reconciling document counters: {str(e)}'))
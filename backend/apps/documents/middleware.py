@@ -5,6 +5,7 @@ from django.urls import resolve
 from django.utils.deprecation import MiddlewareMixin
 from apps.documents.models import Document
 from apps.documents.utils.audit_utils import log_user_activity
+from apps.documents.utils.download_utils import is_initial_download
 
 
 class DocumentViewTrackingMiddleware(MiddlewareMixin):
@@ -34,8 +35,9 @@ class DocumentViewTrackingMiddleware(MiddlewareMixin):
                     except Document.DoesNotExist:
                         pass
             
-            # Track document downloads
-            if resolved_path.url_name == 'document-download':
+            # Track document downloads; a viewer fetching the file range by
+            # range is logged once, for the range opening the file
+            if resolved_path.url_name == 'document-download' and is_initial_download(request):
                 document_id = view_kwargs.get('pk')
                 if document_id:
                     try:
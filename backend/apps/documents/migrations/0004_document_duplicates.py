@@ -0,0 +1,45 @@
+# Generated by Django 4.2.7 on 2026-10-19 06:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0003_auditlog'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, help_text='Earlier document this one is a near-duplicate of', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='documents.document'),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='duplicate_similarity',
+            field=models.FloatField(blank=True, help_text='Estimated similarity with the original document', null=True),
+        ),
+        migrations.CreateModel(
+            name='DocumentSignature',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('minhash', models.BinaryField(help_text='MinHash values as little-endian uint32')),
+                ('created_at', models.DateTimeField(auto_now=True)),
+                ('document', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='signature', to='documents.document')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SignatureBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.PositiveSmallIntegerField()),
+                ('bucket', models.BigIntegerField()),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='signature_bands', to='documents.document')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['band', 'bucket'], name='signatureband_lookup_idx')],
+            },
+        ),
+    ]
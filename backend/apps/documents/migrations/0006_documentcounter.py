@@ -0,0 +1,43 @@
+# Generated by Django 4.2.7 on 2026-10-19 06:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.functions.comparison
+
+
+def populate_counters(apps, schema_editor):
+    """Count the existing documents per (department, folder) pair."""
+    Document = apps.get_model('documents', 'Document')
+    DocumentCounter = apps.get_model('documents', 'DocumentCounter')
+    rows = Document.objects.values('department_id', 'folder_id').annotate(
+        total=models.Count('id')
+    ).order_by()
+    DocumentCounter.objects.bulk_create([
+        DocumentCounter(department_id=row['department_id'], folder_id=row['folder_id'], count=row['total'])
+        for row in rows
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0005_document_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('department', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='document_counters', to='documents.department')),
+                ('folder', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='document_counters', to='documents.folder')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='documentcounter',
+            constraint=models.UniqueConstraint(django.db.models.functions.comparison.Coalesce('department', models.Value(0)), django.db.models.functions.comparison.Coalesce('folder', models.Value(0)), name='documentcounter_scope_unique'),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
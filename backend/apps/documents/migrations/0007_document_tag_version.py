@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 06:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0006_documentcounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='tag_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.7 on 2026-10-19 06:44
+
+import os
+
+import apps.documents.storage
+import django.core.validators
+from django.db import migrations, models
+
+
+def populate_original_filenames(apps, schema_editor):
+    """Keep the names of the files already stored; they are moved to blobs by migrate_document_files."""
+    Document = apps.get_model('documents', 'Document')
+    documents = list(Document.objects.exclude(file='').only('id', 'file'))
+    for document in documents:
+        document.original_filename = os.path.basename(document.file.name)[:255]
+    Document.objects.bulk_update(documents, ['original_filename'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0008_uploadsession'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Path of the blob in the storage', max_length=255, unique=True)),
+                ('sha256', models.CharField(db_index=True, max_length=64)),
+                ('size', models.BigIntegerField(help_text='Size of the file in bytes')),
+                ('refcount', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='original_filename',
+            field=models.CharField(blank=True, help_text='Name of the file as uploaded', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='document',
+            name='file',
+            field=models.FileField(storage=apps.documents.storage.get_document_storage, upload_to='documents/%Y/%m/', validators=[django.core.validators.FileExtensionValidator(allowed_extensions=['pdf', 'jpg', 'jpeg', 'png'])]),
+        ),
+        migrations.RunPython(populate_original_filenames, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:01
+
+from django.db import migrations, models
+
+from apps.documents.utils.ocr_utils import index_pages
+
+
+def index_ocr_pages(apps, schema_editor):
+    """Index the pages of the OCR texts already stored."""
+    DocumentOCR = apps.get_model('documents', 'DocumentOCR')
+    batch = []
+    for ocr in DocumentOCR.objects.exclude(full_text='').only('id', 'full_text').iterator(chunk_size=100):
+        ocr.page_offsets = index_pages(ocr.full_text)
+        ocr.text_length = len(ocr.full_text)
+        batch.append(ocr)
+        if len(batch) >= 100:
+            DocumentOCR.objects.bulk_update(batch, ['page_offsets', 'text_length'])
+            batch = []
+    DocumentOCR.objects.bulk_update(batch, ['page_offsets', 'text_length'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0009_content_addressed_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentocr',
+            name='page_offsets',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='documentocr',
+            name='text_length',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='documentocr',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(index_ocr_pages, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:12
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0010_ocr_page_offsets'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storedblob',
+            name='referenced_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, help_text='When a reference was last added'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0011_storedblob_referenced_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='tags_changed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -4,5 +4,10 @@
 from .core import Document, Tag, DocumentType, DocumentOCR
 from .department import Department, Folder
 from .audit import AuditLog
+from .dedup import DocumentSignature, SignatureBand
+from .counters import DocumentCounter
+from .uploads import UploadSession
+from .blobs import StoredBlob
 
-__all__ = ['Document', 'Tag', 'DocumentType', 'DocumentOCR', 'Department', 'Folder', 'AuditLog']
+__all__ = ['Document', 'Tag', 'DocumentType', 'DocumentOCR', 'Department', 'Folder', 'AuditLog',
+           'DocumentSignature', 'SignatureBand', 'DocumentCounter', 'UploadSession', 'StoredBlob']
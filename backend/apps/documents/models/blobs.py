@@ -0,0 +1,28 @@
+"""Content-addressed file storage models."""
+
+from django.db import models
+from django.utils import timezone
+
+
+class StoredBlob(models.Model):
+    """
+    A file stored once under its SHA-256 (see documents.storage).
+    
+    ``refcount`` is the number of stored references to the file: every
+    save of the same content adds one, every delete removes one, and the
+    file itself is removed when none is left. ``referenced_at`` tells
+    prune() which counts may belong to a save still in progress.
+    """
+    
+    name = models.CharField(max_length=255, unique=True, help_text='Path of the blob in the storage')
+    sha256 = models.CharField(max_length=64, db_index=True)
+    size = models.BigIntegerField(help_text='Size of the file in bytes')
+    refcount = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    referenced_at = models.DateTimeField(default=timezone.now, help_text='When a reference was last added')
+    
+    class Meta:
+        ordering = ['name']
+    
+    def __str__(self):
+        return f"{self.name} ({self.refcount} references)"
@@ -1,10 +1,13 @@
 """Core document models."""
 
+import os
+
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.core.validators import FileExtensionValidator
 
 from .department import Department, Folder
+from ..storage import get_document_storage
 
 User = get_user_model()
 
@@ -57,10 +60,14 @@ class Document(models.Model):
         null=True,
         blank=True
     )
+    # Stored once per distinct content (see documents.storage); upload_to
+    # only applies when DOCUMENTS_CONTENT_ADDRESSED is off
     file = models.FileField(
         upload_to='documents/%Y/%m/',  # Default path, will be overridden in get_upload_path
+        storage=get_document_storage,
         validators=[FileExtensionValidator(allowed_extensions=['pdf', 'jpg', 'jpeg', 'png'])]
     )
+    original_filename = models.CharField(max_length=255, blank=True, help_text='Name of the file as uploaded')
     description = models.TextField(blank=True)
     reference_number = models.CharField(max_length=100, blank=True)
     date = models.DateField(null=True, blank=True)
@@ -70,13 +77,37 @@ class Document(models.Model):
     uploaded_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='documents')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Incremented when the document's tags change, which leaves updated_at
+    # untouched; part of the document's ETag
+    tag_version = models.PositiveIntegerField(default=0, editable=False)
+    # When tag_version was last incremented (see apps.search.reindex)
+    tags_changed_at = models.DateTimeField(null=True, blank=True, editable=False)
     
     # OCR and AI fields
     content_text = models.TextField(blank=True, help_text='OCR extracted text')
     is_ocr_processed = models.BooleanField(default=False)
     
+    # Near-duplicate detection (see apps.ai.dedup)
+    duplicate_of = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        related_name='duplicates',
+        null=True,
+        blank=True,
+        help_text='Earlier document this one is a near-duplicate of'
+    )
+    duplicate_similarity = models.FloatField(
+        null=True,
+        blank=True,
+        help_text='Estimated similarity with the original document'
+    )
+    
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination of the document list
+            models.Index(fields=['-created_at', '-id'], name='document_created_id_idx'),
+        ]
     
     def __str__(self):
         return self.title
@@ -92,6 +123,10 @@ class Document(models.Model):
     
     def save(self, *args, **kwargs):
         """Custom save method to set department from user if not provided and ensure folder belongs to department."""
+        # Keep the uploaded name: the stored name is the file's hash
+        if self.file and not self.file._committed:
+            self.original_filename = os.path.basename(self.file.name)[:255]
+        
         # Set department from user if not provided
         if not self.department and self.uploaded_by:
             # Get the user's department string
@@ -125,7 +160,28 @@ class DocumentOCR(models.Model):
     
     document = models.OneToOneField(Document, on_delete=models.CASCADE, related_name='ocr_data')
     full_text = models.TextField(blank=True, help_text='Full OCR extracted text')
+    # [page, start, end] character span of every page of full_text, so
+    # that pages are read without loading the whole text (see ocr_utils)
+    page_offsets = models.JSONField(default=list, blank=True)
+    text_length = models.PositiveIntegerField(default=0)
     processed_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return f"OCR for {self.document.title}"
+    
+    @property
+    def page_count(self):
+        return len(self.page_offsets)
+    
+    def save(self, *args, **kwargs):
+        """Index the pages of the text when it is saved."""
+        from apps.documents.utils.ocr_utils import index_pages
+        
+        update_fields = kwargs.get('update_fields')
+        if 'full_text' not in self.get_deferred_fields() and (update_fields is None or 'full_text' in update_fields):
+            self.page_offsets = index_pages(self.full_text)
+            self.text_length = len(self.full_text)
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'page_offsets', 'text_length', 'updated_at'}
+        super().save(*args, **kwargs)
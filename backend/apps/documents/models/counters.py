@@ -0,0 +1,38 @@
+"""Denormalized document counters."""
+
+from django.db import models
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+
+from .department import Department, Folder
+
+
+class DocumentCounter(models.Model):
+    """
+    Number of documents filed under one (department, folder) pair.
+    
+    Maintained by the document signals (see utils.counter_utils), so that
+    counts per department or folder read a few rows instead of scanning
+    the documents. Repaired with the reconcile_document_counters command.
+    """
+    
+    department = models.ForeignKey(
+        Department, on_delete=models.CASCADE, null=True, blank=True, related_name='document_counters'
+    )
+    folder = models.ForeignKey(
+        Folder, on_delete=models.CASCADE, null=True, blank=True, related_name='document_counters'
+    )
+    count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        constraints = [
+            # One row per pair, unfiled documents (NULLs) included
+            models.UniqueConstraint(
+                Coalesce('department', Value(0)), Coalesce('folder', Value(0)),
+                name='documentcounter_scope_unique'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.department_id}/{self.folder_id}: {self.count}"
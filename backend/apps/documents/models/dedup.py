@@ -0,0 +1,32 @@
+"""Near-duplicate detection models."""
+
+from django.db import models
+
+from .core import Document
+
+
+class DocumentSignature(models.Model):
+    """MinHash signature of a document's OCR text."""
+    
+    document = models.OneToOneField(Document, on_delete=models.CASCADE, related_name='signature')
+    minhash = models.BinaryField(help_text='MinHash values as little-endian uint32')
+    created_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Signature for {self.document_id}"
+
+
+class SignatureBand(models.Model):
+    """LSH bucket of one band of a document's MinHash signature."""
+    
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='signature_bands')
+    band = models.PositiveSmallIntegerField()
+    bucket = models.BigIntegerField()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['band', 'bucket'], name='signatureband_lookup_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Band {self.band} of {self.document_id}"
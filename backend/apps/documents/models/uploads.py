@@ -0,0 +1,37 @@
+"""Resumable upload models."""
+
+import uuid
+
+from django.conf import settings
+from django.db import models
+
+
+class UploadSession(models.Model):
+    """
+    A resumable upload in progress.
+    
+    Chunks are appended to a temporary file (see utils.upload_utils) until
+    ``offset`` reaches ``size``; the document is only created on finalize,
+    with the metadata given when the session was opened.
+    """
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField(help_text='Total size of the file in bytes')
+    offset = models.BigIntegerField(default=0, help_text='Number of bytes received so far')
+    sha256 = models.CharField(max_length=64, blank=True, help_text='Expected SHA-256 of the file, if given')
+    metadata = models.JSONField(default=dict, help_text='Document fields applied on finalize')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    expires_at = models.DateTimeField()
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size})"
+    
+    @property
+    def is_complete(self):
+        return self.offset >= self.size
@@ -0,0 +1,199 @@
+"""Pagination classes for document endpoints."""
+
+import base64
+import json
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class DocumentPageNumberPagination(PageNumberPagination):
+    """Classic page number pagination, with a total count."""
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class DocumentKeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination of documents on (created_at, id).
+
+    Each page is fetched with an indexed range condition on the last row of
+    the previous page instead of an OFFSET, and no COUNT(*) is run, so the
+    cost of a page does not grow with the table or with the page depth.
+
+    Requests with a ``page`` parameter, or ordered on another field, use
+    page number pagination instead, for the UI's numbered pages.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    offset_query_param = 'page'
+    ordering_query_param = 'ordering'
+    keyset_orderings = ('', '-created_at')
+    offset_pagination_class = DocumentPageNumberPagination
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """Return one page of documents, using keyset or page number pagination."""
+        self.request = request
+        self.offset_paginator = None
+
+        if self.use_offset_pagination(request):
+            # Break ordering ties on id so rows never move between pages
+            ordering = list(queryset.query.order_by) or ['-created_at']
+            if not {'id', '-id', 'pk', '-pk'} & set(map(str, ordering)):
+                queryset = queryset.order_by(*ordering, '-id')
+            self.offset_paginator = self.offset_pagination_class()
+            return self.offset_paginator.paginate_queryset(queryset, request, view=view)
+
+        page_size = self.get_page_size(request)
+        created_at, document_id, reverse = self.decode_cursor(request)
+
+        if reverse:
+            # Previous page: walk backwards from the first row of the current page
+            queryset = queryset.order_by('created_at', 'id')
+            if created_at is not None:
+                queryset = queryset.filter(
+                    Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=document_id)
+                )
+        else:
+            queryset = queryset.order_by('-created_at', '-id')
+            if created_at is not None:
+                queryset = queryset.filter(
+                    Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=document_id)
+                )
+
+        # One extra row tells whether there is a page beyond this one
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = created_at is not None
+
+        self.page = results
+        return results
+
+    def use_offset_pagination(self, request):
+        """Tell whether a request asks for page number pagination."""
+        if self.offset_query_param in request.query_params:
+            return True
+        return request.query_params.get(self.ordering_query_param, '') not in self.keyset_orderings
+
+    def get_page_size(self, request):
+        """Return the requested page size, capped at max_page_size."""
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+            if page_size > 0:
+                return min(page_size, self.max_page_size)
+        except (KeyError, ValueError):
+            pass
+        return self.page_size
+
+    def decode_cursor(self, request):
+        """
+        Decode the cursor of the request.
+
+        Returns:
+            (created_at, id, reverse) of the row the page starts after,
+            or (None, None, False) for the first page
+        """
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None, None, False
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+            created_at = parse_datetime(cursor['c'])
+            document_id = int(cursor['i'])
+            if created_at is None:
+                raise ValueError
+        except (KeyError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        return created_at, document_id, bool(cursor.get('r'))
+
+    def encode_cursor(self, document, reverse=False):
+        """Return the link to the page after (or before) a document (an instance or a values() row)."""
+        if isinstance(document, dict):
+            created_at, document_id = document['created_at'], document['id']
+        else:
+            created_at, document_id = document.created_at, document.id
+        cursor = {'c': created_at.isoformat(), 'i': document_id}
+        if reverse:
+            cursor['r'] = 1
+        token = base64.urlsafe_b64encode(json.dumps(cursor).encode('utf-8')).decode('ascii')
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param, token
+        )
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        """Return the page; keyset pages have no total count."""
+        if self.offset_paginator is not None:
+            return self.offset_paginator.get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'count': {
+                    'type': 'integer',
+                    'description': 'Only present with page number pagination',
+                },
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'The pagination cursor value.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.offset_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'A page number, switching to page number pagination.',
+                'schema': {'type': 'integer'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Number of results to return per page.',
+                'schema': {'type': 'integer'},
+            },
+        ]
@@ -1,5 +1,6 @@
 """Custom permissions for document views."""
 
+from django.conf import settings
 from rest_framework import permissions
 
 
@@ -36,28 +37,28 @@ class EnsureCorrectFolderDepartment(permissions.BasePermission):
         # If both folder and department are specified, verify they match
         if folder_id and department_id:
             try:
-                from apps.documents.models import Folder, Department
-                folder = Folder.objects.get(id=int(folder_id))
+                from apps.documents.utils.cache_utils import get_metadata_tree
+                folder = get_metadata_tree().get_folder(int(folder_id))
                 
                 # Check if folder belongs to the specified department
-                if folder.department and str(folder.department.id) != department_id:
+                if folder and str(folder['department_id']) != department_id:
                     print(f"Permission denied: Folder {folder_id} does not belong to department {department_id}")
                     return False
-                    
-                # Log important debugging information
-                print(f"PERMISSION CHECK: Allowing access to folder '{folder.name}' in department ID {department_id}")
+                
+                if folder and getattr(settings, 'DOCUMENTS_DEBUG_FILTERS', False):
+                    print(f"PERMISSION CHECK: Allowing access to folder '{folder['name']}' in department ID {department_id}")
             except Exception as e:
                 # Log but allow (we'll handle filtering properly in get_queryset)
                 print(f"Error checking folder/department relationship: {e}")
-        
+
         # For debugging - if we're looking at Commercial department
-        if department_id and not folder_id:
+        if department_id and not folder_id and getattr(settings, 'DOCUMENTS_DEBUG_FILTERS', False):
             try:
-                dept_id = int(department_id)
-                from apps.documents.models import Department
-                if Department.objects.filter(id=dept_id, name="Commercial").exists():
-                    print(f"PERMISSION CHECK: Viewing Commercial department (ID: {dept_id})")
+                from apps.documents.utils.cache_utils import get_metadata_tree
+                dept = get_metadata_tree().get_department(int(department_id))
+                if dept and dept['name'] == "Commercial":
+                    print(f"PERMISSION CHECK: Viewing Commercial department (ID: {department_id})")
             except Exception as e:
                 print(f"Error in department check: {e}")
-                
+
         return True
@@ -21,7 +21,10 @@ class FolderSerializer(serializers.ModelSerializer):
     
     def get_path(self, obj):
         """Get the full path of the folder."""
-        return obj.get_full_path()
+        # Resolved from the cached tree instead of one query per ancestor
+        from apps.documents.utils.cache_utils import get_metadata_tree
+        path = get_metadata_tree().get_folder_path(obj.id)
+        return path if path is not None else obj.get_full_path()
 
 
 class DepartmentSerializer(serializers.ModelSerializer):
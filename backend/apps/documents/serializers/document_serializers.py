@@ -1,8 +1,10 @@
 """Document serializers."""
 
+from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework import serializers
-from apps.documents.models import Document, Tag, DocumentOCR
+from apps.documents.models import Document, Tag, DocumentOCR, DocumentType, Department, Folder
 from apps.documents.serializers.department_serializers import DepartmentSerializer, FolderSerializer
+from apps.documents.serializers.fieldsets import SparseFieldsetMixin
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -15,16 +17,52 @@ class TagSerializer(serializers.ModelSerializer):
 
 
 class DocumentOCRSerializer(serializers.ModelSerializer):
-    """Document OCR serializer."""
+    """
+    Document OCR serializer.
+    
+    The text itself can be megabytes long: it is read from the ocr_text
+    action, page by page, and left unloaded here.
+    """
+    
+    page_count = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = DocumentOCR
-        fields = ['id', 'full_text', 'processed_at']
-        read_only_fields = ['id', 'processed_at']
+        fields = ['id', 'page_count', 'text_length', 'processed_at', 'updated_at']
+        read_only_fields = fields
 
 
-class DocumentSerializer(serializers.ModelSerializer):
-    """Document serializer."""
+# Relations rendered by the document serializers, and what they load
+DOCUMENT_SELECT_RELATED_FIELDS = {
+    'uploaded_by_username': 'uploaded_by',
+    'department_details': 'department',
+    'department_name': 'department',
+    'folder_details': 'folder',
+    'folder_name': 'folder',
+    'ocr_data': 'ocr_data',
+}
+DOCUMENT_PREFETCH_RELATED_FIELDS = {
+    'tags': 'tags',
+    'department_details.folders': 'department__folders',
+}
+# Columns of the joined relations that are never rendered
+DOCUMENT_DEFERRED_RELATED_FIELDS = {
+    'ocr_data': ['ocr_data__full_text'],
+}
+
+
+class DocumentSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """
+    Document serializer.
+    
+    Renders every field by default; ?fields= and ?expand= select a subset
+    (see SparseFieldsetMixin).
+    """
+    
+    select_related_fields = DOCUMENT_SELECT_RELATED_FIELDS
+    prefetch_related_fields = DOCUMENT_PREFETCH_RELATED_FIELDS
+    deferred_related_fields = DOCUMENT_DEFERRED_RELATED_FIELDS
+    deferrable_fields = ('content_text', 'description')
     
     tags = TagSerializer(many=True, read_only=True)
     ocr_data = DocumentOCRSerializer(read_only=True)
@@ -51,13 +89,17 @@ class DocumentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Document
         fields = [
-            'id', 'title', 'document_type', 'file', 'description', 
+            'id', 'title', 'document_type', 'file', 'original_filename', 'description', 
             'reference_number', 'date', 'department', 'department_details',
             'department_name', 'folder', 'folder_details', 'folder_name',
             'tags', 'tag_ids', 'uploaded_by', 'uploaded_by_username', 
-            'created_at', 'updated_at', 'content_text', 'is_ocr_processed', 'ocr_data'
+            'created_at', 'updated_at', 'content_text', 'is_ocr_processed', 'ocr_data',
+            'duplicate_of', 'duplicate_similarity'
+        ]
+        read_only_fields = [
+            'id', 'original_filename', 'uploaded_by', 'created_at', 'updated_at', 'content_text',
+            'is_ocr_processed', 'duplicate_of', 'duplicate_similarity'
         ]
-        read_only_fields = ['id', 'uploaded_by', 'created_at', 'updated_at', 'content_text', 'is_ocr_processed']
     
     def to_internal_value(self, data):
         """Normalize tag_ids input to a list of integers."""
@@ -158,8 +200,23 @@ class DocumentSerializer(serializers.ModelSerializer):
         return instance
 
 
-class DocumentListSerializer(serializers.ModelSerializer):
-    """Simplified document serializer for list views."""
+class DocumentListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """
+    Simplified document serializer for list views.
+    
+    The department, folder and OCR data of the detail serializer can be
+    added with ?expand= (see SparseFieldsetMixin).
+    """
+    
+    expandable_fields = {
+        'department_details': lambda: DepartmentSerializer(source='department', read_only=True),
+        'folder_details': lambda: FolderSerializer(source='folder', read_only=True),
+        'ocr_data': lambda: DocumentOCRSerializer(read_only=True),
+    }
+    select_related_fields = DOCUMENT_SELECT_RELATED_FIELDS
+    prefetch_related_fields = DOCUMENT_PREFETCH_RELATED_FIELDS
+    deferred_related_fields = DOCUMENT_DEFERRED_RELATED_FIELDS
+    deferrable_fields = ('content_text', 'description')
     
     tags = TagSerializer(many=True, read_only=True)
     uploaded_by_username = serializers.CharField(source='uploaded_by.username', read_only=True)
@@ -172,3 +229,148 @@ class DocumentListSerializer(serializers.ModelSerializer):
             'is_ocr_processed'
         ]
         read_only_fields = fields
+
+
+class DocumentLocationSerializer(serializers.Serializer):
+    """Serializer validating the department and folder a document is filed under."""
+    
+    department = serializers.PrimaryKeyRelatedField(
+        queryset=Department.objects.all(),
+        required=False, allow_null=True, default=None
+    )
+    folder = serializers.PrimaryKeyRelatedField(
+        queryset=Folder.objects.all(),
+        required=False, allow_null=True, default=None
+    )
+    
+    def validate(self, attrs):
+        """Ensure the folder belongs to the department, defaulting to the folder's department."""
+        folder = attrs.get('folder')
+        department = attrs.get('department')
+        if folder and department and folder.department_id != department.pk:
+            raise serializers.ValidationError({
+                'folder': f"Folder '{folder.name}' does not belong to department '{department.name}'"
+            })
+        if folder and not department:
+            attrs['department'] = folder.department
+        return attrs
+
+
+class DocumentMetadataSerializer(DocumentLocationSerializer):
+    """Serializer validating document metadata shared by uploads."""
+    
+    document_type = serializers.ChoiceField(choices=DocumentType.choices, default=DocumentType.OTHER)
+    description = serializers.CharField(required=False, allow_blank=True, default='')
+    reference_number = serializers.CharField(required=False, allow_blank=True, default='', max_length=100)
+    date = serializers.DateField(required=False, allow_null=True, default=None)
+    tag_ids = serializers.PrimaryKeyRelatedField(queryset=Tag.objects.all(), many=True, required=False, default=list)
+    
+    @staticmethod
+    def file_errors(uploaded):
+        """Run the document file validators (bulk_create and sessions skip model validation)."""
+        errors = []
+        for validator in Document._meta.get_field('file').validators:
+            try:
+                validator(uploaded)
+            except DjangoValidationError as e:
+                errors.extend(f"{uploaded.name}: {message}" for message in e.messages)
+        return errors
+
+
+class BulkUploadSerializer(DocumentMetadataSerializer):
+    """Serializer validating a bulk upload: many files sharing the same metadata."""
+    
+    files = serializers.ListField(child=serializers.FileField(), allow_empty=False)
+    
+    def validate_files(self, files):
+        """Check the number and extension of the files."""
+        from apps.documents.utils.bulk_utils import get_bulk_upload_max_files
+        
+        max_files = get_bulk_upload_max_files()
+        if len(files) > max_files:
+            raise serializers.ValidationError(f"At most {max_files} files can be uploaded at once.")
+        
+        errors = []
+        for uploaded in files:
+            errors.extend(self.file_errors(uploaded))
+        if errors:
+            raise serializers.ValidationError(errors)
+        return files
+
+
+class UploadSessionSerializer(DocumentMetadataSerializer):
+    """Serializer opening a resumable upload: the file to expect and the document metadata."""
+    
+    filename = serializers.CharField(max_length=255)
+    size = serializers.IntegerField(min_value=1)
+    sha256 = serializers.RegexField(r'^[0-9a-fA-F]{64}$', required=False, allow_blank=True, default='')
+    title = serializers.CharField(max_length=255, required=False, allow_blank=True, default='')
+    
+    def validate_filename(self, filename):
+        """Check the file extension before any byte is sent."""
+        from django.core.files.base import ContentFile
+        
+        errors = self.file_errors(ContentFile(b'', name=filename))
+        if errors:
+            raise serializers.ValidationError(errors)
+        return filename
+    
+    def validate_size(self, size):
+        """Check the size against UPLOAD_MAX_SIZE."""
+        from django.conf import settings
+        
+        max_size = getattr(settings, 'UPLOAD_MAX_SIZE', 2 * 1024 ** 3)
+        if size > max_size:
+            raise serializers.ValidationError(f"Files are limited to {max_size} bytes.")
+        return size
+    
+    def get_metadata(self):
+        """Return the validated document metadata in a JSON-serializable form."""
+        data = self.validated_data
+        return {
+            'title': data['title'],
+            'document_type': data['document_type'],
+            'description': data['description'],
+            'reference_number': data['reference_number'],
+            'date': data['date'].isoformat() if data['date'] else None,
+            'department': data['department'].pk if data['department'] else None,
+            'folder': data['folder'].pk if data['folder'] else None,
+            'tag_ids': [tag.pk for tag in data['tag_ids']],
+        }
+
+
+class BulkSelectionSerializer(serializers.Serializer):
+    """
+    Serializer selecting the documents of a bulk operation.
+    
+    Either an explicit list of ids, or all_matching to select every
+    document matching the list filters given in the query string.
+    """
+    
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+    all_matching = serializers.BooleanField(required=False, default=False)
+    
+    def validate(self, attrs):
+        """Require exactly one way of selecting the documents."""
+        attrs = super().validate(attrs)
+        if bool(attrs.get('ids')) == attrs['all_matching']:
+            raise serializers.ValidationError("Provide either 'ids' or 'all_matching'.")
+        return attrs
+
+
+class BulkTagSerializer(BulkSelectionSerializer):
+    """Serializer validating a bulk tag operation."""
+    
+    add_tag_ids = serializers.PrimaryKeyRelatedField(queryset=Tag.objects.all(), many=True, required=False, default=list)
+    remove_tag_ids = serializers.PrimaryKeyRelatedField(queryset=Tag.objects.all(), many=True, required=False, default=list)
+    
+    def validate(self, attrs):
+        """Require at least one tag to add or remove."""
+        attrs = super().validate(attrs)
+        if not attrs['add_tag_ids'] and not attrs['remove_tag_ids']:
+            raise serializers.ValidationError("Provide 'add_tag_ids' or 'remove_tag_ids'.")
+        return attrs
+
+
+class BulkMoveSerializer(BulkSelectionSerializer, DocumentLocationSerializer):
+    """Serializer validating a bulk move into a department and folder."""
@@ -0,0 +1,114 @@
+"""Sparse fieldsets and expandable relations for serializers."""
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+def parse_field_list(value):
+    """
+    Parse a comma separated field list.
+
+    ``department_details.name`` selects the name of the nested department.
+
+    Returns:
+        dict mapping each field name to the list of its selected nested
+        fields (empty for all of them)
+    """
+    fields = {}
+    for item in (value or '').split(','):
+        name, _, nested = item.strip().partition('.')
+        if not name:
+            continue
+        fields.setdefault(name, [])
+        if nested:
+            fields[name].append(nested)
+    return fields
+
+
+def get_fieldset(request):
+    """
+    Return the fieldset requested by a read request.
+
+    Returns:
+        (fields, expand): the parsed ?fields= (None when absent: default
+        representation) and ?expand= lists
+    """
+    if request is None or request.method not in ('GET', 'HEAD'):
+        return None, {}
+    params = getattr(request, 'query_params', request.GET)
+    fields = parse_field_list(params[FIELDS_PARAM]) if params.get(FIELDS_PARAM) else None
+    return fields, parse_field_list(params.get(EXPAND_PARAM))
+
+
+def get_fieldset_key(request):
+    """Return a string identifying the requested fieldset, for cache validators."""
+    fields, expand = get_fieldset(request)
+    if fields is None and not expand:
+        return ''
+    return f"{sorted(fields.items()) if fields is not None else '*'}|{sorted(expand.items())}"
+
+
+class SparseFieldsetMixin:
+    """
+    Serializer mixin rendering the fields selected by ?fields= and ?expand=.
+
+    Without parameters, the serializer renders its declared fields. On read
+    requests, ?fields= keeps only the listed fields and ?expand= adds the
+    relations of ``expandable_fields`` (built on demand, so they cost
+    nothing when not requested). Writes always use every field.
+
+    ``select_related_fields`` and ``prefetch_related_fields`` map rendered
+    fields (``name`` or ``name.nested``) to the lookups they need, and
+    ``deferrable_fields`` are model fields left unloaded when not rendered;
+    ``deferred_related_fields`` maps select_related lookups to the columns
+    of the relation never rendered. See get_queryset_plan().
+    """
+
+    expandable_fields = {}
+    select_related_fields = {}
+    prefetch_related_fields = {}
+    deferrable_fields = ()
+    deferred_related_fields = {}
+
+    def get_fields(self):
+        """Apply the requested fieldset to the declared fields."""
+        fields = super().get_fields()
+        requested, expand = get_fieldset(self.context.get('request'))
+        if requested is None and not expand:
+            return fields
+
+        selection = {**expand, **(requested or {})}
+        for name in selection:
+            if name in self.expandable_fields and name not in fields:
+                fields[name] = self.expandable_fields[name]()
+        if requested is not None:
+            fields = type(fields)((name, field) for name, field in fields.items() if name in selection)
+
+        # Nested selections, e.g. department_details.name
+        for name, nested in selection.items():
+            if nested and name in fields:
+                serializer = getattr(fields[name], 'child', fields[name])
+                for nested_name in list(getattr(serializer, 'fields', {})):
+                    if nested_name not in nested:
+                        serializer.fields.pop(nested_name)
+        return fields
+
+    def get_queryset_plan(self):
+        """
+        Return the lookups needed to render the selected fields.
+
+        Returns:
+            (select_related lookups, prefetch_related lookups, deferred fields)
+        """
+        rendered = set()
+        for name, field in self.fields.items():
+            rendered.add(name)
+            nested = getattr(getattr(field, 'child', field), 'fields', None)
+            if nested is not None:
+                rendered.update(f'{name}.{nested_name}' for nested_name in nested)
+
+        select = sorted({lookup for name, lookup in self.select_related_fields.items() if name in rendered})
+        prefetch = sorted({lookup for name, lookup in self.prefetch_related_fields.items() if name in rendered})
+        defer = [name for name in self.deferrable_fields if name not in rendered]
+        defer += [name for lookup in select for name in self.deferred_related_fields.get(lookup, ())]
+        return select, prefetch, defer
@@ -2,12 +2,32 @@
 
 from rest_framework import serializers
 from apps.documents.models import DocumentOCR
+from apps.documents.utils.ocr_utils import get_page_texts
 
 
 class DocumentOCRSerializer(serializers.ModelSerializer):
     """Serializer for OCR data."""
     
+    page_count = serializers.IntegerField(read_only=True)
+    
+    class Meta:
+        model = DocumentOCR
+        fields = ['full_text', 'page_count', 'text_length', 'processed_at']
+        read_only_fields = fields
+
+
+class DocumentOCRPagesSerializer(serializers.ModelSerializer):
+    """Serializer for a range of pages of OCR data, given as (first, last) in the page_range context."""
+    
+    page_count = serializers.IntegerField(read_only=True)
+    pages = serializers.SerializerMethodField()
+    
     class Meta:
         model = DocumentOCR
-        fields = ['full_text', 'processed_at']
-        read_only_fields = ['full_text', 'processed_at']
+        fields = ['page_count', 'text_length', 'processed_at', 'pages']
+        read_only_fields = fields
+    
+    def get_pages(self, obj):
+        """Get the text of the requested pages, read with one query."""
+        first, last = self.context['page_range']
+        return get_page_texts(obj, first, last)
@@ -0,0 +1,170 @@
+"""Fast document serializers working on values() rows.
+
+ModelSerializer spends most of the time of a large page in its field
+machinery: building bound fields, resolving sources attribute by attribute
+and instantiating model objects. These serializers read a ``values()``
+projection instead and load the tags of all the rows with one query, while
+rendering exactly what their ModelSerializer counterpart renders (see the
+parity tests and the benchmark_document_list command).
+"""
+
+from rest_framework import serializers
+
+from apps.documents.models import Document, DocumentType
+from apps.documents.serializers.document_serializers import DocumentListSerializer
+from apps.documents.serializers.export_serializers import DocumentExportSerializer
+
+# Reused to format values exactly like the ModelSerializer fields do
+_date_field = serializers.DateField()
+_datetime_field = serializers.DateTimeField()
+_export_datetime_field = serializers.DateTimeField(format="%Y-%m-%d %H:%M")
+
+
+def format_date(value):
+    return _date_field.to_representation(value) if value is not None else None
+
+
+def format_datetime(value):
+    return _datetime_field.to_representation(value) if value is not None else None
+
+
+def get_document_tags(document_ids=None, documents=None):
+    """
+    Load the tags of many documents with one query.
+
+    Args:
+        document_ids: Ids of the documents (a page)
+        documents: Or a queryset of the documents, used as a subquery (an
+            export of any size)
+
+    Returns:
+        dict mapping document ids to lists of (tag id, tag name), in tag
+        name order like Document.tags.all()
+    """
+    through = Document.tags.through
+    rows = through.objects.order_by('tag__name', 'tag_id')
+    if documents is not None:
+        rows = rows.filter(document_id__in=documents.order_by().values('id'))
+    else:
+        rows = rows.filter(document_id__in=document_ids)
+
+    tags = {}
+    for document_id, tag_id, tag_name in rows.values_list('document_id', 'tag_id', 'tag__name'):
+        tags.setdefault(document_id, []).append((tag_id, tag_name))
+    return tags
+
+
+class ValuesSerializer:
+    """
+    Base class of the serializers rendering values() rows.
+
+    Subclasses name the ModelSerializer they stand in for
+    (``serializer_class``), list the ``value_fields`` they read and render
+    one row in to_representation(row, tags). ``fields`` keeps only some of
+    the rendered keys, like a ?fields= selection (see can_render()).
+    """
+
+    serializer_class = None
+    value_fields = ()
+
+    def __init__(self, fields=None):
+        self.fields = fields
+
+    @classmethod
+    def can_render(cls, fields, expand):
+        """
+        Tell whether a requested fieldset can be rendered from values() rows.
+
+        Expanded relations, whether listed in ?expand= or ?fields=, and
+        nested selections need the ModelSerializer.
+        """
+        if expand:
+            return False
+        if fields is None:
+            return True
+        expandable_fields = getattr(cls.serializer_class, 'expandable_fields', {})
+        return not any(nested or name in expandable_fields for name, nested in fields.items())
+
+    def get_queryset(self, queryset):
+        """Return the values() projection of a document queryset, keeping its filters and ordering."""
+        return queryset.select_related(None).prefetch_related(None).values(*self.value_fields)
+
+    def render(self, rows, documents=None):
+        """
+        Render values() rows.
+
+        Args:
+            rows: Rows of the projection returned by get_queryset()
+            documents: Queryset of the rows, to load their tags with a
+                subquery instead of a list of ids
+
+        Returns:
+            list of dicts
+        """
+        rows = list(rows)
+        if documents is not None:
+            tags = get_document_tags(documents=documents)
+        else:
+            tags = get_document_tags(document_ids=[row['id'] for row in rows]) if rows else {}
+        data = [self.to_representation(row, tags.get(row['id'], ())) for row in rows]
+        if self.fields is not None:
+            data = [{key: value for key, value in item.items() if key in self.fields} for item in data]
+        return data
+
+    def render_queryset(self, queryset):
+        """Render a whole document queryset."""
+        # A sliced queryset can't be a subquery everywhere: its ids are used instead
+        documents = None if queryset.query.is_sliced else queryset
+        return self.render(self.get_queryset(queryset), documents=documents)
+
+
+class DocumentListValuesSerializer(ValuesSerializer):
+    """Renders documents exactly like DocumentListSerializer."""
+
+    serializer_class = DocumentListSerializer
+    value_fields = (
+        'id', 'title', 'document_type', 'reference_number', 'date',
+        'uploaded_by__username', 'created_at', 'is_ocr_processed',
+    )
+
+    def to_representation(self, row, tags):
+        return {
+            'id': row['id'],
+            'title': row['title'],
+            'document_type': row['document_type'],
+            'reference_number': row['reference_number'],
+            'date': format_date(row['date']),
+            'tags': [{'id': tag_id, 'name': name} for tag_id, name in tags],
+            'uploaded_by_username': row['uploaded_by__username'],
+            'created_at': format_datetime(row['created_at']),
+            'is_ocr_processed': row['is_ocr_processed'],
+        }
+
+
+class DocumentExportValuesSerializer(ValuesSerializer):
+    """Renders documents exactly like DocumentExportSerializer."""
+
+    serializer_class = DocumentExportSerializer
+    value_fields = (
+        'id', 'title', 'document_type', 'department__name', 'folder__name', 'reference_number',
+        'date', 'description', 'uploaded_by__username', 'created_at', 'updated_at', 'is_ocr_processed',
+    )
+    document_type_labels = dict(DocumentType.choices)
+
+    def to_representation(self, row, tags):
+        return {
+            'id': row['id'],
+            'title': row['title'],
+            'document_type': row['document_type'],
+            'document_type_display': self.document_type_labels.get(row['document_type'], row['document_type']),
+            'department_name': row['department__name'] or '',
+            'folder_name': row['folder__name'] or '',
+            'reference_number': row['reference_number'],
+            'date': format_date(row['date']),
+            'description': row['description'],
+            'tags': ', '.join(name for tag_id, name in tags),
+            'created_by': row['uploaded_by__username'] or '',
+            'created_at': _export_datetime_field.to_representation(row['created_at']),
+            'updated_at': _export_datetime_field.to_representation(row['updated_at']),
+            'is_ocr_processed': 'Yes' if row['is_ocr_processed'] else 'No',
+        }
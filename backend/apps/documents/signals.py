@@ -1,10 +1,16 @@
 """Signal handlers for document models to track changes and activities."""
 
+from django.db import transaction
+from django.db.models import F
 from django.db.models.signals import pre_save, post_save, m2m_changed, post_delete
 from django.dispatch import receiver
+from django.utils import timezone
 from django.contrib.admin.models import LogEntry, ADDITION, CHANGE, DELETION
-from apps.documents.models import Document, Tag
+from apps.documents.models import Document, DocumentOCR, Tag, Department, Folder
+from apps.documents.storage import ContentAddressedStorage, release_on_commit
 from apps.documents.utils.audit_utils import log_user_activity, get_model_changes
+from apps.documents.utils.cache_utils import bump_generation_on_commit
+from apps.documents.utils.counter_utils import adjust_counter, reconcile_counters
 
 
 @receiver(pre_save, sender=Document)
@@ -124,3 +130,116 @@ def log_tag_changes(sender, instance, action, pk_set, **kwargs):
             changes={'removed_tags': list(pk_set)},
             request=request
         )
+
+
+@receiver(post_save, sender=Document)
+@receiver(post_delete, sender=Document)
+@receiver(post_save, sender=DocumentOCR)
+@receiver(post_delete, sender=DocumentOCR)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(m2m_changed, sender=Document.tags.through)
+def bump_documents_generation(sender, **kwargs):
+    """Invalidate cached data derived from documents."""
+    bump_generation_on_commit('documents')
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def bump_tags_generation(sender, **kwargs):
+    """Invalidate ETags of documents showing a renamed or deleted tag."""
+    bump_generation_on_commit('tags')
+
+
+@receiver(m2m_changed, sender=Document.tags.through)
+def bump_tag_version(sender, instance, action, reverse, pk_set, **kwargs):
+    """Bump the tag version of documents whose tags changed."""
+    if action == 'pre_clear' and reverse:
+        # The cleared documents are only known before the clear
+        instance._cleared_document_ids = list(instance.documents.values_list('id', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    
+    if not reverse:
+        if action != 'post_clear' and not pk_set:
+            return
+        now = timezone.now()
+        Document.objects.filter(pk=instance.pk).update(tag_version=F('tag_version') + 1, tags_changed_at=now)
+        instance.tag_version += 1
+        instance.tags_changed_at = now
+        return
+    
+    document_ids = pk_set if action != 'post_clear' else getattr(instance, '_cleared_document_ids', [])
+    if document_ids:
+        Document.objects.filter(pk__in=document_ids).update(
+            tag_version=F('tag_version') + 1, tags_changed_at=timezone.now()
+        )
+
+
+@receiver(post_save, sender=Department)
+@receiver(post_delete, sender=Department)
+@receiver(post_save, sender=Folder)
+@receiver(post_delete, sender=Folder)
+def bump_metadata_generation(sender, **kwargs):
+    """Invalidate cached data derived from departments and folders."""
+    bump_generation_on_commit('metadata')
+
+
+@receiver(post_save, sender=Document)
+def count_saved_document(sender, instance, created, **kwargs):
+    """Keep the department/folder counters in step with created and moved documents."""
+    if created:
+        adjust_counter(instance.department_id, instance.folder_id, 1)
+        return
+    
+    old_instance = getattr(instance, '_previous_instance', None)
+    if old_instance is None:
+        return
+    old_scope = (old_instance.department_id, old_instance.folder_id)
+    new_scope = (instance.department_id, instance.folder_id)
+    if old_scope != new_scope:
+        adjust_counter(*old_scope, -1)
+        adjust_counter(*new_scope, 1)
+
+
+@receiver(post_delete, sender=Document)
+def count_deleted_document(sender, instance, **kwargs):
+    """Decrement the counter of a deleted document's department/folder."""
+    adjust_counter(instance.department_id, instance.folder_id, -1)
+
+
+@receiver(post_delete, sender=Folder)
+def recount_folder_department(sender, instance, **kwargs):
+    """
+    Recount a department once one of its folders is deleted.
+    
+    Its documents were unfiled with an UPDATE (SET_NULL), which sends no
+    signal. Deferred to the commit, when a department deleted along with
+    the folder is gone as well.
+    """
+    department_id = instance.department_id
+    transaction.on_commit(lambda: reconcile_counters([department_id]))
+
+
+@receiver(post_save, sender=Document)
+def release_replaced_file(sender, instance, created, **kwargs):
+    """Drop the reference to a document's previous file once a new one is committed."""
+    old_instance = getattr(instance, '_previous_instance', None)
+    if created or old_instance is None or not old_instance.file:
+        return
+    if old_instance.file.name != instance.file.name:
+        release_file(old_instance.file)
+
+
+@receiver(post_delete, sender=Document)
+def release_deleted_file(sender, instance, **kwargs):
+    """Drop the reference to a deleted document's file once the deletion is committed."""
+    if instance.file:
+        release_file(instance.file)
+
+
+def release_file(field_file):
+    """Drop a reference to a content-addressed file after the commit; other storages keep their files."""
+    if isinstance(field_file.storage, ContentAddressedStorage):
+        release_on_commit(field_file.storage, field_file.name)
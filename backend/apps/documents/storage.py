@@ -0,0 +1,360 @@
+"""Content-addressed storage for document files.
+
+Files are stored once, under their SHA-256 in a sharded tree
+(``documents/blobs/ab/cd/abcd...ef.pdf``), whatever the name they were
+uploaded with; the original name is kept on the document. Uploading a
+file already in the archive only adds a reference to the existing blob,
+and a blob is removed once its last reference is deleted.
+
+References are counted in the StoredBlob table. Every change to a blob's
+count or file happens with its row locked, so a save of some content
+can't race the removal of the same content. A count is committed before
+the document referencing the file is inserted: prune() recounts the
+references from the documents, so that a failed save doesn't keep its
+blob forever.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, Value, When
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+BLOB_PREFIX = 'documents/blobs'
+
+_state = threading.local()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage naming files after their content."""
+
+    def blob_name(self, sha256, name):
+        """Return the storage name of a blob, keeping the extension of the uploaded name."""
+        extension = os.path.splitext(name)[1].lower()
+        return f'{BLOB_PREFIX}/{sha256[:2]}/{sha256[2:4]}/{sha256}{extension}'
+
+    def is_blob(self, name):
+        """Tell whether a name is a content-addressed blob (other files predate the storage)."""
+        return name.startswith(BLOB_PREFIX + '/')
+
+    def get_available_name(self, name, max_length=None):
+        """Names are derived from the content, so an existing name is the same file."""
+        return name
+
+    def _save(self, name, content):
+        """
+        Store a file under its hash, or reference the blob already there.
+
+        The content is hashed while it is copied to a temporary file next
+        to the blobs, which is then moved into place unless the blob exists.
+        Inside batched_references(), this is done for all the files at once
+        when the batch exits.
+        """
+        from apps.documents.models import StoredBlob
+
+        temp_path, sha256, size = self._write_temp(content)
+        blob_name = self.blob_name(sha256, name)
+        if getattr(_state, 'batch', None) is not None:
+            _state.batch.append((self, blob_name, sha256, size, temp_path))
+            return blob_name
+
+        try:
+            with transaction.atomic():
+                blob = self._lock_blob(blob_name, sha256, size)
+                self._place(blob_name, temp_path)
+                StoredBlob.objects.filter(pk=blob.pk).update(
+                    refcount=F('refcount') + 1, referenced_at=timezone.now()
+                )
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        return blob_name
+
+    def _write_temp(self, content):
+        """Copy content to a temporary file, returning its path, SHA-256 and size."""
+        temp_dir = self.path(f'{BLOB_PREFIX}/tmp')
+        os.makedirs(temp_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=temp_dir, suffix='.part')
+        try:
+            hasher = hashlib.sha256()
+            size = 0
+            with os.fdopen(fd, 'wb') as temp_file:
+                for chunk in content.chunks():
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode('utf-8')
+                    hasher.update(chunk)
+                    size += len(chunk)
+                    temp_file.write(chunk)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        return temp_path, hasher.hexdigest(), size
+
+    def _place(self, blob_name, temp_path):
+        """Move a temporary file into place as a blob, unless the blob exists (its row must be locked)."""
+        path = self.path(blob_name)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temp_path, path)
+            os.chmod(path, self.file_permissions_mode or 0o644)
+
+    def _add_references(self, entries):
+        """
+        Store a batch of files written by _save, with a constant number of queries.
+
+        Args:
+            entries: (blob_name, sha256, size, temp_path) of every saved file
+        """
+        from apps.documents.models import StoredBlob
+
+        counts = {}
+        for blob_name, sha256, size, temp_path in entries:
+            counts[blob_name] = counts.get(blob_name, 0) + 1
+        try:
+            with transaction.atomic():
+                StoredBlob.objects.bulk_create([
+                    StoredBlob(name=blob_name, sha256=sha256, size=size)
+                    for blob_name, sha256, size, temp_path in {entry[0]: entry for entry in entries}.values()
+                ], ignore_conflicts=True)
+                # Locked in name order, so that concurrent batches don't deadlock
+                list(StoredBlob.objects.select_for_update().filter(name__in=counts).order_by('name'))
+                for blob_name, sha256, size, temp_path in entries:
+                    self._place(blob_name, temp_path)
+                StoredBlob.objects.filter(name__in=counts).update(refcount=F('refcount') + Case(
+                    *[When(name=blob_name, then=Value(count)) for blob_name, count in counts.items()],
+                    default=Value(0)
+                ), referenced_at=timezone.now())
+        finally:
+            for entry in entries:
+                if os.path.exists(entry[3]):
+                    os.remove(entry[3])
+
+    def _lock_blob(self, name, sha256, size):
+        """Return the row of a blob, created if needed, locked until the transaction ends."""
+        from apps.documents.models import StoredBlob
+
+        blobs = StoredBlob.objects.select_for_update()
+        blob = blobs.filter(name=name).first()
+        if blob is not None:
+            return blob
+        try:
+            with transaction.atomic():
+                StoredBlob.objects.create(name=name, sha256=sha256, size=size)
+        except IntegrityError:
+            # Created concurrently
+            pass
+        return blobs.get(name=name)
+
+    def delete(self, name):
+        """
+        Remove a reference to a file.
+
+        The blob itself is removed after the commit, if no reference was
+        added meanwhile. Files stored before this storage are deleted.
+        """
+        if name:
+            self.delete_many([name])
+
+    def delete_many(self, names):
+        """Remove one reference per name, with a constant number of queries for the blobs."""
+        from apps.documents.models import StoredBlob
+
+        counts = {}
+        for name in names:
+            if self.is_blob(name):
+                counts[name] = counts.get(name, 0) + 1
+            elif name:
+                super().delete(name)
+        if not counts:
+            return
+
+        with transaction.atomic():
+            blobs = list(StoredBlob.objects.select_for_update().filter(name__in=counts).order_by('name'))
+            for name in set(counts) - {blob.name for blob in blobs}:
+                print(f"Warning: no reference count for blob {name}, leaving it in place")
+            StoredBlob.objects.filter(name__in=counts).update(refcount=F('refcount') - Case(
+                *[When(name=name, then=Value(count)) for name, count in counts.items()],
+                default=Value(0)
+            ))
+            unreferenced = [blob.name for blob in blobs if blob.refcount <= counts[blob.name]]
+
+        def remove_blobs():
+            for name in unreferenced:
+                self.remove_unreferenced(name)
+
+        if unreferenced:
+            transaction.on_commit(remove_blobs)
+
+    def remove_unreferenced(self, name):
+        """Remove a blob and its row if nothing references it anymore."""
+        from apps.documents.models import Document, StoredBlob
+
+        with transaction.atomic():
+            blob = StoredBlob.objects.select_for_update().filter(name=name).first()
+            if blob is None or blob.refcount > 0:
+                return False
+            if Document.objects.filter(file=name).exists():
+                # Count too low (see recount_references)
+                return False
+            super().delete(name)
+            blob.delete()
+        return True
+
+    def recount_references(self, cutoff):
+        """
+        Set the reference counts of blobs to the number of documents using them.
+
+        The count of a save whose document is never inserted (an error, a
+        rolled back transaction) stays one too high, and a delete that
+        failed after its commit leaves one too. Blobs referenced since
+        cutoff are skipped: their saves may still be in progress.
+
+        Returns:
+            Number of counts corrected
+        """
+        from apps.documents.models import Document, StoredBlob
+
+        references = dict(
+            Document.objects.filter(file__startswith=BLOB_PREFIX + '/').order_by()
+            .values('file').annotate(count=Count('id')).values_list('file', 'count')
+        )
+        stale = [
+            name for name, refcount in
+            StoredBlob.objects.filter(referenced_at__lt=cutoff).values_list('name', 'refcount')
+            if refcount != references.get(name, 0)
+        ]
+
+        corrected = 0
+        for name in stale:
+            with transaction.atomic():
+                blob = StoredBlob.objects.select_for_update().filter(name=name, referenced_at__lt=cutoff).first()
+                if blob is None:
+                    continue
+                count = Document.objects.filter(file=name).count()
+                if blob.refcount != count:
+                    StoredBlob.objects.filter(pk=blob.pk).update(refcount=count)
+                    corrected += 1
+        return corrected
+
+    def prune(self, min_age=24 * 3600):
+        """
+        Recount references, then remove blobs left without references and
+        files without a blob row.
+
+        Rows and files younger than min_age seconds are kept: they may
+        belong to an upload whose transaction is still open.
+
+        Returns:
+            dict with the number of counts corrected, blobs and orphan
+            files removed
+        """
+        import time
+        from datetime import timedelta
+        from apps.documents.models import StoredBlob
+
+        cutoff = timezone.now() - timedelta(seconds=min_age)
+        recounted = self.recount_references(cutoff)
+        blobs = 0
+        for name in StoredBlob.objects.filter(refcount__lte=0, created_at__lt=cutoff).values_list('name', flat=True):
+            blobs += self.remove_unreferenced(name)
+
+        orphans = 0
+        root = self.path(BLOB_PREFIX)
+        known = set(StoredBlob.objects.values_list('name', flat=True))
+        for directory, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, self.location).replace(os.sep, '/')
+                if name not in known and os.path.getmtime(path) < time.time() - min_age:
+                    os.remove(path)
+                    orphans += 1
+
+        return {"recounted": recounted, "blobs": blobs, "orphans": orphans}
+
+
+@contextmanager
+def batched_references():
+    """
+    Context manager storing the files saved inside it in one go.
+
+    Bulk uploads save many files: their blobs are created and referenced
+    with a few queries when the batch exits (even on error, so that the
+    files saved can be deleted again), instead of a few queries per file.
+    """
+    if getattr(_state, 'batch', None) is not None:
+        yield
+        return
+    _state.batch = []
+    try:
+        yield
+    finally:
+        batch, _state.batch = _state.batch, None
+        by_storage = {}
+        for storage, *entry in batch:
+            by_storage.setdefault(storage, []).append(entry)
+        for storage, entries in by_storage.items():
+            storage._add_references(entries)
+
+
+def release_on_commit(storage, name):
+    """
+    Delete a document file once the current transaction commits.
+
+    Inside batched_releases(), the files are deleted together, after the
+    commit as well.
+    """
+    releases = getattr(_state, 'releases', None)
+    if releases is not None:
+        releases.append((storage, name))
+        return
+    transaction.on_commit(lambda: _delete_files([(storage, name)]))
+
+
+@contextmanager
+def batched_releases():
+    """Context manager grouping the file deletions raised inside it (e.g. by a bulk delete)."""
+    if getattr(_state, 'releases', None) is not None:
+        yield
+        return
+    _state.releases = []
+    try:
+        yield
+    finally:
+        releases, _state.releases = _state.releases, None
+        if releases:
+            transaction.on_commit(lambda: _delete_files(releases))
+
+
+def _delete_files(releases):
+    """Delete (storage, name) pairs, grouped by storage."""
+    by_storage = {}
+    for storage, name in releases:
+        by_storage.setdefault(storage, []).append(name)
+    for storage, names in by_storage.items():
+        try:
+            if hasattr(storage, 'delete_many'):
+                storage.delete_many(names)
+            else:
+                for name in names:
+                    storage.delete(name)
+        except Exception as e:
+            print(f"Error releasing document files: {str(e)}")
+
+
+def get_document_storage():
+    """Return the storage of document files: content-addressed unless DOCUMENTS_CONTENT_ADDRESSED is off."""
+    if getattr(settings, 'DOCUMENTS_CONTENT_ADDRESSED', True):
+        return document_storage
+    return default_storage
+
+
+document_storage = ContentAddressedStorage()
@@ -0,0 +1,1171 @@
+"""Tests for document API functionality."""
+
+from io import StringIO
+from unittest.mock import patch
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from apps.documents.models import Document
+from apps.documents.views.document_views import DocumentViewSet
+from config.query_budget import (
+    QUERY_COUNT_HEADER, QueryBudgetExceeded, QueryBudgetTestMixin, get_query_budget
+)
+from config.testing import TemporaryMediaTestCase
+
+User = get_user_model()
+
+
+class DocumentPaginationTestCase(TemporaryMediaTestCase):
+    """Test cases for the document list pagination."""
+
+    def setUp(self):
+        """Set up test environment."""
+        self.user = User.objects.create_user(username='clerk', password='testpassword')
+        self.documents = [
+            Document.objects.create(
+                title=f'Document {i}', uploaded_by=self.user, is_ocr_processed=True,
+                file=SimpleUploadedFile('doc.pdf', b'%PDF-1.4', content_type='application/pdf'),
+            )
+            for i in range(5)
+        ]
+        # Identical timestamps must not break the ordering
+        Document.objects.filter(id__in=[doc.id for doc in self.documents[1:3]]).update(
+            created_at=self.documents[1].created_at
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def expected_ids(self):
+        """Return the document ids in (created_at, id) descending order."""
+        return list(Document.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+
+    def test_cursor_pages_cover_every_document(self):
+        """Test that following next links walks every document once, without a count."""
+        ids = []
+        url = '/api/documents/?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertNotIn('count', response.data)
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+
+        self.assertEqual(ids, self.expected_ids())
+
+    def test_previous_link(self):
+        """Test that the previous link returns the preceding page."""
+        first = self.client.get('/api/documents/?page_size=2')
+        second = self.client.get(first.data['next'])
+        previous = self.client.get(second.data['previous'])
+
+        self.assertEqual(previous.data['results'], first.data['results'])
+        self.assertIsNone(first.data['previous'])
+
+    def test_page_parameter_uses_offset_pagination(self):
+        """Test that the UI's numbered pages still get a total count."""
+        response = self.client.get('/api/documents/?page=2&page_size=2')
+
+        self.assertEqual(response.data['count'], 5)
+        self.assertEqual([item['id'] for item in response.data['results']], self.expected_ids()[2:4])
+
+    def test_invalid_cursor(self):
+        """Test that a malformed cursor is rejected."""
+        response = self.client.get('/api/documents/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 404)
+
+
+class MetadataCacheTestCase(TemporaryMediaTestCase):
+    """Test cases for the cached department/folder tree."""
+
+    def setUp(self):
+        """Set up test environment."""
+        from apps.documents.models import Department, Folder
+
+        self.user = User.objects.create_user(username='clerk', password='testpassword')
+        self.commercial = Department.objects.create(name='Commercial', code='COM')
+        self.finance = Department.objects.create(name='Finance', code='FIN')
+        self.contracts = Folder.objects.create(name='Contracts', department=self.commercial)
+        for title, document_type in [('Sale contract', 'contract'), ('Invoice', 'invoice')]:
+            Document.objects.create(
+                title=title, document_type=document_type, uploaded_by=self.user,
+                department=self.commercial, folder=self.contracts, is_ocr_processed=True,
+                file=SimpleUploadedFile('doc.pdf', b'%PDF-1.4', content_type='application/pdf'),
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_filtered_list_runs_no_lookup_queries(self):
+        """Test that department/folder filters are resolved from the cache."""
+        url = f'/api/documents/?department_id={self.commercial.id}&folder_id={self.contracts.id}'
+        self.client.get(url)  # Warm the metadata cache
+
+        with self.assertNumQueries(3):  # ETag aggregate + documents + their tags
+            response = self.client.get(url)
+
+        # Commercial/Contracts only lists contract documents
+        self.assertEqual([item['title'] for item in response.data['results']], ['Sale contract'])
+
+    def test_folder_department_mismatch_is_denied(self):
+        """Test that a folder requested under another department is refused."""
+        url = f'/api/documents/?department_id={self.finance.id}&folder_id={self.contracts.id}'
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_tree_is_refreshed_after_changes(self):
+        """Test that renaming a folder invalidates the cached tree."""
+        from apps.documents.utils.cache_utils import get_metadata_tree
+
+        self.assertEqual(get_metadata_tree().get_folder(self.contracts.id)['name'], 'Contracts')
+        self.contracts.name = 'Agreements'
+        self.contracts.save()
+        self.assertEqual(get_metadata_tree().get_folder(self.contracts.id)['name'], 'Agreements')
+
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://127.0.0.1:1/1',
+    }})
+    def test_unreachable_cache_does_not_fail_writes(self):
+        """Test that documents are saved and listed while the cache is down."""
+        from apps.documents.utils.cache_utils import get_generation, get_metadata_tree
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.contracts.name = 'Agreements'
+            self.contracts.save()
+        self.assertNotEqual(get_generation('metadata'), get_generation('metadata'))
+        self.assertEqual(get_metadata_tree().get_folder(self.contracts.id)['name'], 'Agreements')
+        self.assertEqual(self.client.get('/api/documents/').status_code, 200)
+
+@override_settings(QUERY_BUDGET_MODE='raise')
+class QueryBudgetTestCase(QueryBudgetTestMixin, TemporaryMediaTestCase):
+    """Test cases for the query budgets of the document endpoints."""
+
+    def setUp(self):
+        """Set up test environment."""
+        from apps.documents.models import Department, Folder, Tag
+
+        self.user = User.objects.create_user(username='clerk', password='testpassword')
+        self.department = Department.objects.create(name='Finance', code='FIN')
+        self.folder = Folder.objects.create(name='Invoices', department=self.department)
+        self.tag = Tag.objects.create(name='paid')
+        self.document = self.create_documents(1)[0]
+        self.client = APIClient()
+        # A real token, so that the user lookup is counted like in production
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def create_documents(self, count):
+        """Create tagged documents in the test folder."""
+        from apps.documents.models import Folder
+
+        documents = []
+        for i in range(count):
+            document = Document.objects.create(
+                title=f'Invoice {i}', uploaded_by=self.user, is_ocr_processed=True,
+                department=self.department, folder=self.folder,
+                file=SimpleUploadedFile('doc.pdf', b'%PDF-1.4', content_type='application/pdf'),
+            )
+            document.tags.add(self.tag)
+            documents.append(document)
+        Folder.objects.create(name=f'Archive {Folder.objects.count()}', department=self.department, parent=self.folder)
+        return documents
+
+    def test_endpoints_within_budget(self):
+        """Test that the document endpoints stay within their declared budgets."""
+        from apps.documents.views.audit_views import DocumentAuditLogView
+        from apps.documents.views.department_views import DepartmentViewSet, FolderViewSet
+
+        checks = [
+            (DocumentViewSet, 'list', '/api/documents/'),
+            (DocumentViewSet, 'list', '/api/documents/?page=1'),
+            (DocumentViewSet, 'retrieve', f'/api/documents/{self.document.id}/'),
+            (DepartmentViewSet, 'list', '/api/departments/'),
+            (FolderViewSet, 'list', '/api/folders/'),
+            (DocumentAuditLogView, 'get', f'/api/documents/{self.document.id}/audit-logs/'),
+        ]
+        for view_class, action, url in checks:
+            with self.subTest(url=url), self.assertWithinQueryBudget(view_class, action):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_lists_have_no_n_plus_one(self):
+        """Test that list query counts do not grow with the number of rows."""
+        for url in ['/api/documents/', '/api/departments/', '/api/folders/',
+                    f'/api/documents/{self.document.id}/audit-logs/']:
+            with self.subTest(url=url):
+                self.assertConstantQueries(lambda: self.client.get(url), lambda: self.create_documents(3))
+
+    def test_middleware_reports_query_count(self):
+        """Test that the middleware counts queries and enforces the budget."""
+        response = self.client.get('/api/documents/')
+        self.assertLessEqual(int(response[QUERY_COUNT_HEADER]), get_query_budget(DocumentViewSet, 'list'))
+
+        with patch.object(DocumentViewSet, 'query_budget', {'list': 1}):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get('/api/documents/')
+
+
+class DocumentCounterTestCase(TemporaryMediaTestCase):
+    """Test cases for the per-department and per-folder document counters."""
+
+    def setUp(self):
+        """Set up test environment."""
+        from apps.documents.models import Department, Folder
+
+        self.user = User.objects.create_user(username='clerk', password='testpassword')
+        self.finance = Department.objects.create(name='Finance', code='FIN')
+        self.legal = Department.objects.create(name='Legal', code='LEG')
+        self.invoices = Folder.objects.create(name='Invoices', department=self.finance)
+
+    def create_document(self, department=None, folder=None):
+        """Create a document filed under a department and folder."""
+        return Document.objects.create(
+            title='Document', uploaded_by=self.user, is_ocr_processed=True,
+            department=department, folder=folder,
+            file=SimpleUploadedFile('doc.pdf', b'%PDF-1.4', content_type='application/pdf'),
+        )
+
+    def actual_counts(self):
+        """Count the documents per (department, folder) pair the slow way."""
+        from collections import Counter
+
+        return dict(Counter(Document.objects.values_list('department_id', 'folder_id')))
+
+    def test_counters_follow_create_move_and_delete(self):
+        """Test that the signals keep the counters exact."""
+        from apps.documents.utils.counter_utils import get_counts, get_department_counts, get_folder_counts
+
+        first = self.create_document(self.finance, self.invoices)
+        self.create_document(self.finance, self.invoices)
+        moved = self.create_document(self.finance)
+        self.create_document()
+        self.assertEqual(get_counts(), self.actual_counts())
+
+        moved.department = self.legal
+        moved.save()
+        first.delete()
+        self.assertEqual(get_counts(), self.actual_counts())
+        self.assertEqual(get_department_counts(), {self.finance.id: 1, self.legal.id: 1, None: 1})
+        self.assertEqual(get_folder_counts(), {self.invoices.id: 1})
+
+    def test_deleting_a_folder_unfiles_its_documents(self):
+        """Test that documents unfiled by a folder deletion are recounted."""
+        from apps.documents.utils.counter_utils import get_counts
+
+        self.create_document(self.finance, self.invoices)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.invoices.delete()
+
+        self.assertEqual(get_counts(), {(self.finance.id, None): 1})
+
+    def test_batched_updates_write_once_per_pair(self):
+        """Test that a batch sums its deltas into one update per pair."""
+        from apps.documents.utils.counter_utils import adjust_counter, batched_counter_updates, get_counts
+
+        self.create_document(self.finance, self.invoices)
+        with self.assertNumQueries(1):
+            with batched_counter_updates():
+                for _ in range(3):
+                    adjust_counter(self.finance.id, self.invoices.id, 1)
+
+        self.assertEqual(get_counts(), {(self.finance.id, self.invoices.id): 4})
+
+    def test_reconcile_repairs_drift(self):
+        """Test that the reconcile command recomputes drifted counters."""
+        from django.core.management import call_command
+        from apps.documents.models import DocumentCounter
+        from apps.documents.utils.counter_utils import get_counts
+
+        self.create_document(self.finance, self.invoices)
+        self.create_document(self.legal)
+        DocumentCounter.objects.filter(department=self.finance).update(count=7)
+        DocumentCounter.objects.filter(department=self.legal).delete()
+
+        call_command('reconcile_document_counters', stdout=StringIO())
+        self.assertEqual(get_counts(), self.actual_counts())
+
+    def test_diagnostic_uses_counters(self):
+        """Test that the diagnostic action reports the counters."""
+        self.create_document(self.finance, self.invoices)
+        self.create_document(self.finance, self.invoices)
+        self.create_document()
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        response = client.get('/api/documents/diagnostic/')
+
+        self.assertEqual(response.data['total_documents'], 3)
+        self.assertEqual(response.data['by_department'], {'Finance': 2, 'None': 1})
+        self.assertEqual(response.data['by_folder'], {'Finance/Invoices': 2})
+
+
+class DocumentETagTestCase(TemporaryMediaTestCase):
+    """Test cases for conditional GET on the document list and detail."""
+
+    def setUp(self):
+        """Set up test environment."""
+        from apps.documents.models import Tag
+
+        self.user = User.objects.create_user(username='clerk', password='testpassword')
+        self.document = Document.objects.create(
+            title='Invoice', uploaded_by=self.user, is_ocr_processed=True,
+            file=SimpleUploadedFile('doc.pdf', b'%PDF-1.4', content_type='application/pdf'),
+        )
+        self.tag = Tag.objects.create(name='paid')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.detail_url = f'/api/documents/{self.document.id}/'
+
+    def assertRevalidates(self, url, change):
+        """Assert that a URL answers 304 until change() is applied, then 200."""
+        etag = self.client.get(url)['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        change()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_list_changes_with_documents(self):
+        """Test that the list ETag changes when documents are added, edited or removed."""
+        def add():
+            Document.objects.create(
+                title='Receipt', uploaded_by=self.user, is_ocr_processed=True,
+                file=SimpleUploadedFile('doc.pdf', b'%PDF-1.4', content_type='application/pdf'),
+            )
+
+        def edit():
+            self.document.title = 'Invoice (paid)'
+            self.document.save()
+
+        for change in (add, edit, self.document.delete):
+            with self.subTest(change=change.__name__):
+                self.assertRevalidates('/api/documents/', change)
+
+    def test_detail_changes_with_tags(self):
+        """Test that retagging a document, which keeps updated_at, changes its ETag."""
+        self.assertRevalidates(self.detail_url, lambda: self.document.tags.add(self.tag))
+        self.assertRevalidates(self.detail_url, lambda: self.tag.documents.remove(self.document))
+
+        def rename():
+            self.tag.name = 'settled'
+            self.tag.save()
+
+        self.assertRevalidates(self.detail_url, rename)
+
+    def test_not_modified_skips_serialization(self):
+        """Test that a matching detail request runs a single validator query."""
+        etag = self.client.get(self.detail_url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=f'"other", {etag[2:]}')
+        self.assertEqual(response.status_code, 304)
+
+    def test_etags_are_per_user(self):
+        """Test that another user's list never validates against this one."""
+        etag = self.client.get('/api/documents/')['ETag']
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user(username='other', password='testpassword'))
+        self.assertEqual(other.get('/api/documents/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class BulkUploadTestCase(QueryBudgetTestMixin, TemporaryMediaTestCase):
+    """Test cases for the bulk upload action."""
+
+    def setUp(self):
+        """Set up test environment."""
+        from apps.documents.models import Department, Folder, Tag
+
+        self.user = User.objects.create_user(username='clerk', password='testpassword')
+        self.department = Department.objects.create(name='Finance', code='FIN')
+        self.folder = Folder.objects.create(name='Invoices', department=self.department)
+        self.tags = [Tag.objects.create(name='scanned'), Tag.objects.create(name='2024')]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload(self, count, extension='pdf'):
+        """Bulk upload count files into the test folder."""
+        files = [
+            SimpleUploadedFile(f'scan_{i}.{extension}', b'%PDF-1.4', content_type='application/pdf')
+            for i in range(count)
+        ]
+        return self.client.post('/api/documents/bulk_upload/', {
+            'files': files,
+            'folder': self.folder.id,
+            'document_type': 'invoice',
+            'tag_ids': [tag.id for tag in self.tags],
+        }, format='multipart')
+
+    @patch('config.celery.app.send_task')
+    def test_bulk_upload(self, mock_send_task):
+        """Test that every file becomes a document, with one notification and one OCR task."""
+        from apps.documents.models import AuditLog
+        from apps.documents.utils.counter_utils import get_counts
+        from apps.notifications.models import Notification
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.upload(3)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['count'], 3)
+        documents = Document.objects.filter(id__in=[item['id'] for item in response.data['documents']])
+        self.assertEqual(sorted(documents.values_list('title', flat=True)), ['scan 0', 'scan 1', 'scan 2'])
+        for document in documents:
+            self.assertEqual(document.department, self.department)
+            self.assertEqual(set(document.tags.all()), set(self.tags))
+            self.assertTrue(document.file.storage.exists(document.file.name))
+
+        self.assertEqual(AuditLog.objects.filter(action_type='create').count(), 3)
+        self.assertEqual(Notification.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(get_counts(), {(self.department.id, self.folder.id): 3})
+        mock_send_task.assert_any_call('process_documents_ocr', args=[sorted(documents.values_list('id', flat=True))])
+
+    @patch('config.celery.app.send_task')
+    def test_query_count_is_constant(self, mock_send_task):
+        """Test that the number of queries doesn't depend on the number of files."""
+        self.upload(1)  # Creates the counter row
+        with CaptureQueriesContext(connection) as two:
+            self.upload(2)
+        with CaptureQueriesContext(connection) as six:
+            self.upload(6)
+        self.assertEqual(len(six), len(two))
+
+    def test_invalid_file_rejects_the_batch(self):
+        """Test that one invalid file rejects the whole upload."""
+        response = self.client.post('/api/documents/bulk_upload/', {
+            'files': [
+                SimpleUploadedFile('scan.pdf', b'%PDF-1.4', content_type='application/pdf'),
+                SimpleUploadedFile('notes.exe', b'MZ', content_type='application/octet-stream'),
+            ],
+        }, format='multipart')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('notes.exe', str(response.data['files']))
+        self.assertFalse(Document.objects.exists())
+
+
+class ResumableUploadTestCase(TemporaryMediaTestCase):
+    """Test cases for the resumable chunked uploads."""
+
+    def setUp(self):
+        """Set up test environment."""
+        import tempfile
+        from apps.documents.models import Department, Folder
+
+        self.temp_dir = tempfile.TemporaryDirectory()
+        settings_override = override_settings(UPLOAD_TEMP_DIR=self.temp_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(self.temp_dir.cleanup)
+
+        self.user = User.objects.create_user(username='clerk', password='testpassword')
+        self.department = Department.objects.create(name='Finance', code='FIN')
+        self.folder = Folder.objects.create(name='Invoices', department=self.department)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.content = b'%PDF-1.4 ' + bytes(range(256)) * 40
+
+    def open_upload(self, **extra):
+        """Open an upload of the test content."""
+        data = {'filename': 'contract_2024.pdf', 'size': len(self.content), 'folder': self.folder.id}
+        data.update(extra)
+        response = self.client.post('/api/documents/uploads/', data, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def put_chunk(self, upload_id, start, end):
+        """Send content[start:end] at offset start."""
+        return self.client.generic(
+            'PUT', f'/api/documents/uploads/{upload_id}/', self.content[start:end],
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{end - 1}/{len(self.content)}'
+        )
+
+    @patch('config.celery.app.send_task')
+    def test_chunked_upload(self, mock_send_task):
+        """Test that chunks are appended in order and the upload resumes after a refused chunk."""
+        import hashlib
+        from apps.documents.models import UploadSession
+
+        sha256 = hashlib.sha256(self.content).hexdigest()
+        upload_id = self.open_upload(sha256=sha256)
+
+        self.assertEqual(self.put_chunk(upload_id, 0, 4000).data['offset'], 4000)
+        # A chunk sent again, or skipping ahead, is refused with the offset to resume from
+        response = self.put_chunk(upload_id, 2000, 6000)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['offset'], 4000)
+        self.assertEqual(response['Upload-Offset'], '4000')
+
+        # Finalizing early is refused
+        response = self.client.post(f'/api/documents/uploads/{upload_id}/finalize/')
+        self.assertEqual(response.status_code, 409)
+
+        self.assertEqual(self.put_chunk(upload_id, 4000, len(self.content)).data['offset'], len(self.content))
+        self.assertEqual(self.client.get(f'/api/documents/uploads/{upload_id}/').data['offset'], len(self.content))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/api/documents/uploads/{upload_id}/finalize/')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['sha256'], sha256)
+        document = Document.objects.get(id=response.data['id'])
+        self.assertEqual(document.title, 'contract 2024')
+        self.assertEqual(document.department, self.department)
+        with document.file.open('rb') as stored:
+            self.assertEqual(stored.read(), self.content)
+        document.file.delete(save=False)
+        # Indexing tasks are sent too when autosync is on
+        ocr_calls = [call for call in mock_send_task.call_args_list if call.args[0] == 'process_documents_ocr']
+        self.assertEqual(ocr_calls, [(('process_documents_ocr',), {'args': [[document.id]]})])
+
+        self.assertFalse(UploadSession.objects.exists())
+        import os
+        self.assertEqual(os.listdir(self.temp_dir.name), [])
+
+    def test_checksum_mismatch(self):
+        """Test that an upload not matching its checksum is discarded."""
+        upload_id = self.open_upload(sha256='0' * 64)
+        self.put_chunk(upload_id, 0, len(self.content))
+
+        response = self.client.post(f'/api/documents/uploads/{upload_id}/finalize/')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Document.objects.exists())
+        self.assertEqual(self.client.get(f'/api/documents/uploads/{upload_id}/').status_code, 404)
+
+    def test_upload_validation(self):
+        """Test that chunks past the declared size and other users' uploads are refused."""
+        upload_id = self.open_upload()
+
+        response = self.client.post('/api/documents/uploads/', {'filename': 'virus.exe', 'size': 10}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        self.content += b'extra'
+        self.assertEqual(self.put_chunk(upload_id, 0, len(self.content)).status_code, 413)
+        self.assertEqual(self.client.get(f'/api/documents/uploads/{upload_id}/').data['offset'], 0)
+
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user(username='other', password='testpassword'))
+        self.assertEqual(other.get(f'/api/documents/uploads/{upload_id}/').status_code, 404)
+
+
+class DocumentDownloadTestCase(TemporaryMediaTestCase):
+    """Test cases for the document download action."""
+
+    def setUp(self):
+        """Set up test environment."""
+        self.user = User.objects.create_user(username='clerk', password='testpassword')
+        self.content = bytes(range(256)) * 8
+        self.document = Document.objects.create(
+            title='Scan', uploaded_by=self.user, is_ocr_processed=True,
+            file=SimpleUploadedFile('scan.pdf', self.content, content_type='application/pdf'),
+        )
+        self.addCleanup(self.document.file.delete, save=False)
+        self.url = f'/api/documents/{self.document.id}/download/'
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_full_download(self):
+        """Test that the whole file is sent, whatever the Accept header."""
+        response = self.client.get(self.url, HTTP_ACCEPT='application/pdf')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertTrue(response['Content-Disposition'].startswith('attachment'))
+
+    def test_range_requests(self):
+        """Test that single ranges get 206 and ranges past the end get 416."""
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.content)}')
+        self.assertEqual(b''.join(response.streaming_content), self.content[100:200])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-10')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.content[-10:])
+
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.content)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.content)}')
+
+        # A stale If-Range gets the whole (changed) file
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        response.close()
+
+    def test_suffix_range_of_empty_file(self):
+        """Test that no range of an empty file is satisfiable."""
+        from apps.documents.utils.download_utils import RangeNotSatisfiable, parse_range
+
+        with self.assertRaises(RangeNotSatisfiable):
+            parse_range('bytes=-10', 0)
+        with self.assertRaises(RangeNotSatisfiable):
+            parse_range('bytes=0-', 0)
+
+        empty = Document.objects.create(
+            title='Empty', uploaded_by=self.user, is_ocr_processed=True,
+            file=SimpleUploadedFile('empty.pdf', b'', content_type='application/pdf'),
+        )
+        response = self.client.get(f'/api/documents/{empty.id}/download/', HTTP_RANGE='bytes=-10')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */0')
+
+    @override_settings(SENDFILE_BACKEND='nginx', SENDFILE_URL_PREFIX='/protected-media/')
+    def test_sendfile_offload(self):
+        """Test that the file is left to the front proxy when a sendfile backend is set."""
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-99')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.document.file.name}')
+
+    def test_initial_download_detection(self):
+        """Test that only the request opening the file counts as a download."""
+        from django.test import RequestFactory
+        from apps.documents.utils.download_utils import is_initial_download
+
+        factory = RequestFactory()
+        self.assertTrue(is_initial_download(factory.get(self.url)))
+        self.assertTrue(is_initial_download(factory.get(self.url, HTTP_RANGE='bytes=0-65535')))
+        self.assertFalse(is_initial_download(factory.get(self.url, HTTP_RANGE='bytes=65536-131071')))
+        self.assertFalse(is_initial_download(factory.head(self.url)))
+
+
+class ContentAddressedStorageTestCase(TemporaryMediaTestCase):
+    """Test cases for the content-addressed document storage."""
+
+    def setUp(self):
+        """Set up test environment."""
+        self.user = User.objects.create_user(username='clerk', password='testpassword')
+
+    def create_document(self, filename, content=b'%PDF-1.4 same content'):
+        """Create a document uploading content under filename."""
+        return Document.objects.create(
+            title=filename, uploaded_by=self.user, is_ocr_processed=True,
+            file=SimpleUploadedFile(filename, content, content_type='application/pdf'),
+        )
+
+    @patch('config.celery.app.send_task')
+    def test_identical_files_are_stored_once(self, mock_send_task):
+        """Test that duplicates share one blob, which outlives all but the last reference."""
+        import hashlib
+        from apps.documents.models import StoredBlob
+
+        first = self.create_document('invoice.pdf')
+        second = self.create_document('invoice copy.PDF')
+        other = self.create_document('other.pdf', b'%PDF-1.4 other content')
+
+        sha256 = hashlib.sha256(b'%PDF-1.4 same content').hexdigest()
+        self.assertEqual(first.file.name, f'documents/blobs/{sha256[:2]}/{sha256[2:4]}/{sha256}.pdf')
+        self.assertEqual(second.file.name, first.file.name)
+        self.assertNotEqual(other.file.name, first.file.name)
+        self.assertEqual(second.original_filename, 'invoice copy.PDF')
+        self.assertEqual(StoredBlob.objects.get(name=first.file.name).refcount, 2)
+
+        storage = first.file.storage
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(StoredBlob.objects.get(name=second.file.name).refcount, 1)
+        self.assertTrue(storage.exists(second.file.name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(StoredBlob.objects.filter(name=second.file.name).exists())
+        self.assertFalse(storage.exists(second.file.name))
+        self.assertTrue(storage.exists(other.file.name))
+
+    def test_prune_recounts_references(self):
+        """Test that prune corrects the counts left by saves whose document was never inserted."""
+        from django.core.files.base import ContentFile
+        from apps.documents.models import StoredBlob
+
+        document = self.create_document('invoice.pdf')
+        storage = document.file.storage
+        # Files referenced by saves that failed before inserting their document
+        storage.save('invoice again.pdf', ContentFile(b'%PDF-1.4 same content'))
+        lost = storage.save('lost.pdf', ContentFile(b'%PDF-1.4 lost content'))
+        self.assertEqual(StoredBlob.objects.get(name=document.file.name).refcount, 2)
+
+        self.assertEqual(storage.prune(min_age=3600), {"recounted": 0, "blobs": 0, "orphans": 0})
+        result = storage.prune(min_age=0)
+
+        self.assertEqual(result, {"recounted": 2, "blobs": 1, "orphans": 0})
+        self.assertEqual(StoredBlob.objects.get(name=document.file.name).refcount, 1)
+        self.assertTrue(storage.exists(document.file.name))
+        self.assertFalse(StoredBlob.objects.filter(name=lost).exists())
+        self.assertFalse(storage.exists(lost))
+
+    def test_download_uses_the_original_filename(self):
+        """Test that downloads are named after the uploaded file, not its hash."""
+        document = self.create_document('Contrat signé.pdf')
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        response = client.get(f'/api/documents/{document.id}/download/')
+
+        self.assertIn("filename*=UTF-8''Contrat%20sign%C3%A9.pdf", response['Content-Disposition'])
+        response.close()
+
+    def test_migrate_document_files(self):
+        """Test that files stored before the storage are moved into shared blobs."""
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import FileSystemStorage
+        from django.core.management import call_command
+        from apps.documents.models import StoredBlob
+
+        legacy_storage = FileSystemStorage()
+        documents = [self.create_document(f'scan_{i}.pdf') for i in range(2)]
+        legacy_names = []
+        for document in documents:
+            name = legacy_storage.save('documents/2024/01/scan.pdf', ContentFile(b'%PDF-1.4 legacy'))
+            Document.objects.filter(id=document.id).update(file=name)
+            legacy_names.append(name)
+        self.assertEqual(len(set(legacy_names)), 2)
+
+        call_command('migrate_document_files', stdout=StringIO())
+
+        names = set(Document.objects.values_list('file', flat=True))
+        self.assertEqual(len(names), 1)
+        self.assertEqual(StoredBlob.objects.get(name=names.pop()).refcount, 2)
+        for name in legacy_names:
+            self.assertFalse(legacy_storage.exists(name))
+
+
+@override_settings(QUERY_BUDGET_MODE='raise')
+class BulkOperationsTestCase(TemporaryMediaTestCase):
+    """Test cases for the bulk tag, move and delete actions."""
+
+    def setUp(self):
+        """Set up test environment."""
+        from apps.documents.models import Department, Folder, Tag
+
+        self.user = User.objects.create_user(username='clerk', password='testpassword')
+        self.finance = Department.objects.create(name='Finance', code='FIN')
+        self.invoices = Folder.objects.create(name='Invoices', department=self.finance)
+        self.legal = Department.objects.create(name='Legal', code='LEG')
+        self.contracts = Folder.objects.create(name='Contracts', department=self.legal)
+        self.urgent = Tag.objects.create(name='urgent')
+        self.archived = Tag.objects.create(name='archived')
+        self.documents = self.create_documents(3)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_documents(self, count, user=None):
+        """Create documents in the Finance/Invoices folder."""
+        return [
+            Document.objects.create(
+                title=f'Invoice {i}', uploaded_by=user or self.user, is_ocr_processed=True,
+                department=self.finance, folder=self.invoices,
+                file=SimpleUploadedFile('invoice.pdf', b'%PDF-1.4', content_type='application/pdf'),
+            )
+            for i in range(count)
+        ]
+
+    def ids(self, documents=None):
+        return [document.id for document in documents or self.documents]
+
+    def test_bulk_move(self):
+        """Test that documents are re-filed with their counters and audit entries."""
+        from apps.documents.models import AuditLog
+        from apps.documents.utils.counter_utils import get_counts
+
+        response = self.client.post('/api/documents/bulk_move/', {
+            'ids': self.ids(), 'folder': self.contracts.id,
+        }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(set(Document.objects.values_list('department_id', 'folder_id')),
+                         {(self.legal.id, self.contracts.id)})
+        self.assertEqual(get_counts(), {(self.legal.id, self.contracts.id): 3})
+        self.assertEqual(AuditLog.objects.filter(action_type='move').count(), 3)
+
+        # Folder of another department
+        response = self.client.post('/api/documents/bulk_move/', {
+            'ids': self.ids(), 'department': self.finance.id, 'folder': self.contracts.id,
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_bulk_move_query_count_is_constant(self):
+        """Test that moving more documents doesn't run more queries."""
+        def move(documents, folder):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post('/api/documents/bulk_move/', {
+                    'ids': self.ids(documents), 'folder': folder.id,
+                }, format='json')
+            self.assertEqual(response.data['count'], len(documents))
+            return len(queries)
+
+        move(self.documents[:1], self.contracts)  # Creates the counter row
+        few = move(self.documents[1:], self.contracts)
+        many = move(self.create_documents(6), self.contracts)
+        self.assertEqual(many, few)
+
+    def test_bulk_tag(self):
+        """Test that tags are added and removed, only touching documents that change."""
+        first = self.documents[0]
+        first.tags.add(self.urgent)
+        first.refresh_from_db()
+
+        response = self.client.post('/api/documents/bulk_tag/', {
+            'ids': self.ids(), 'add_tag_ids': [self.urgent.id],
+        }, format='json')
+        self.assertEqual(response.data['count'], 2)
+        for document in self.documents:
+            self.assertEqual(list(document.tags.all()), [self.urgent])
+        self.assertEqual(Document.objects.get(id=first.id).tag_version, first.tag_version)
+
+        response = self.client.post('/api/documents/bulk_tag/', {
+            'ids': self.ids(), 'add_tag_ids': [self.archived.id], 'remove_tag_ids': [self.urgent.id],
+        }, format='json')
+        self.assertEqual(response.data['count'], 3)
+        for document in self.documents:
+            self.assertEqual(list(document.tags.all()), [self.archived])
+        self.assertEqual(Document.objects.get(id=first.id).tag_version, first.tag_version + 1)
+
+    @patch('config.celery.app.send_task')
+    def test_bulk_delete_all_matching(self, mock_send_task):
+        """Test that every document matching the list filters is deleted."""
+        from apps.documents.models import AuditLog
+        from apps.documents.utils.counter_utils import get_counts
+
+        moved = self.documents[0]
+        Document.objects.filter(id=moved.id).update(folder=None)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f'/api/documents/bulk_delete/?folder={self.invoices.id}', {'all_matching': True}, format='json'
+            )
+
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(list(Document.objects.values_list('id', flat=True)), [moved.id])
+        self.assertEqual(AuditLog.objects.filter(action_type='delete').count(), 2)
+        self.assertEqual(get_counts().get((self.finance.id, self.invoices.id)), 1)  # Drift from the raw update
+
+    def test_other_users_documents_are_not_found(self):
+        """Test that an id list reaching another user's documents changes nothing."""
+        other = User.objects.create_user(username='other', password='testpassword')
+        foreign = self.create_documents(1, user=other)
+
+        response = self.client.post('/api/documents/bulk_delete/', {
+            'ids': self.ids() + self.ids(foreign),
+        }, format='json')
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.data['ids'], self.ids(foreign))
+        self.assertEqual(Document.objects.count(), 4)
+
+
+class SparseFieldsetTestCase(TemporaryMediaTestCase):
+    """Test cases for ?fields= and ?expand= on the document endpoints."""
+
+    def setUp(self):
+        """Set up test environment."""
+        from apps.documents.models import Department, DocumentOCR, Folder
+
+        self.user = User.objects.create_user(username='clerk', password='testpassword')
+        self.department = Department.objects.create(name='Finance', code='FIN')
+        self.folder = Folder.objects.create(name='Invoices', department=self.department)
+        Folder.objects.create(name='Receipts', department=self.department)
+        self.document = Document.objects.create(
+            title='Invoice', uploaded_by=self.user, is_ocr_processed=True,
+            department=self.department, folder=self.folder,
+            file=SimpleUploadedFile('invoice.pdf', b'%PDF-1.4', content_type='application/pdf'),
+        )
+        DocumentOCR.objects.create(document=self.document, full_text='x' * 10000)
+        self.url = f'/api/documents/{self.document.id}/'
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self, url):
+        """GET a url after a warm-up request, returning the response and its query count."""
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_fields_select_the_detail_representation(self):
+        """Test that only the requested fields are rendered and loaded."""
+        full, full_queries = self.get(self.url)
+        self.assertIn('ocr_data', full.data)
+        self.assertEqual(len(full.data['department_details']['folders']), 2)
+
+        sparse, sparse_queries = self.get(f'{self.url}?fields=id,title,folder_name')
+        self.assertEqual(set(sparse.data), {'id', 'title', 'folder_name'})
+        self.assertLess(sparse_queries, full_queries)
+        self.assertNotEqual(sparse['ETag'], full['ETag'])
+
+        nested, _ = self.get(f'{self.url}?fields=id,department_details.name')
+        self.assertEqual(nested.data['department_details'], {'name': 'Finance'})
+
+    def test_expand_adds_relations_to_the_list(self):
+        """Test that expanded relations are rendered without a query per document."""
+        response, one = self.get('/api/documents/?expand=folder_details')
+        self.assertEqual(response.data['results'][0]['folder_details']['name'], 'Invoices')
+        self.assertNotIn('department_details', response.data['results'][0])
+
+        for i in range(3):
+            Document.objects.create(
+                title=f'Invoice {i}', uploaded_by=self.user, is_ocr_processed=True,
+                department=self.department, folder=self.folder,
+                file=SimpleUploadedFile('invoice.pdf', b'%PDF-1.4', content_type='application/pdf'),
+            )
+        response, _ = self.get('/api/documents/?expand=folder_details,department_details')
+        self.assertEqual(len(response.data['results']), 4)
+        _, four_without_department = self.get('/api/documents/?expand=folder_details')
+        self.assertEqual(four_without_department, one)
+
+    def test_writes_ignore_the_fieldset(self):
+        """Test that ?fields= doesn't drop fields from updates."""
+        response = self.client.patch(f'{self.url}?fields=id', {'title': 'Renamed'}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Document.objects.get(id=self.document.id).title, 'Renamed')
+
+
+class ValuesSerializerTestCase(TemporaryMediaTestCase):
+    """Test cases for the values() serializers of document lists and exports."""
+
+    def setUp(self):
+        """Set up test environment."""
+        from apps.documents.models import Department, Folder, Tag
+
+        self.user = User.objects.create_user(username='clerk', password='testpassword')
+        department = Department.objects.create(name='Finance', code='FIN')
+        folder = Folder.objects.create(name='Invoices', department=department)
+        invoice = Document.objects.create(
+            title='Invoice', uploaded_by=self.user, document_type='invoice', reference_number='INV-1',
+            department=department, folder=folder, date='2024-03-01', description='March',
+            is_ocr_processed=True,
+        )
+        invoice.tags.set([Tag.objects.create(name='paid'), Tag.objects.create(name='2024')])
+        Document.objects.create(title='Untagged', uploaded_by=self.user)
+        self.documents = Document.objects.order_by('-created_at', '-id')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_renders_like_the_model_serializers(self):
+        """Test that both values() serializers render exactly what their ModelSerializer renders."""
+        from apps.documents.serializers.document_serializers import DocumentListSerializer
+        from apps.documents.serializers.export_serializers import DocumentExportSerializer
+        from apps.documents.serializers.values_serializers import (
+            DocumentExportValuesSerializer, DocumentListValuesSerializer
+        )
+
+        for serializer_class, values_serializer in (
+            (DocumentListSerializer, DocumentListValuesSerializer()),
+            (DocumentExportSerializer, DocumentExportValuesSerializer()),
+        ):
+            expected = serializer_class(self.documents, many=True).data
+            data = values_serializer.render_queryset(self.documents)
+            self.assertEqual(data, [dict(item) for item in expected])
+            self.assertEqual([list(item) for item in data], [list(item) for item in expected])
+
+        page = DocumentListValuesSerializer().get_queryset(self.documents)[:1]
+        self.assertEqual(DocumentListValuesSerializer().render(page)[0]['tags'],
+                         [{'id': tag.id, 'name': tag.name} for tag in self.documents[0].tags.all()])
+
+    def test_list_endpoint(self):
+        """Test that the list renders the same pages and fieldsets from values() rows."""
+        response = self.client.get('/api/documents/?page_size=1')
+        self.assertEqual(response.data['results'][0]['title'], 'Untagged')
+        response = self.client.get(response.data['next'])
+        self.assertEqual(response.data['results'][0]['tags'][0]['name'], '2024')
+
+        response = self.client.get('/api/documents/?fields=id,title')
+        self.assertEqual([set(item) for item in response.data['results']], [{'id', 'title'}] * 2)
+
+    def test_expandable_fields_use_the_model_serializer(self):
+        """Test that a relation listed in ?fields= renders like ?expand=."""
+        from apps.documents.serializers.values_serializers import DocumentListValuesSerializer
+
+        self.assertFalse(DocumentListValuesSerializer.can_render({'id': [], 'department_details': []}, {}))
+        self.assertTrue(DocumentListValuesSerializer.can_render({'id': [], 'title': []}, {}))
+
+        response = self.client.get('/api/documents/?fields=id,department_details')
+        expected = self.client.get('/api/documents/?expand=department_details')
+        self.assertEqual(
+            response.data['results'],
+            [{'id': item['id'], 'department_details': item['department_details']}
+             for item in expected.data['results']]
+        )
+        self.assertEqual(response.data['results'][1]['department_details']['name'], 'Finance')
+
+
+class JSONRendererTestCase(TemporaryMediaTestCase):
+    """Test cases for the orjson renderer and parser."""
+
+    def test_renders_like_the_json_renderer(self):
+        """Test that ORJSONRenderer produces the same bytes as DRF's JSONRenderer."""
+        import datetime
+        import decimal
+        import uuid
+        from django.utils import timezone
+        from django.utils.translation import gettext_lazy
+        from rest_framework.renderers import JSONRenderer
+        from config.renderers import ORJSONRenderer
+
+        payload = {
+            'id': 1,
+            'uuid': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+            'amount': decimal.Decimal('12.50'),
+            'created_at': datetime.datetime(2024, 3, 1, 8, 30, 15, 120000, tzinfo=timezone.utc),
+            'date': datetime.date(2024, 3, 1),
+            'duration': datetime.timedelta(minutes=2),
+            'label': gettext_lazy('Invoice'),
+            'counts': {1: 3, 2: 0},
+            'text': 'Page one – é',
+            'results': [{'tags': ('paid', None, True, 1.5)}],
+        }
+        self.assertEqual(ORJSONRenderer().render(payload), JSONRenderer().render(payload))
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+        self.assertEqual(ORJSONRenderer().render({'a': [1]}, 'application/json; indent=2'), b'{\n  "a": [\n    1\n  ]\n}')
+
+    def test_parser(self):
+        """Test that ORJSONParser parses request bodies and rejects invalid JSON."""
+        from io import BytesIO
+        from rest_framework.exceptions import ParseError
+        from config.renderers import ORJSONParser
+
+        self.assertEqual(ORJSONParser().parse(BytesIO('{"title": "Facture é"}'.encode())), {'title': 'Facture é'})
+        self.assertEqual(
+            ORJSONParser().parse(BytesIO('{"t": "é"}'.encode('latin-1')), parser_context={'encoding': 'latin-1'}),
+            {'t': 'é'}
+        )
+        for body in (b'{"title": ', b'{"n": NaN}'):
+            with self.assertRaises(ParseError):
+                ORJSONParser().parse(BytesIO(body))
+
+        user = User.objects.create_user(username='clerk', password='testpassword')
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.post('/api/tags/', {'name': 'urgent'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['name'], 'urgent')
+
+
+class CompressionMiddlewareTestCase(TemporaryMediaTestCase):
+    """Test cases for the negotiated response compression."""
+
+    def setUp(self):
+        """Set up test environment."""
+        from apps.documents.models import DocumentOCR
+
+        self.user = User.objects.create_user(username='clerk', password='testpassword')
+        self.document = Document.objects.create(
+            title='Report', uploaded_by=self.user,
+            file=SimpleUploadedFile('report.txt', b'plain text ' * 500, content_type='text/plain'),
+        )
+        DocumentOCR.objects.create(document=self.document, full_text='Page text. ' * 2000)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_negotiates_the_encoding(self):
+        """Test that text responses are compressed with the encoding the client prefers."""
+        import gzip
+        import json
+        from config.compression import brotli
+
+        url = f'/api/documents/{self.document.id}/ocr_text/'
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(json.loads(gzip.decompress(response.content))['full_text'], 'Page text. ' * 2000)
+
+        if brotli is not None:
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, br')
+            self.assertEqual(response['Content-Encoding'], 'br')
+            self.assertEqual(json.loads(brotli.decompress(response.content))['full_text'], 'Page text. ' * 2000)
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip;q=0, br;q=0')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+        response = self.client.get(f'/api/documents/{self.document.id}/?fields=id', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_skips_downloads(self):
+        """Test that file downloads, whole or ranged, are sent as they are stored."""
+        url = f'/api/documents/{self.document.id}/download/'
+        for headers in ({}, {'HTTP_RANGE': 'bytes=0-99'}):
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip', **headers)
+            self.assertIn(response.status_code, (200, 206))
+            self.assertFalse(response.has_header('Content-Encoding'))
+            b''.join(response.streaming_content)
+
+    def test_compresses_streaming_responses(self):
+        """Test that streaming responses are compressed chunk by chunk."""
+        import gzip
+        from django.http import StreamingHttpResponse
+        from django.test import RequestFactory
+        from config.compression import CompressionMiddleware
+
+        chunks = [b'id,title\n'] + [b'%d,Document\n' % i for i in range(1000)]
+        middleware = CompressionMiddleware(lambda request: StreamingHttpResponse(iter(chunks), content_type='text/csv'))
+        response = middleware(RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip'))
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), b''.join(chunks))
+
+
+@override_settings(QUERY_BUDGET_MODE='raise', OCR_TEXT_MAX_PAGES=3)
+class OCRTextPagesTestCase(TemporaryMediaTestCase):
+    """Test cases for the paged OCR text."""
+
+    def setUp(self):
+        """Set up test environment."""
+        from apps.documents.models import DocumentOCR
+
+        self.user = User.objects.create_user(username='clerk', password='testpassword')
+        self.document = Document.objects.create(title='Report', uploaded_by=self.user)
+        self.text = ''.join(f'\n--- Page {i} ---\nText of page {i} é.' for i in range(1, 6))
+        self.ocr = DocumentOCR.objects.create(document=self.document, full_text=self.text)
+        self.url = f'/api/documents/{self.document.id}/ocr_text/'
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_pages(self):
+        """Test that page ranges return the text of these pages only."""
+        response = self.client.get(f'{self.url}?pages=2-3')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['page_count'], 5)
+        self.assertEqual(response.data['pages'], [
+            {'page': 2, 'text': 'Text of page 2 é.'}, {'page': 3, 'text': 'Text of page 3 é.'}
+        ])
+        self.assertEqual([page['page'] for page in self.client.get(f'{self.url}?pages=4-').data['pages']], [4, 5])
+        self.assertEqual(self.client.get(f'{self.url}?pages=9').data['pages'], [])
+        for pages in ('0', 'two', '3-1', '1-4'):
+            self.assertEqual(self.client.get(f'{self.url}?pages={pages}').status_code, 400)
+
+        whole = self.client.get(self.url)
+        self.assertEqual(whole.data['full_text'], self.text)
+        self.assertEqual(whole.data['page_count'], 5)
+
+    def test_revalidation(self):
+        """Test that unchanged text is answered with 304, and edited text is re-indexed."""
+        response = self.client.get(f'{self.url}?pages=1')
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+        cached = self.client.get(f'{self.url}?pages=1', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        self.assertNotEqual(self.client.get(f'{self.url}?pages=2')['ETag'], response['ETag'])
+
+        self.ocr.full_text = 'Single image text'
+        self.ocr.save(update_fields=['full_text'])
+        response = self.client.get(f'{self.url}?pages=1', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.data['pages'], [{'page': 1, 'text': 'Single image text'}])
+
+    def test_detail_leaves_the_text_out(self):
+        """Test that the document detail summarizes the OCR data without loading its text."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/documents/{self.document.id}/')
+        self.assertEqual(response.data['ocr_data']['page_count'], 5)
+        self.assertEqual(response.data['ocr_data']['text_length'], len(self.text))
+        self.assertNotIn('full_text', response.data['ocr_data'])
+        self.assertFalse(any('full_text' in query['sql'] for query in queries.captured_queries))
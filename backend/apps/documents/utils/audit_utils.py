@@ -27,16 +27,7 @@ def log_user_activity(user, action_type, content_object, description='', changes
     content_type = ContentType.objects.get_for_model(content_object)
     
     # Extract request metadata if available
-    ip_address = None
-    user_agent = ''
-    if request:
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip_address = x_forwarded_for.split(',')[0]
-        else:
-            ip_address = request.META.get('REMOTE_ADDR')
-        
-        user_agent = request.META.get('HTTP_USER_AGENT', '')
+    ip_address, user_agent = get_request_metadata(request)
     
     # Create the audit log entry
     audit_log = AuditLog.objects.create(
@@ -53,6 +44,63 @@ def log_user_activity(user, action_type, content_object, description='', changes
     return audit_log
 
 
+def log_bulk_activity(user, action_type, content_objects, describe, changes=None, request=None):
+    """
+    Log the same user activity on many objects with a single insert.
+    
+    Args:
+        user: The user performing the action
+        action_type: Type of action (create, update, etc.)
+        content_objects: The objects being acted upon (of a single model)
+        describe: Callable returning the description of an object
+        changes: JSON-serializable dict of changes shared by every entry,
+            or a callable returning the changes of an object
+        request: The request object, used to get IP and user agent
+    
+    Returns:
+        list of the created AuditLog entries
+    """
+    content_objects = list(content_objects)
+    if not user or not action_type or not content_objects:
+        return []
+    
+    content_type = ContentType.objects.get_for_model(content_objects[0])
+    ip_address, user_agent = get_request_metadata(request)
+    
+    return AuditLog.objects.bulk_create([
+        AuditLog(
+            user=user,
+            action_type=action_type,
+            content_type=content_type,
+            object_id=content_object.id,
+            description=describe(content_object),
+            changes=changes(content_object) if callable(changes) else changes,
+            ip_address=ip_address,
+            user_agent=user_agent
+        )
+        for content_object in content_objects
+    ])
+
+
+def get_request_metadata(request):
+    """
+    Get the client IP address and user agent of a request.
+    
+    Returns:
+        (ip_address, user_agent), or (None, '') without a request
+    """
+    if not request:
+        return None, ''
+    
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        ip_address = x_forwarded_for.split(',')[0]
+    else:
+        ip_address = request.META.get('REMOTE_ADDR')
+    
+    return ip_address, request.META.get('HTTP_USER_AGENT', '')
+
+
 def get_object_audit_logs(content_object, limit=None):
     """
     Get audit logs for a specific object.
@@ -68,7 +116,7 @@ def get_object_audit_logs(content_object, limit=None):
     logs = AuditLog.objects.filter(
         content_type=content_type,
         object_id=content_object.id
-    )
+    ).select_related('user', 'content_type')
     
     if limit:
         logs = logs[:limit]
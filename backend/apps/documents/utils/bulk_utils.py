@@ -0,0 +1,279 @@
+"""Bulk document operations bypassing the per-row model signals.
+
+``bulk_create``, ``update`` and through-table inserts send no
+``post_save`` or ``m2m_changed`` signal, so everything the document
+signals do for a single save (counters, tag versions, search indexing,
+cache invalidation, audit trail, notifications, OCR) is done here once
+for the whole batch.
+"""
+
+import os
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from apps.documents.models import Document
+from apps.documents.storage import batched_references, batched_releases
+from apps.documents.utils.audit_utils import log_bulk_activity
+from apps.documents.utils.cache_utils import bump_generation_on_commit
+from apps.documents.utils.counter_utils import adjust_counter, batched_counter_updates
+
+
+def get_bulk_upload_max_files():
+    """Return the maximum number of files accepted by one bulk upload."""
+    return getattr(settings, 'BULK_UPLOAD_MAX_FILES', 500)
+
+
+def get_bulk_operation_max_documents():
+    """Return the maximum number of documents changed by one bulk tag, move or delete."""
+    return getattr(settings, 'BULK_OPERATION_MAX_DOCUMENTS', 5000)
+
+
+def title_from_filename(name):
+    """Derive a document title from an uploaded file name."""
+    title = os.path.splitext(os.path.basename(name))[0].replace('_', ' ').strip()
+    return title[:255] or 'Untitled'
+
+
+def bulk_create_documents(user, files, tags=(), request=None, batch_size=200, **fields):
+    """
+    Create one document per uploaded file, sharing the same metadata.
+
+    The files are streamed to storage first (their blobs referenced in
+    one go, see storage.batched_references); the rows are then inserted
+    with bulk_create in a single transaction, with their tags, audit log
+    entries and counters. Stored files are removed again if the insert
+    fails. After the commit, the user gets a single notification and the
+    OCR of the whole batch is queued as one task.
+
+    Args:
+        user: The uploading user
+        files: Uploaded files
+        tags: Tags applied to every document
+        request: The request, recorded in the audit trail
+        batch_size: Number of rows per INSERT
+        **fields: Document fields shared by every document (document_type,
+            department, folder, description, ...)
+
+    Returns:
+        list of the created Document objects
+    """
+    from apps.search import indexing
+
+    documents = []
+    try:
+        with batched_references():
+            for uploaded in files:
+                document = Document(
+                    title=title_from_filename(uploaded.name), uploaded_by=user,
+                    original_filename=os.path.basename(uploaded.name)[:255], **fields
+                )
+                # Written chunk by chunk; bulk_create then finds the file committed
+                document.file.save(os.path.basename(uploaded.name), uploaded, save=False)
+                documents.append(document)
+
+        with transaction.atomic(), batched_counter_updates():
+            Document.objects.bulk_create(documents, batch_size=batch_size)
+
+            if tags:
+                through = Document.tags.through
+                through.objects.bulk_create([
+                    through(document_id=document.id, tag_id=tag.id)
+                    for document in documents for tag in tags
+                ], batch_size=batch_size)
+
+            log_bulk_activity(
+                user, 'create', documents,
+                lambda document: f"Created document: {document.title}",
+                request=request
+            )
+
+            for document in documents:
+                adjust_counter(document.department_id, document.folder_id, 1)
+            indexing.queue_documents([document.id for document in documents])
+            bump_generation_on_commit('documents')
+    except Exception:
+        for document in documents:
+            if document.file:
+                document.file.storage.delete(document.file.name)
+        raise
+
+    transaction.on_commit(lambda: _finish_bulk_upload(user, documents))
+    return documents
+
+
+def _finish_bulk_upload(user, documents):
+    """Notify the user and queue the OCR of a committed bulk upload."""
+    from apps.ai.ocr import queue_documents_ocr
+    from apps.notifications.utils import notify_bulk_upload
+
+    try:
+        notify_bulk_upload(user, documents)
+    except Exception as e:
+        print(f"Error sending upload notification: {str(e)}")
+
+    queue_documents_ocr([document.id for document in documents if not document.is_ocr_processed])
+
+
+def bulk_tag_documents(user, documents, add_tags=(), remove_tags=(), request=None, batch_size=500):
+    """
+    Add and remove tags on many documents.
+
+    Through-table rows are inserted and deleted in bulk; only the
+    documents whose tags actually change get a new tag version, an audit
+    entry and a reindex.
+
+    Args:
+        user: The user tagging the documents
+        documents: Queryset of the documents to tag
+        add_tags: Tags added to every document
+        remove_tags: Tags removed from every document
+        request: The request, recorded in the audit trail
+        batch_size: Number of rows per INSERT
+
+    Returns:
+        Number of documents whose tags changed
+    """
+    from apps.search import indexing
+
+    through = Document.tags.through
+    add_ids = {tag.id for tag in add_tags}
+    remove_ids = {tag.id for tag in remove_tags} - add_ids
+
+    with transaction.atomic(), indexing.indexing_batch():
+        rows = list(documents.order_by().select_for_update().values_list('id', 'title'))
+        document_ids = [document_id for document_id, title in rows]
+        titles = dict(rows)
+
+        existing = set(through.objects.filter(
+            document_id__in=document_ids, tag_id__in=add_ids | remove_ids
+        ).values_list('document_id', 'tag_id'))
+        added = [
+            (document_id, tag_id) for document_id in document_ids for tag_id in add_ids
+            if (document_id, tag_id) not in existing
+        ]
+        removed = [(document_id, tag_id) for document_id, tag_id in existing if tag_id in remove_ids]
+
+        through.objects.bulk_create([
+            through(document_id=document_id, tag_id=tag_id) for document_id, tag_id in added
+        ], batch_size=batch_size)
+        if removed:
+            through.objects.filter(
+                document_id__in={document_id for document_id, tag_id in removed}, tag_id__in=remove_ids
+            ).delete()
+
+        tag_names = {tag.id: tag.name for tag in [*add_tags, *remove_tags]}
+        for action_type, pairs, verb, key in (
+            ('tag', added, 'Added tags to', 'added_tags'),
+            ('untag', removed, 'Removed tags from', 'removed_tags'),
+        ):
+            by_document = {}
+            for document_id, tag_id in pairs:
+                by_document.setdefault(document_id, []).append(tag_id)
+            log_bulk_activity(
+                user, action_type,
+                [Document(id=document_id, title=titles[document_id]) for document_id in by_document],
+                lambda document: f"{verb} {document.title}: "
+                                 f"{', '.join(tag_names[tag_id] for tag_id in by_document[document.id])}",
+                changes=lambda document: {key: by_document[document.id]},
+                request=request
+            )
+
+        changed_ids = {document_id for document_id, tag_id in added + removed}
+        if changed_ids:
+            Document.objects.filter(id__in=changed_ids).update(
+                tag_version=F('tag_version') + 1, tags_changed_at=timezone.now()
+            )
+            indexing.queue_documents(changed_ids)
+            bump_generation_on_commit('documents')
+
+    return len(changed_ids)
+
+
+def bulk_move_documents(user, documents, department=None, folder=None, request=None):
+    """
+    Re-file many documents into a department and folder.
+
+    One UPDATE moves every document not already there; counters are
+    adjusted in one batch and the audit entries written with one insert.
+
+    Args:
+        user: The user moving the documents
+        documents: Queryset of the documents to move
+        department: Target department (None: no department)
+        folder: Target folder, which must belong to the department (None: no folder)
+        request: The request, recorded in the audit trail
+
+    Returns:
+        Number of documents moved
+    """
+    from apps.search import indexing
+
+    department_id = department.id if department else None
+    folder_id = folder.id if folder else None
+
+    with transaction.atomic(), batched_counter_updates(), indexing.indexing_batch():
+        moved = list(
+            documents.order_by().select_for_update()
+            .exclude(department_id=department_id, folder_id=folder_id)
+            .only('id', 'title', 'department_id', 'folder_id')
+        )
+        if not moved:
+            return 0
+
+        Document.objects.filter(id__in=[document.id for document in moved]).update(
+            department_id=department_id, folder_id=folder_id, updated_at=timezone.now()
+        )
+        for document in moved:
+            adjust_counter(document.department_id, document.folder_id, -1)
+            adjust_counter(department_id, folder_id, 1)
+
+        log_bulk_activity(
+            user, 'move', moved,
+            lambda document: f"Moved document: {document.title}",
+            changes=lambda document: {
+                'department': {'old': document.department_id, 'new': department_id},
+                'folder': {'old': document.folder_id, 'new': folder_id},
+            },
+            request=request
+        )
+        indexing.queue_documents([document.id for document in moved])
+        bump_generation_on_commit('documents')
+
+    return len(moved)
+
+
+def bulk_delete_documents(user, documents, request=None):
+    """
+    Delete many documents.
+
+    The audit entries are written with one insert before the delete. The
+    delete itself still sends the per-document delete signals, but their
+    counter updates, index removals and file releases are batched.
+
+    Args:
+        user: The user deleting the documents
+        documents: Queryset of the documents to delete
+        request: The request, recorded in the audit trail
+
+    Returns:
+        Number of documents deleted
+    """
+    from apps.search import indexing
+
+    with transaction.atomic(), batched_counter_updates(), indexing.indexing_batch(), batched_releases():
+        deleted = list(documents.order_by().select_for_update().only('id', 'title'))
+        if not deleted:
+            return 0
+
+        log_bulk_activity(
+            user, 'delete', deleted,
+            lambda document: f"Deleted document: {document.title}",
+            request=request
+        )
+        Document.objects.filter(id__in=[document.id for document in deleted]).delete()
+        bump_generation_on_commit('documents')
+
+    return len(deleted)
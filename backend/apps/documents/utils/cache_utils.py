@@ -0,0 +1,136 @@
+"""Cache utilities shared by the document and search apps."""
+
+import threading
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+def _generation_key(name):
+    return f'generation:{name}'
+
+
+def get_generation(name):
+    """
+    Get the current value of a generation counter.
+    
+    Cached data derived from the database is keyed on a generation counter
+    which is bumped on every relevant change, so stale entries are never
+    read again and simply age out.
+    
+    Args:
+        name: Name of the counter (e.g. 'search')
+    
+    Returns:
+        The current generation (an int). While the cache is unreachable,
+        a value never returned before, so nothing keyed on it is reused.
+    """
+    key = _generation_key(name)
+    try:
+        generation = cache.get(key)
+        if generation is None:
+            cache.add(key, 1, timeout=None)
+            generation = cache.get(key, 1)
+    except Exception as e:
+        print(f"Error reading the {name} generation: {str(e)}")
+        return f'unavailable:{uuid.uuid4().hex}'
+    return generation
+
+
+def bump_generation(name):
+    """
+    Increment a generation counter, invalidating everything keyed on it.
+    
+    Errors of the cache are logged: they must not fail the change itself.
+    
+    Args:
+        name: Name of the counter (e.g. 'search')
+    """
+    key = _generation_key(name)
+    try:
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Counter not set yet (or evicted): any new value differs from
+            # the default generation readers fall back to
+            cache.add(key, 2, timeout=None)
+    except Exception as e:
+        print(f"Error bumping the {name} generation: {str(e)}")
+
+
+def bump_generation_on_commit(name):
+    """
+    Bump a generation counter now and again when the transaction commits.
+    
+    The second bump drops anything another process cached from the
+    database between the change and its commit.
+    """
+    bump_generation(name)
+    transaction.on_commit(lambda: bump_generation(name))
+
+
+class MetadataTree:
+    """In-memory snapshot of every department and folder."""
+    
+    def __init__(self, departments, folders):
+        self.departments = {row['id']: row for row in departments}
+        self.folders = {row['id']: row for row in folders}
+        for folder in self.folders.values():
+            department = self.departments.get(folder['department_id'])
+            folder['department_name'] = department['name'] if department else None
+    
+    def get_department(self, department_id):
+        """Return the department row for an id, or None."""
+        return self.departments.get(department_id)
+    
+    def get_folder(self, folder_id):
+        """Return the folder row (with its department name) for an id, or None."""
+        return self.folders.get(folder_id)
+    
+    def get_folder_path(self, folder_id):
+        """
+        Return the full path of a folder, as Folder.get_full_path() does.
+        
+        Returns:
+            'Department/Parent/Folder', or None for an unknown folder
+        """
+        folder = self.folders.get(folder_id)
+        if folder is None:
+            return None
+        names = []
+        seen = set()
+        while folder is not None and folder['id'] not in seen:
+            seen.add(folder['id'])
+            names.append(folder['name'])
+            root = folder
+            folder = self.folders.get(folder['parent_id'])
+        names.append(root['department_name'] or '')
+        return '/'.join(reversed(names))
+
+
+_metadata = {'generation': None, 'tree': None}
+_metadata_lock = threading.Lock()
+
+
+def get_metadata_tree():
+    """
+    Get the department/folder tree, cached for the life of the process.
+    
+    The tree is reloaded (two queries) only after a department or folder
+    was saved or deleted, which bumps the 'metadata' generation.
+    
+    Returns:
+        MetadataTree
+    """
+    from apps.documents.models import Department, Folder
+    
+    generation = get_generation('metadata')
+    with _metadata_lock:
+        if _metadata['generation'] != generation:
+            _metadata['tree'] = MetadataTree(
+                Department.objects.values('id', 'name', 'code', 'parent_id'),
+                Folder.objects.values('id', 'name', 'department_id', 'parent_id'),
+            )
+            _metadata['generation'] = generation
+        return _metadata['tree']
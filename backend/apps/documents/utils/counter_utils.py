@@ -0,0 +1,176 @@
+"""Utilities maintaining the per-department and per-folder document counters."""
+
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+
+_state = threading.local()
+
+
+def _get_pending():
+    """Return the pending {(department_id, folder_id): delta} map of the current thread."""
+    if not hasattr(_state, 'pending'):
+        _state.pending = Counter()
+        _state.batch_depth = 0
+    return _state.pending
+
+
+def adjust_counter(department_id, folder_id, delta):
+    """
+    Add delta to the counter of a (department, folder) pair.
+
+    The update is an F() expression in the caller's transaction, so it
+    commits or rolls back with the document change itself. Inside
+    batched_counter_updates() the deltas are summed and written once.
+    """
+    if not delta:
+        return
+    pending = _get_pending()
+    if _state.batch_depth > 0:
+        pending[(department_id, folder_id)] += delta
+        return
+    _apply_delta(department_id, folder_id, delta)
+
+
+def _apply_delta(department_id, folder_id, delta):
+    """Write one delta, creating the counter row on the first document."""
+    from apps.documents.models import DocumentCounter
+
+    counters = DocumentCounter.objects.filter(department_id=department_id, folder_id=folder_id)
+    if counters.update(count=F('count') + delta) or delta < 0:
+        # A missing row on a decrement is drift, repaired by reconcile_counters()
+        return
+    try:
+        with transaction.atomic():
+            DocumentCounter.objects.create(department_id=department_id, folder_id=folder_id, count=delta)
+    except IntegrityError:
+        # Created concurrently
+        counters.update(count=F('count') + delta)
+
+
+def flush_counter_updates():
+    """Write the deltas collected by the current batch."""
+    pending = _get_pending()
+    deltas = [(key, delta) for key, delta in sorted(pending.items(), key=str) if delta]
+    pending.clear()
+    # Sorted, so that concurrent batches lock the rows in the same order
+    for (department_id, folder_id), delta in deltas:
+        _apply_delta(department_id, folder_id, delta)
+
+
+@contextmanager
+def batched_counter_updates():
+    """
+    Context manager summing the counter updates raised inside it.
+
+    Bulk operations touching many documents write one update per
+    (department, folder) pair when the outermost batch exits, instead of
+    one per document.
+    """
+    _get_pending()
+    _state.batch_depth += 1
+    failed = False
+    try:
+        yield
+    except Exception:
+        failed = True
+        raise
+    finally:
+        _state.batch_depth -= 1
+        if _state.batch_depth == 0:
+            try:
+                flush_counter_updates()
+            except Exception as e:
+                if not failed:
+                    raise
+                # Don't hide the original error; reconcile repairs the drift
+                print(f"Error writing document counters: {str(e)}")
+
+
+def get_counts():
+    """
+    Return the document counts of every (department, folder) pair.
+
+    Returns:
+        dict mapping (department_id, folder_id) to a document count
+    """
+    from apps.documents.models import DocumentCounter
+
+    return {
+        (department_id, folder_id): count
+        for department_id, folder_id, count in DocumentCounter.objects.filter(
+            count__gt=0
+        ).values_list('department_id', 'folder_id', 'count')
+    }
+
+
+def get_department_counts():
+    """Return a {department_id: document count} map (None for documents without a department)."""
+    from apps.documents.models import DocumentCounter
+
+    return {
+        row['department_id']: row['total']
+        for row in DocumentCounter.objects.values('department_id').annotate(total=Sum('count')).order_by()
+        if row['total']
+    }
+
+
+def get_folder_counts():
+    """Return a {folder_id: document count} map of the folders holding documents."""
+    counts = Counter()
+    for (department_id, folder_id), count in get_counts().items():
+        if folder_id is not None:
+            counts[folder_id] += count
+    return dict(counts)
+
+
+def reconcile_counters(department_ids=None):
+    """
+    Recompute the counters from the documents and repair any drift.
+
+    Args:
+        department_ids: Only reconcile these departments (None: all counters)
+
+    Returns:
+        dict with the number of counters checked and repaired
+    """
+    from apps.documents.models import Department, Document, DocumentCounter
+
+    with transaction.atomic():
+        counters = DocumentCounter.objects.select_for_update()
+        documents = Document.objects.all()
+        if department_ids is not None:
+            # Departments deleted meanwhile have no documents or counters left
+            department_ids = list(Department.objects.filter(id__in=department_ids).values_list('id', flat=True))
+            counters = counters.filter(department_id__in=department_ids)
+            documents = documents.filter(department_id__in=department_ids)
+
+        existing = {(row.department_id, row.folder_id): row for row in counters}
+        actual = {
+            (row['department_id'], row['folder_id']): row['total']
+            for row in documents.values('department_id', 'folder_id').annotate(total=Count('id')).order_by()
+        }
+
+        repaired = []
+        missing = []
+        for key, total in actual.items():
+            row = existing.get(key)
+            if row is None:
+                missing.append(DocumentCounter(department_id=key[0], folder_id=key[1], count=total))
+            elif row.count != total:
+                row.count = total
+                repaired.append(row)
+        # Pairs left without documents; empty ones are not drift
+        stale = [row for key, row in existing.items() if key not in actual]
+
+        DocumentCounter.objects.bulk_create(missing)
+        DocumentCounter.objects.bulk_update(repaired, ['count'])
+        DocumentCounter.objects.filter(id__in=[row.id for row in stale]).delete()
+
+    return {
+        "checked": len(set(existing) | set(actual)),
+        "repaired": len(missing) + len(repaired) + sum(1 for row in stale if row.count),
+    }
@@ -0,0 +1,206 @@
+"""Document file downloads: byte ranges and sendfile offload.
+
+With ``SENDFILE_BACKEND`` set, the response only names the file and the
+front proxy sends it (ranges included), so no worker time is spent
+copying bytes:
+
+- ``'nginx'``: ``X-Accel-Redirect`` to ``SENDFILE_URL_PREFIX`` + the file
+  name, which nginx maps to MEDIA_ROOT in an ``internal`` location
+- ``'apache'`` (mod_xsendfile) or ``'lighttpd'``: ``X-Sendfile`` with the
+  file path
+
+Otherwise the file is served by Django, one range at a time.
+"""
+
+import hashlib
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.http import http_date
+from rest_framework.negotiation import BaseContentNegotiation
+
+READ_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+SENDFILE_HEADERS = {
+    'nginx': 'X-Accel-Redirect',
+    'apache': 'X-Sendfile',
+    'lighttpd': 'X-Sendfile',
+}
+
+
+class RangeNotSatisfiable(Exception):
+    """A Range header none of whose bytes are in the file."""
+
+
+class IgnoreClientContentNegotiation(BaseContentNegotiation):
+    """Content negotiation accepting any Accept header, for views returning files."""
+
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return (renderers[0], renderers[0].media_type)
+
+
+def get_sendfile_backend():
+    """Return the configured sendfile backend, or None to serve files from Django."""
+    backend = getattr(settings, 'SENDFILE_BACKEND', None) or None
+    if backend is not None and backend not in SENDFILE_HEADERS:
+        print(f"Unknown SENDFILE_BACKEND {backend!r}, serving files from Django")
+        return None
+    return backend
+
+
+def parse_range(header, size):
+    """
+    Parse a Range header against a file size.
+
+    Only single ranges are honoured; a multi-range or malformed header
+    is ignored and the whole file is served (RFC 7233 allows both).
+
+    Args:
+        header: The Range header value
+        size: The file size in bytes
+
+    Returns:
+        (start, end) inclusive byte positions, or None for the whole file
+
+    Raises:
+        RangeNotSatisfiable: the range starts past the end of the file,
+            or the file is empty
+    """
+    if not header:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            # An empty file has no last bytes to send (RFC 7233 2.1)
+            raise RangeNotSatisfiable()
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if last and end < start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    return start, min(end, size - 1)
+
+
+def file_etag(document, size):
+    """Return the strong ETag of a document's file, usable with If-Range."""
+    digest = hashlib.md5(
+        f'{document.id}|{document.file.name}|{size}|{document.updated_at.isoformat()}'.encode('utf-8'),
+        usedforsecurity=False
+    ).hexdigest()
+    return f'"{digest}"'
+
+
+def range_is_current(request, etag, last_modified):
+    """Tell whether an If-Range precondition (if any) still holds."""
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('"'):
+        return if_range == etag
+    return if_range == http_date(last_modified.timestamp())
+
+
+def is_initial_download(request):
+    """
+    Tell whether a download request fetches the start of the file.
+
+    Viewers fetching a file lazily send many Range requests; only the one
+    starting at byte 0 is the user opening the document.
+    """
+    if request.method != 'GET':
+        return False
+    match = RANGE_RE.match(request.headers.get('Range', '').strip())
+    return match is None or match.group(1) == '0'
+
+
+def iter_file_range(file, start, length):
+    """Yield length bytes of an open file from start, closing it at the end."""
+    try:
+        file.seek(start)
+        while length > 0:
+            data = file.read(min(READ_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+    finally:
+        file.close()
+
+
+def file_response(request, document, as_attachment=True):
+    """
+    Build the response sending a document's file.
+
+    Args:
+        request: The download request (Range, If-Range)
+        document: The Document whose file is sent
+        as_attachment: Send Content-Disposition attachment rather than inline
+
+    Returns:
+        A 200, 206 or 416 response, or an empty one for the proxy to fill
+    """
+    file = document.file
+    # Stored under its hash: send the name it was uploaded with
+    filename = document.original_filename or os.path.basename(file.name)
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    size = file.size
+    etag = file_etag(document, size)
+
+    backend = get_sendfile_backend()
+    if backend is not None:
+        response = HttpResponse(content_type=content_type)
+        if backend == 'nginx':
+            prefix = getattr(settings, 'SENDFILE_URL_PREFIX', '/protected-media/')
+            response[SENDFILE_HEADERS[backend]] = quote(prefix.rstrip('/') + '/' + file.name)
+        else:
+            response[SENDFILE_HEADERS[backend]] = file.path
+    else:
+        try:
+            byte_range = parse_range(request.headers.get('Range'), size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            response['Accept-Ranges'] = 'bytes'
+            return response
+
+        if byte_range is not None and not range_is_current(request, etag, document.updated_at):
+            byte_range = None
+
+        if byte_range is None:
+            # Whole file: handed to the server's wsgi.file_wrapper when it has one
+            response = FileResponse(file.open('rb'), content_type=content_type)
+        else:
+            start, end = byte_range
+            length = end - start + 1
+            response = StreamingHttpResponse(
+                iter_file_range(file.open('rb'), start, length), status=206, content_type=content_type
+            )
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = str(length)
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(document.updated_at.timestamp())
+    response['Cache-Control'] = 'private, no-cache'
+    disposition = 'attachment' if as_attachment else 'inline'
+    response['Content-Disposition'] = f"{disposition}; filename*=UTF-8''{quote(filename)}"
+    return response
@@ -0,0 +1,108 @@
+"""ETag utilities for conditional GET requests on documents."""
+
+import hashlib
+
+from django.db.models import Count, Max, Sum
+from django.utils.cache import patch_vary_headers
+from rest_framework import status
+from rest_framework.response import Response
+
+from apps.documents.utils.cache_utils import get_generation
+
+# Department/folder names and tag names are rendered with the documents
+# but don't change their updated_at
+ETAG_GENERATIONS = ('metadata', 'tags')
+
+
+def make_etag(*parts):
+    """Return a weak ETag hashing the given parts."""
+    digest = hashlib.md5(
+        '|'.join(str(part) for part in parts).encode('utf-8'), usedforsecurity=False
+    ).hexdigest()
+    return f'W/"{digest}"'
+
+
+def get_generations():
+    return tuple(get_generation(name) for name in ETAG_GENERATIONS)
+
+
+def list_etag(queryset, request):
+    """
+    Compute the ETag of a filtered document list.
+
+    One aggregate query: the latest updated_at, the number of documents
+    and the sum of their tag versions change whenever a document of the
+    list is added, removed, edited or retagged.
+
+    Args:
+        queryset: The filtered (unpaginated) document queryset
+        request: The request, whose user, host and query string select the page
+
+    Returns:
+        str: Weak ETag
+    """
+    stats = queryset.order_by().aggregate(
+        last_update=Max('updated_at'), total=Count('id'), tag_versions=Sum('tag_version')
+    )
+    return make_etag(
+        'list', request.user.pk, request.get_host(), request.get_full_path(),
+        stats['last_update'].isoformat() if stats['last_update'] else '',
+        stats['total'], stats['tag_versions'] or 0, *get_generations()
+    )
+
+
+def document_etag(document_id, updated_at, tag_version, variant=''):
+    """
+    Compute the ETag of a document's detail representation.
+    
+    variant identifies the representation (e.g. the requested fieldset).
+    """
+    return make_etag('detail', document_id, updated_at.isoformat(), tag_version, variant, *get_generations())
+
+
+def ocr_etag(ocr_id, updated_at, variant=''):
+    """
+    Compute the ETag of a document's OCR text.
+    
+    variant identifies the representation (e.g. the requested pages).
+    """
+    return make_etag('ocr', ocr_id, updated_at.isoformat(), variant)
+
+
+def etag_matches(request, etag):
+    """
+    Tell whether the request's If-None-Match header matches an ETag.
+
+    Uses the weak comparison required for If-None-Match (RFC 7232).
+    """
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    opaque = etag[2:] if etag.startswith('W/') else etag
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def set_validators(response, etag):
+    """
+    Add the ETag to a response.
+
+    Responses are per user and must be revalidated: browsers keep them and
+    send If-None-Match, shared caches don't store them.
+    """
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    patch_vary_headers(response, ['Authorization'])
+    return response
+
+
+def not_modified(etag):
+    """Return an empty 304 response carrying the ETag."""
+    return set_validators(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
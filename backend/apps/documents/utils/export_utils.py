@@ -6,7 +6,7 @@ import json
 import xlsxwriter
 from django.http import HttpResponse
 from apps.documents.models import Document
-from apps.documents.serializers.export_serializers import DocumentExportSerializer
+from apps.documents.serializers.values_serializers import DocumentExportValuesSerializer
 from apps.documents.utils.audit_utils import log_user_activity
 
 
@@ -29,9 +29,8 @@ def export_documents_csv(request, queryset=None):
         else:
             queryset = Document.objects.filter(uploaded_by=user)
     
-    # Serialize documents
-    serializer = DocumentExportSerializer(queryset, many=True)
-    data = serializer.data
+    # Serialize documents from values() rows (same output as DocumentExportSerializer)
+    data = DocumentExportValuesSerializer().render_queryset(queryset)
     
     # Create CSV response
     response = HttpResponse(content_type='text/csv')
@@ -80,9 +79,8 @@ def export_documents_excel(request, queryset=None):
         else:
             queryset = Document.objects.filter(uploaded_by=user)
     
-    # Serialize documents
-    serializer = DocumentExportSerializer(queryset, many=True)
-    data = serializer.data
+    # Serialize documents from values() rows (same output as DocumentExportSerializer)
+    data = DocumentExportValuesSerializer().render_queryset(queryset)
     
     # Create in-memory output file
     output = io.BytesIO()
@@ -168,9 +166,8 @@ def export_documents_pdf(request, queryset=None):
             else:
                 queryset = Document.objects.filter(uploaded_by=user)
         
-        # Serialize documents
-        serializer = DocumentExportSerializer(queryset, many=True)
-        data = serializer.data
+        # Serialize documents from values() rows (same output as DocumentExportSerializer)
+        data = DocumentExportValuesSerializer().render_queryset(queryset)
         
         # Create HTML content
         html_string = render_to_string(
@@ -0,0 +1,98 @@
+"""OCR text pages.
+
+OCR of a PDF writes a ``--- Page N ---`` marker before the text of every
+page. The character span of each page is indexed when the text is saved
+(DocumentOCR.page_offsets), so that a range of pages is read from the
+database with a single substring, without loading the whole text.
+"""
+
+import re
+
+from django.db.models.functions import Substr
+
+# Separator written between pages by apps.ai.ocr.extract_text_from_pdf
+PAGE_MARKER_RE = re.compile(r'\n--- Page (\d+) ---\n')
+
+
+def index_pages(text):
+    """
+    Index the pages of an OCR text.
+
+    Pages are the same as apps.ai.ocr.split_ocr_pages(): text without
+    page markers (e.g. from a single image) is page 1.
+
+    Returns:
+        List of [page_number, start, end] character offsets (end excluded)
+    """
+    if not text:
+        return []
+
+    pages = []
+    page, start = 1, 0
+    for i, match in enumerate(PAGE_MARKER_RE.finditer(text)):
+        # Anything before the first marker belongs to page 1
+        if i or text[:match.start()].strip():
+            pages.append([page, start, match.start()])
+        page, start = int(match.group(1)), match.end()
+    if start or text.strip():
+        pages.append([page, start, len(text)])
+    return pages
+
+
+def parse_page_range(value, max_pages):
+    """
+    Parse a ?pages= value: ``3``, ``3-5`` or ``3-`` (from page 3 on).
+
+    Args:
+        value: The parameter value
+        max_pages: Maximum number of pages in the range; an open range
+            stops there
+
+    Returns:
+        (first, last) page numbers
+
+    Raises:
+        ValueError: malformed range, or longer than max_pages
+    """
+    first, dash, last = value.strip().partition('-')
+    try:
+        first = int(first)
+        last = int(last) if last else (first + max_pages - 1 if dash else first)
+    except ValueError:
+        raise ValueError(f'Invalid page range {value!r}.')
+    if first < 1 or last < first:
+        raise ValueError(f'Invalid page range {value!r}.')
+    if last - first + 1 > max_pages:
+        raise ValueError(f'At most {max_pages} pages can be requested at once.')
+    return first, last
+
+
+def get_page_texts(ocr, first, last):
+    """
+    Read a range of pages of an OCR text with one query.
+
+    Args:
+        ocr: The DocumentOCR (its full_text may be deferred)
+        first: First page number
+        last: Last page number
+
+    Returns:
+        List of {"page", "text"} dicts, empty when no page is in the range
+    """
+    from apps.documents.models import DocumentOCR
+
+    pages = [(page, start, end) for page, start, end in ocr.page_offsets if first <= page <= last]
+    if not pages:
+        return []
+
+    span_start = min(start for page, start, end in pages)
+    span_end = max(end for page, start, end in pages)
+    text = DocumentOCR.objects.filter(pk=ocr.pk).annotate(
+        # Substr positions are 1-based
+        span=Substr('full_text', span_start + 1, span_end - span_start)
+    ).values_list('span', flat=True).first() or ''
+
+    return [
+        {"page": page, "text": text[start - span_start:end - span_start]}
+        for page, start, end in pages
+    ]
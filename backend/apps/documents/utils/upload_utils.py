@@ -0,0 +1,304 @@
+"""Resumable chunked uploads.
+
+An upload session is opened with the file name, size and document
+metadata. The client then PUTs the file in chunks at explicit offsets;
+each chunk is streamed onto the end of a temporary file and the session
+offset only moves once the chunk is fully written, so an interrupted
+chunk is simply sent again. On finalize, the temporary file becomes the
+document's file.
+"""
+
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+READ_SIZE = 64 * 1024
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+|\*)$')
+
+
+class UploadError(Exception):
+    """
+    A chunk or finalize request that can't be applied to the session.
+
+    ``discard`` tells that the session can't be completed anymore and must
+    be deleted once the caller's transaction is rolled back.
+    """
+
+    def __init__(self, message, status_code=400, discard=False):
+        super().__init__(message)
+        self.status_code = status_code
+        self.discard = discard
+
+
+def get_upload_dir():
+    """Return the directory holding the partial uploads, creating it if needed."""
+    path = getattr(settings, 'UPLOAD_TEMP_DIR', os.path.join(settings.BASE_DIR, 'upload_sessions'))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def get_temp_path(session):
+    """Return the path of a session's partial file."""
+    return os.path.join(get_upload_dir(), f'{session.id}.part')
+
+
+def get_expiry_delay():
+    """Return how long a session lives without receiving a chunk."""
+    return timedelta(seconds=getattr(settings, 'UPLOAD_SESSION_EXPIRY', 24 * 3600))
+
+
+def get_expiry():
+    """Return when a session opened or resumed now expires."""
+    return timezone.now() + get_expiry_delay()
+
+
+class HasherCache:
+    """
+    Running SHA-256 of the partial files, kept in this process.
+
+    Hash objects can't be stored, so a session served by another process
+    (or resumed after a restart) is hashed from disk on finalize instead.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._hashers = OrderedDict()
+
+    def checkout(self, session_id, offset):
+        """
+        Take the running hash of a session, if it is at offset.
+
+        Returns:
+            A hash object to feed the next chunk to, or None when the
+            session can only be hashed from disk
+        """
+        with self._lock:
+            entry = self._hashers.pop(session_id, None)
+        if offset == 0:
+            return hashlib.sha256()
+        if entry is None or entry[0] != offset:
+            return None
+        return entry[1]
+
+    def checkin(self, session_id, offset, hasher):
+        """Store the running hash of a session, now at offset."""
+        if hasher is None:
+            return
+        with self._lock:
+            self._hashers[session_id] = (offset, hasher)
+            while len(self._hashers) > self.max_entries:
+                self._hashers.popitem(last=False)
+
+    def pop(self, session_id, offset):
+        """Return the hex digest of a session hashed up to offset, or None."""
+        with self._lock:
+            entry = self._hashers.pop(session_id, None)
+        if entry is None or entry[0] != offset:
+            return None
+        return entry[1].hexdigest()
+
+    def discard(self, session_id):
+        with self._lock:
+            self._hashers.pop(session_id, None)
+
+
+hashers = HasherCache()
+
+
+def parse_chunk_offset(request):
+    """
+    Return the offset a chunk is sent at.
+
+    Taken from a ``Content-Range: bytes start-end/total`` header, an
+    ``Upload-Offset`` header or an ``offset`` query parameter.
+    """
+    content_range = request.headers.get('Content-Range')
+    if content_range:
+        match = CONTENT_RANGE_RE.match(content_range.strip())
+        if not match:
+            raise UploadError('Invalid Content-Range header.')
+        return int(match.group(1))
+
+    offset = request.headers.get('Upload-Offset', request.query_params.get('offset'))
+    if offset is None:
+        raise UploadError('The chunk offset is required (Content-Range, Upload-Offset or ?offset=).')
+    try:
+        offset = int(offset)
+    except (TypeError, ValueError):
+        raise UploadError('Invalid chunk offset.')
+    if offset < 0:
+        raise UploadError('Invalid chunk offset.')
+    return offset
+
+
+def append_chunk(session_id, user, offset, stream):
+    """
+    Append a chunk to a session's partial file.
+
+    The session row is locked while the chunk is written, so concurrent
+    PUTs to the same session are serialized. A chunk that fails midway is
+    cut off again: the file always ends at the session offset.
+
+    Args:
+        session_id: The upload session id
+        user: The uploading user
+        offset: Offset the chunk was sent at; must be the session offset
+        stream: File-like object the chunk is read from
+
+    Returns:
+        The updated UploadSession
+
+    Raises:
+        UploadError: wrong offset (409), chunk past the declared size (413)
+    """
+    max_chunk = getattr(settings, 'UPLOAD_CHUNK_MAX_SIZE', 16 * 1024 * 1024)
+
+    with transaction.atomic():
+        session = get_session(session_id, user, for_update=True)
+        path = get_temp_path(session)
+
+        # The partial file was lost or cut short (e.g. a crash mid-write):
+        # resume from what is actually on disk
+        on_disk = os.path.getsize(path) if os.path.exists(path) else 0
+        if on_disk < session.offset:
+            session.offset = on_disk
+            session.save(update_fields=['offset', 'updated_at'])
+
+        if offset == session.offset:
+            hasher = hashers.checkout(session.id, session.offset)
+            written = 0
+            with open(path, 'ab') as temp_file:
+                try:
+                    temp_file.truncate(session.offset)
+                    while True:
+                        data = stream.read(READ_SIZE)
+                        if not data:
+                            break
+                        written += len(data)
+                        if written > max_chunk:
+                            raise UploadError(f'Chunks are limited to {max_chunk} bytes.', status_code=413)
+                        if session.offset + written > session.size:
+                            raise UploadError('The chunk goes past the declared file size.', status_code=413)
+                        temp_file.write(data)
+                        if hasher is not None:
+                            hasher.update(data)
+                except BaseException:
+                    temp_file.truncate(session.offset)
+                    raise
+
+            session.offset += written
+            session.expires_at = get_expiry()
+            session.save(update_fields=['offset', 'expires_at', 'updated_at'])
+            hashers.checkin(session.id, session.offset, hasher)
+            return session
+
+    # Outside the transaction, so that a corrected offset is kept
+    raise UploadError(f'Expected offset {session.offset}.', status_code=409)
+
+
+def get_session(session_id, user, for_update=False):
+    """
+    Return a user's unexpired upload session.
+
+    Raises:
+        UploadError: unknown or expired session (404)
+    """
+    from apps.documents.models import UploadSession
+
+    sessions = UploadSession.objects.filter(user=user, expires_at__gt=timezone.now())
+    if for_update:
+        sessions = sessions.select_for_update()
+    session = sessions.filter(id=session_id).first()
+    if session is None:
+        raise UploadError('Upload session not found.', status_code=404)
+    return session
+
+
+def file_sha256(path):
+    """Hash a file from disk."""
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as temp_file:
+        for data in iter(lambda: temp_file.read(READ_SIZE), b''):
+            hasher.update(data)
+    return hasher.hexdigest()
+
+
+def finalize_session(session, create_document, sha256=''):
+    """
+    Turn a complete upload into a document.
+
+    Args:
+        session: The UploadSession, with every byte received
+        create_document: Callable(file) saving and returning the Document
+            for the uploaded file
+        sha256: Expected SHA-256 (overrides the one given on creation)
+
+    Returns:
+        (document, sha256 of the file)
+
+    Raises:
+        UploadError: incomplete upload (409) or checksum mismatch (400,
+            to be discarded)
+    """
+    if not session.is_complete:
+        raise UploadError(f'The upload is incomplete: {session.offset} of {session.size} bytes received.', 409)
+
+    path = get_temp_path(session)
+    checksum = hashers.pop(session.id, session.offset) or file_sha256(path)
+    expected = (sha256 or session.sha256).lower()
+    if expected and expected != checksum:
+        raise UploadError('The file checksum does not match; the upload was discarded.', discard=True)
+
+    with open(path, 'rb') as temp_file:
+        document = create_document(File(temp_file, name=session.filename))
+
+    discard_session(session)
+    return document, checksum
+
+
+def discard_session(session):
+    """Delete a session and its partial file."""
+    hashers.discard(session.id)
+    try:
+        os.remove(get_temp_path(session))
+    except FileNotFoundError:
+        pass
+    session.delete()
+
+
+def cleanup_expired_sessions():
+    """
+    Delete expired sessions and partial files left without a session.
+
+    Returns:
+        dict with the number of sessions and orphan files removed
+    """
+    from apps.documents.models import UploadSession
+
+    expired = list(UploadSession.objects.filter(expires_at__lte=timezone.now()))
+    for session in expired:
+        discard_session(session)
+
+    # Files of sessions deleted with their user, or written by a crashed
+    # request, once they are older than any live session could be
+    live_ids = {str(session_id) for session_id in UploadSession.objects.values_list('id', flat=True)}
+    cutoff = (timezone.now() - get_expiry_delay()).timestamp()
+    orphans = 0
+    upload_dir = get_upload_dir()
+    for name in os.listdir(upload_dir):
+        path = os.path.join(upload_dir, name)
+        if name.endswith('.part') and name[:-5] not in live_ids and os.path.getmtime(path) < cutoff:
+            os.remove(path)
+            orphans += 1
+
+    return {"sessions": len(expired), "orphans": orphans}
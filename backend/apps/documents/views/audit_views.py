@@ -44,6 +44,9 @@ class DocumentAuditLogView(views.APIView):
     
     permission_classes = [permissions.IsAuthenticated]
     
+    # Maximum queries per request, authentication included (see config.query_budget)
+    query_budget = 5
+    
     def get(self, request, pk):
         """Get audit logs for the specified document."""
         try:
@@ -12,15 +12,22 @@ class DepartmentViewSet(viewsets.ModelViewSet):
     serializer_class = DepartmentSerializer
     permission_classes = [permissions.IsAuthenticated]
     
+    # Maximum queries per request, authentication and a reload of the
+    # department/folder tree included (see config.query_budget)
+    query_budget = {'list': 5, 'retrieve': 5, '*': 8}
+    
     def get_queryset(self):
         """Filter departments based on user permissions."""
+        # Folders are nested in every department of the response
+        queryset = Department.objects.prefetch_related('folders')
+        
         # Staff users can see all departments
         if self.request.user.is_staff:
-            return Department.objects.all()
+            return queryset
         
         # Regular authenticated users can see all departments too
         # This allows them to upload documents to any department
-        return Department.objects.all()
+        return queryset
         
         # Alternative: If you want to restrict to user's department only:
         # user_dept = getattr(self.request.user, 'department', '')
@@ -37,6 +44,10 @@ class FolderViewSet(viewsets.ModelViewSet):
     serializer_class = FolderSerializer
     permission_classes = [permissions.IsAuthenticated]
     
+    # Maximum queries per request, authentication and a reload of the
+    # department/folder tree included (see config.query_budget)
+    query_budget = {'list': 5, 'retrieve': 5, '*': 8}
+    
     def get_queryset(self):
         """Filter folders based on user permissions and query parameters."""
         queryset = Folder.objects.all()
@@ -1,16 +1,29 @@
 """Document views."""
 
+from io import BytesIO
+
 from rest_framework import viewsets, permissions, filters, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from django.conf import settings
+from django.db.models import prefetch_related_objects
 from django_filters.rest_framework import DjangoFilterBackend
 from apps.documents.models import Document, Tag, DocumentOCR
 from apps.documents.serializers.document_serializers import (
     DocumentSerializer, DocumentListSerializer, TagSerializer
 )
-from apps.documents.serializers.ocr_serializers import DocumentOCRSerializer
+from apps.documents.serializers.ocr_serializers import DocumentOCRSerializer, DocumentOCRPagesSerializer
+from apps.documents.serializers.fieldsets import get_fieldset, get_fieldset_key
+from apps.documents.serializers.values_serializers import DocumentListValuesSerializer
+from apps.documents.pagination import DocumentKeysetPagination
 from apps.documents.permissions import IsOwnerOrAdmin, EnsureCorrectFolderDepartment
 from apps.documents.utils.audit_utils import log_user_activity, get_model_changes
+from apps.documents.utils.cache_utils import get_metadata_tree
+from apps.documents.utils.etag_utils import (
+    list_etag, document_etag, ocr_etag, etag_matches, not_modified, set_validators
+)
+from apps.documents.utils.ocr_utils import parse_page_range
+from apps.documents.utils.download_utils import IgnoreClientContentNegotiation, file_response
 
 
 class TagViewSet(viewsets.ModelViewSet):
@@ -22,6 +35,9 @@ class TagViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [filters.SearchFilter]
     search_fields = ['name']
+    
+    # Maximum queries per request, authentication included (see config.query_budget)
+    query_budget = {'list': 2, 'retrieve': 2, '*': 6}
 
 
 class DocumentViewSet(viewsets.ModelViewSet):
@@ -35,6 +51,32 @@ class DocumentViewSet(viewsets.ModelViewSet):
     search_fields = ['title', 'reference_number', 'content_text', 'description']
     ordering_fields = ['created_at', 'updated_at', 'title', 'date']
     ordering = ['-created_at']
+    pagination_class = DocumentKeysetPagination
+    
+    # Maximum queries per request, authentication, view tracking and a
+    # reload of the department/folder tree included (see config.query_budget).
+    # Lists run a constant number of queries whatever the page size: related
+    # rows are joined or prefetched.
+    query_budget = {
+        'list': 7,
+        'retrieve': 9,
+        'ocr_text': 6,
+        'similar': 7,
+        'diagnostic': 5,
+        'export_csv': 5,
+        'export_excel': 5,
+        'export_pdf': 5,
+        # Constant whatever the number of files
+        'bulk_upload': 16,
+        'bulk_tag': 14,
+        'bulk_move': 18,
+        'bulk_delete': 20,
+        'create_upload': 8,
+        'upload': 6,
+        'finalize_upload': 16,
+        'download': 6,
+        '*': 20,
+    }
     
     def get_serializer_class(self):
         """Return appropriate serializer class based on action."""
@@ -44,156 +86,147 @@ class DocumentViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """Filter queryset based on user and ensure proper related objects are fetched."""
-        queryset = Document.objects.select_related('department', 'folder', 'uploaded_by')
+        if self.action in ('list', 'retrieve'):
+            # Only what the requested fieldset renders (see SparseFieldsetMixin)
+            select, prefetch, defer = self.get_serializer().get_queryset_plan()
+            queryset = Document.objects.select_related(*select).prefetch_related(*prefetch).defer(*defer)
+        else:
+            queryset = Document.objects.select_related('department', 'folder', 'uploaded_by').prefetch_related('tags')
         
         # Non-admin users can only see their own documents
         if not self.request.user.is_staff:
             queryset = queryset.filter(uploaded_by=self.request.user)
             
-        # Apply department and folder filtering from query parameters
+        # Apply department and folder filtering from query parameters.
+        # Department and folder names come from the process-level metadata
+        # cache, so filtering costs no extra query.
         department_id = self.request.GET.get('department_id')
         folder_id = self.request.GET.get('folder_id')
+        metadata = get_metadata_tree()
+        debug = getattr(settings, 'DOCUMENTS_DEBUG_FILTERS', False)
         
-        # Special case for Commercial/Client Documents
-        # Check if we're looking for Commercial department (typically ID 2) and Client Documents folder
-        if department_id and folder_id:
-            try:
-                department_id_int = int(department_id)
-                folder_id_int = int(folder_id)
-                
-                # Get the actual department and folder to check names
-                from apps.documents.models import Department, Folder
-                try:
-                    dept = Department.objects.get(id=department_id_int)
-                    folder = Folder.objects.get(id=folder_id_int)
-                    
-                    # If this is Commercial/Client Documents, add debug logging
-                    if dept.name == "Commercial" and folder.name == "Client Documents":
-                        print(f"SPECIAL CASE: Commercial/Client Documents folder detected")
-                        print(f"Document count before filter: {queryset.count()}")
-                        
-                        # Get all document IDs to inspect
-                        all_docs = list(queryset.values_list('id', 'title', 'department__name', 'folder__name'))
-                        print(f"All documents before filtering: {all_docs}")
-                except (Department.DoesNotExist, Folder.DoesNotExist):
-                    pass
-            except (ValueError, TypeError):
-                pass
-
         # Standard department filtering
         if department_id:
             try:
                 department_id = int(department_id)
-                
-                # Get department to check if it's Commercial
-                from apps.documents.models import Department
-                try:
-                    dept = Department.objects.get(id=department_id)
-                    
-                    # Special handling for Commercial department
-                    if dept.name == "Commercial":
-                        print(f"SPECIAL CASE: Commercial department detected - applying strict filtering")
-                        
-                        # STRICT FILTERING: If we're viewing the Commercial department WITHOUT a specific folder,
-                        # we should exclude documents that don't have a folder to prevent them showing in all folders
-                        if not folder_id:
-                            # Apply department filter but also ensure a folder exists for each document
-                            queryset = queryset.filter(department_id=department_id).exclude(folder=None)
-                            print(f"Commercial department - excluding documents without folders")
-                        else:
-                            # Regular department filter
-                            queryset = queryset.filter(department_id=department_id)
-                    else:
-                        # Regular department filter for non-Commercial departments
-                        queryset = queryset.filter(department_id=department_id)
-                    
-                    print(f"Filtering documents by department ID: {department_id} ({dept.name})")
-                    print(f"Document count after department filter: {queryset.count()}")
-                except Department.DoesNotExist:
-                    # Regular department filter if department doesn't exist
-                    queryset = queryset.filter(department_id=department_id)
-                    print(f"Filtering documents by department ID: {department_id} (Department not found)")
-                    
             except (ValueError, TypeError):
                 print(f"Invalid department_id: {department_id}")
+                department_id = None
+        
+        if department_id:
+            dept = metadata.get_department(department_id)
+            
+            # STRICT FILTERING: If we're viewing the Commercial department WITHOUT a specific folder,
+            # we should exclude documents that don't have a folder to prevent them showing in all folders
+            if dept and dept['name'] == "Commercial" and not folder_id:
+                queryset = queryset.filter(department_id=department_id).exclude(folder=None)
+            else:
+                queryset = queryset.filter(department_id=department_id)
+            
+            if debug:
+                print(f"Filtering documents by department ID: {department_id} "
+                      f"({dept['name'] if dept else 'Department not found'})")
+                print(f"Document count after department filter: {queryset.count()}")
                 
         # Standard folder filtering
         if folder_id:
             try:
                 folder_id = int(folder_id)
-                
-                # Get the folder object
-                from apps.documents.models import Folder
-                try:
-                    folder = Folder.objects.get(id=folder_id)
-                    
-                    # CRITICAL: For Commercial department folders, we need EXACT matching
-                    is_commercial_folder = False
-                    if folder.department:
-                        try:
-                            is_commercial_folder = folder.department.name == "Commercial"
-                        except:
-                            pass
-                    
-                    # For Commercial department folders, apply very strict filtering
-                    if is_commercial_folder:
-                        print(f"COMMERCIAL FOLDER DETECTED: {folder.name} - Applying VERY strict filtering")
-                        
-                        # For Commercial department folders, require BOTH folder ID AND department ID to match EXACTLY
-                        # This ensures documents only show in their specific assigned folder
-                        queryset = queryset.filter(folder_id=folder_id)
-                        print(f"Strict Commercial folder filtering - now showing {queryset.count()} documents")
-                        
-                        # For "Contracts" folder specifically, make extra sure we're showing only contract documents
-                        if folder.name == "Contracts":
-                            print("ULTRA-STRICT Contracts folder filtering")
-                            # Make absolutely sure these are contract documents in the Contracts folder
-                            queryset = queryset.filter(folder_id=folder_id, document_type__icontains="contract")
-                            print(f"After ultra-strict filtering: {queryset.count()} documents")
-                    else:
-                        # Non-Commercial department - standard folder+department filtering
-                        if department_id:
-                            department_id_int = int(department_id)
-                            # Apply both filters for consistent behavior
-                            queryset = queryset.filter(folder_id=folder_id, department_id=department_id_int)
-                        else:
-                            # Standard folder filtering if no department specified
-                            queryset = queryset.filter(folder_id=folder_id)
-                    
-                    print(f"Filtering documents by folder ID: {folder_id} ({folder.name})")
-                    print(f"Document count after folder filter: {queryset.count()}")
-                    
-                    # Special diagnostic for Commercial/Client Documents folder
-                    if folder.name == "Client Documents" and is_commercial_folder:
-                        print(f"DIAGNOSIS: Commercial/Client Documents folder contains {queryset.count()} documents")
-                        
-                        # Show document details
-                        for doc in queryset[:5]:  # First 5 for brevity
-                            print(f"Document in Client Documents: {doc.title}")
-                            print(f"  Department: {doc.department.name if doc.department else 'None'}")
-                            print(f"  Folder: {doc.folder.name if doc.folder else 'None'}")
-                            print(f"  Type: {doc.document_type}")
-                    
-                    # Special diagnostic for Contracts folder  
-                    if folder.name == "Contracts" and is_commercial_folder:
-                        print(f"DIAGNOSIS: Commercial/Contracts folder contains {queryset.count()} documents")
-                        
-                        # Show document details
-                        for doc in queryset[:5]:  # First 5 for brevity
-                            print(f"Document in Contracts: {doc.title}")
-                            print(f"  Department: {doc.department.name if doc.department else 'None'}")
-                            print(f"  Folder: {doc.folder.name if doc.folder else 'None'}")
-                            print(f"  Type: {doc.document_type}")
-                        
-                except Folder.DoesNotExist:
-                    print(f"Folder with ID {folder_id} not found")
-                    queryset = Document.objects.none()
-                
             except (ValueError, TypeError):
                 print(f"Invalid folder_id: {folder_id}")
+                return queryset
+            
+            folder = metadata.get_folder(folder_id)
+            if folder is None:
+                print(f"Folder with ID {folder_id} not found")
+                return Document.objects.none()
+            
+            # CRITICAL: For Commercial department folders, we need EXACT matching
+            is_commercial_folder = folder['department_name'] == "Commercial"
+            
+            if is_commercial_folder:
+                # Documents only show in their specific assigned folder
+                queryset = queryset.filter(folder_id=folder_id)
+                
+                # For "Contracts" folder specifically, make extra sure we're showing only contract documents
+                if folder['name'] == "Contracts":
+                    queryset = queryset.filter(document_type__icontains="contract")
+            elif department_id:
+                # Non-Commercial department - apply both filters for consistent behavior
+                queryset = queryset.filter(folder_id=folder_id, department_id=department_id)
+            else:
+                # Standard folder filtering if no department specified
+                queryset = queryset.filter(folder_id=folder_id)
+            
+            if debug:
+                self._print_folder_diagnostics(queryset, folder, is_commercial_folder)
                 
         return queryset
     
+    def _print_folder_diagnostics(self, queryset, folder, is_commercial_folder):
+        """Print the documents matched by a folder filter (DOCUMENTS_DEBUG_FILTERS only)."""
+        print(f"Filtering documents by folder ID: {folder['id']} ({folder['name']})")
+        print(f"Document count after folder filter: {queryset.count()}")
+        
+        # Special diagnostic for Commercial department folders
+        if is_commercial_folder and folder['name'] in ("Client Documents", "Contracts"):
+            print(f"DIAGNOSIS: Commercial/{folder['name']} folder contains {queryset.count()} documents")
+            
+            # Show document details
+            for doc in queryset[:5]:  # First 5 for brevity
+                print(f"Document in {folder['name']}: {doc.title}")
+                print(f"  Department: {doc.department.name if doc.department else 'None'}")
+                print(f"  Folder: {doc.folder.name if doc.folder else 'None'}")
+                print(f"  Type: {doc.document_type}")
+    
+    def list(self, request, *args, **kwargs):
+        """
+        List documents, answering 304 when the client's copy is current.
+        
+        Unless relations are expanded, the page is read as values() rows and
+        rendered by DocumentListValuesSerializer, which renders the same
+        data as DocumentListSerializer without building model instances.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        etag = list_etag(queryset, request)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        
+        fields, expand = get_fieldset(request)
+        if not DocumentListValuesSerializer.can_render(fields, expand):
+            return set_validators(super().list(request, *args, **kwargs), etag)
+        
+        values_serializer = DocumentListValuesSerializer(fields)
+        rows = values_serializer.get_queryset(queryset)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            response = self.get_paginated_response(values_serializer.render(page))
+        else:
+            response = Response(values_serializer.render(rows))
+        return set_validators(response, etag)
+    
+    def retrieve(self, request, *args, **kwargs):
+        """Retrieve a document, answering 304 when the client's copy is current."""
+        if request.headers.get('If-None-Match'):
+            # Check the validator with a single-row query before loading
+            # and serializing the document (safe methods need no object
+            # permission beyond the queryset's visibility filter)
+            try:
+                row = self.filter_queryset(self.get_queryset()).filter(
+                    pk=kwargs[self.lookup_field]
+                ).values('id', 'updated_at', 'tag_version').first()
+            except (ValueError, TypeError):
+                row = None
+            if row is not None:
+                etag = document_etag(row['id'], row['updated_at'], row['tag_version'], get_fieldset_key(request))
+                if etag_matches(request, etag):
+                    return not_modified(etag)
+        
+        instance = self.get_object()
+        serializer = self.get_serializer(instance)
+        etag = document_etag(instance.id, instance.updated_at, instance.tag_version, get_fieldset_key(request))
+        return set_validators(Response(serializer.data), etag)
+    
     def perform_create(self, serializer):
         """Save the uploaded_by field when creating a document."""
         try:
@@ -295,6 +328,291 @@ class DocumentViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(document)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     
+    @action(detail=False, methods=['post'])
+    def bulk_upload(self, request):
+        """
+        Upload many files at once, as documents sharing the same metadata.
+        
+        Expects multipart data with one or more 'files' and optional
+        document_type, description, reference_number, date, department,
+        folder and tag_ids. Titles are taken from the file names.
+        """
+        from apps.documents.serializers.document_serializers import BulkUploadSerializer
+        from apps.documents.utils.bulk_utils import bulk_create_documents
+        
+        serializer = BulkUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = dict(serializer.validated_data)
+        
+        documents = bulk_create_documents(
+            request.user, data.pop('files'), tags=data.pop('tag_ids'), request=request, **data
+        )
+        prefetch_related_objects(documents, 'tags')
+        
+        return Response(
+            {
+                "count": len(documents),
+                "documents": DocumentListSerializer(documents, many=True, context={'request': request}).data,
+            },
+            status=status.HTTP_201_CREATED
+        )
+    
+    @action(detail=False, methods=['post'])
+    def bulk_tag(self, request):
+        """
+        Add and remove tags on many documents at once.
+        
+        Expects 'ids' (or 'all_matching' with the list filters in the query
+        string) and 'add_tag_ids' and/or 'remove_tag_ids'.
+        """
+        from apps.documents.serializers.document_serializers import BulkTagSerializer
+        from apps.documents.utils.bulk_utils import bulk_tag_documents
+        
+        serializer = BulkTagSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        documents, error = self._get_bulk_documents(request, serializer.validated_data)
+        if error:
+            return error
+        
+        count = bulk_tag_documents(
+            request.user, documents,
+            add_tags=serializer.validated_data['add_tag_ids'],
+            remove_tags=serializer.validated_data['remove_tag_ids'],
+            request=request
+        )
+        return Response({"count": count})
+    
+    @action(detail=False, methods=['post'])
+    def bulk_move(self, request):
+        """
+        Re-file many documents into a department and folder at once.
+        
+        Expects 'ids' (or 'all_matching' with the list filters in the query
+        string) and the target 'department' and/or 'folder'.
+        """
+        from apps.documents.serializers.document_serializers import BulkMoveSerializer
+        from apps.documents.utils.bulk_utils import bulk_move_documents
+        
+        serializer = BulkMoveSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        documents, error = self._get_bulk_documents(request, serializer.validated_data)
+        if error:
+            return error
+        
+        count = bulk_move_documents(
+            request.user, documents,
+            department=serializer.validated_data['department'],
+            folder=serializer.validated_data['folder'],
+            request=request
+        )
+        return Response({"count": count})
+    
+    @action(detail=False, methods=['post'])
+    def bulk_delete(self, request):
+        """
+        Delete many documents at once.
+        
+        Expects 'ids' (or 'all_matching' with the list filters in the query
+        string).
+        """
+        from apps.documents.serializers.document_serializers import BulkSelectionSerializer
+        from apps.documents.utils.bulk_utils import bulk_delete_documents
+        
+        serializer = BulkSelectionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        documents, error = self._get_bulk_documents(request, serializer.validated_data)
+        if error:
+            return error
+        
+        count = bulk_delete_documents(request.user, documents, request=request)
+        return Response({"count": count})
+    
+    def _get_bulk_documents(self, request, data):
+        """
+        Resolve the documents selected for a bulk operation.
+        
+        As for single documents, users other than staff only reach their
+        own documents; ids of any other document are reported missing.
+        
+        Returns:
+            (queryset of the selected documents, None), or (None, error response)
+        """
+        from apps.documents.utils.bulk_utils import get_bulk_operation_max_documents
+        
+        documents = self.get_queryset()
+        if data['all_matching']:
+            documents = self.filter_queryset(documents)
+        else:
+            documents = documents.filter(id__in=data['ids'])
+        
+        max_documents = get_bulk_operation_max_documents()
+        document_ids = list(documents.order_by().values_list('id', flat=True)[:max_documents + 1])
+        if len(document_ids) > max_documents:
+            return None, Response(
+                {"error": f"At most {max_documents} documents can be changed at once."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not data['all_matching']:
+            missing = sorted(set(data['ids']) - set(document_ids))
+            if missing:
+                return None, Response(
+                    {"error": "Documents not found.", "ids": missing}, status=status.HTTP_404_NOT_FOUND
+                )
+        
+        return Document.objects.filter(id__in=document_ids), None
+    
+    @action(detail=False, methods=['post'], url_path='uploads')
+    def create_upload(self, request):
+        """
+        Open a resumable upload.
+        
+        Expects the filename, its size in bytes, an optional sha256 and
+        title, and the document metadata accepted by bulk_upload. The file
+        is then sent in chunks with PUT uploads/<id>/ and turned into a
+        document with POST uploads/<id>/finalize/.
+        """
+        from apps.documents.models import UploadSession
+        from apps.documents.serializers.document_serializers import UploadSessionSerializer
+        from apps.documents.utils.upload_utils import get_expiry
+        
+        serializer = UploadSessionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        session = UploadSession.objects.create(
+            user=request.user,
+            filename=serializer.validated_data['filename'],
+            size=serializer.validated_data['size'],
+            sha256=serializer.validated_data['sha256'].lower(),
+            metadata=serializer.get_metadata(),
+            expires_at=get_expiry()
+        )
+        return Response(self._upload_status(session), status=status.HTTP_201_CREATED)
+    
+    @action(detail=False, methods=['get', 'put', 'delete'], url_path=r'uploads/(?P<upload_id>[0-9a-f-]+)')
+    def upload(self, request, upload_id=None):
+        """
+        Query, continue or abort a resumable upload.
+        
+        GET returns the number of bytes received. PUT appends the raw
+        request body at the offset given by a Content-Range or
+        Upload-Offset header; a chunk sent at any other offset is refused
+        with 409 and the expected offset, to resume from. DELETE aborts.
+        """
+        from apps.documents.utils.upload_utils import (
+            UploadError, append_chunk, discard_session, get_session, parse_chunk_offset
+        )
+        
+        try:
+            if request.method == 'PUT':
+                offset = parse_chunk_offset(request)
+                session = append_chunk(upload_id, request.user, offset, request.stream or BytesIO())
+            elif request.method == 'DELETE':
+                discard_session(get_session(upload_id, request.user))
+                return Response(status=status.HTTP_204_NO_CONTENT)
+            else:
+                session = get_session(upload_id, request.user)
+        except UploadError as e:
+            return self._upload_error(e, upload_id)
+        
+        return Response(self._upload_status(session))
+    
+    @action(detail=False, methods=['post'], url_path=r'uploads/(?P<upload_id>[0-9a-f-]+)/finalize')
+    def finalize_upload(self, request, upload_id=None):
+        """
+        Turn a complete resumable upload into a document.
+        
+        The file is checked against the sha256 given here or when the
+        upload was opened; on a mismatch the upload is discarded.
+        """
+        from django.db import transaction
+        from apps.ai.ocr import queue_documents_ocr
+        from apps.documents.serializers.document_serializers import DocumentMetadataSerializer
+        from apps.documents.utils.bulk_utils import title_from_filename
+        from apps.documents.utils.upload_utils import (
+            UploadError, discard_session, finalize_session, get_session
+        )
+        
+        session = None
+        try:
+            with transaction.atomic():
+                session = get_session(upload_id, request.user, for_update=True)
+                
+                # Departments, folders or tags may have been deleted meanwhile
+                metadata = DocumentMetadataSerializer(data=session.metadata)
+                metadata.is_valid(raise_exception=True)
+                data = dict(metadata.validated_data)
+                tags = data.pop('tag_ids')
+                title = session.metadata.get('title') or title_from_filename(session.filename)
+                
+                def create_document(file):
+                    document = Document.objects.create(
+                        title=title, file=file, uploaded_by=request.user, **data
+                    )
+                    if tags:
+                        document.tags.set(tags)
+                    log_user_activity(
+                        user=request.user,
+                        action_type='create',
+                        content_object=document,
+                        description=f"Created document: {document.title}",
+                        request=request
+                    )
+                    return document
+                
+                document, checksum = finalize_session(
+                    session, create_document, sha256=request.data.get('sha256', '')
+                )
+                transaction.on_commit(lambda: queue_documents_ocr([document.id]))
+        except UploadError as e:
+            if e.discard and session is not None:
+                discard_session(session)
+            return self._upload_error(e, upload_id)
+        
+        data = DocumentSerializer(document, context={'request': request}).data
+        data['sha256'] = checksum
+        return Response(data, status=status.HTTP_201_CREATED)
+    
+    def _upload_status(self, session):
+        """Return the progress of a resumable upload."""
+        return {
+            "id": str(session.id),
+            "filename": session.filename,
+            "size": session.size,
+            "offset": session.offset,
+            "expires_at": session.expires_at,
+        }
+    
+    def _upload_error(self, error, upload_id):
+        """Return the response of a refused upload request, with the offset to resume from."""
+        response = Response({"error": str(error)}, status=error.status_code)
+        if error.status_code == status.HTTP_409_CONFLICT:
+            from apps.documents.models import UploadSession
+            offset = UploadSession.objects.filter(id=upload_id).values_list('offset', flat=True).first()
+            if offset is not None:
+                response.data['offset'] = offset
+                response['Upload-Offset'] = str(offset)
+        return response
+    
+    @action(detail=True, methods=['get'], content_negotiation_class=IgnoreClientContentNegotiation)
+    def download(self, request, pk=None):
+        """
+        Download a document's file.
+        
+        Supports single Range requests (206, or 416 past the end of the
+        file) for viewers fetching pages lazily, and hands the file to the
+        front proxy with X-Accel-Redirect or X-Sendfile when
+        SENDFILE_BACKEND is set. ?inline=true opens the file in the browser.
+        """
+        document = self.get_object()
+        if not document.file:
+            return Response({"error": "This document has no file."}, status=status.HTTP_404_NOT_FOUND)
+        
+        inline = request.query_params.get('inline', '').lower() in ('1', 'true', 'yes')
+        try:
+            return file_response(request, document, as_attachment=not inline)
+        except FileNotFoundError:
+            return Response({"error": "The document file is missing."}, status=status.HTTP_404_NOT_FOUND)
+    
     @action(detail=True, methods=['post'])
     def process_ocr(self, request, pk=None):
         """
@@ -324,27 +642,29 @@ class DocumentViewSet(viewsets.ModelViewSet):
         Return diagnostic information about documents.
         Helps troubleshoot document visibility issues.
         """
+        from apps.documents.utils.counter_utils import get_counts
+        
         user = request.user
-        all_docs = Document.objects.all().count()
         user_docs = Document.objects.filter(uploaded_by=user).count()
         
-        # Department and folder stats
+        # Department and folder stats, read from the maintained counters
+        # (one row per department/folder pair) and the cached names
+        tree = get_metadata_tree()
+        all_docs = 0
         dept_counts = {}
         folder_counts = {}
         
-        # Get stats per department
-        for doc in Document.objects.select_related('department', 'folder'):
-            dept_name = doc.department.name if doc.department else 'None'
-            if dept_name not in dept_counts:
-                dept_counts[dept_name] = 0
-            dept_counts[dept_name] += 1
+        for (department_id, folder_id), count in get_counts().items():
+            all_docs += count
+            department = tree.get_department(department_id)
+            dept_name = department['name'] if department else 'None'
+            dept_counts[dept_name] = dept_counts.get(dept_name, 0) + count
             
             # Get stats per folder
-            if doc.department and doc.folder:
-                folder_key = f"{doc.department.name}/{doc.folder.name}"
-                if folder_key not in folder_counts:
-                    folder_counts[folder_key] = 0
-                folder_counts[folder_key] += 1
+            folder = tree.get_folder(folder_id)
+            if department and folder:
+                folder_key = f"{dept_name}/{folder['name']}"
+                folder_counts[folder_key] = folder_counts.get(folder_key, 0) + count
         
         return Response({
             "total_documents": all_docs,
@@ -361,19 +681,77 @@ class DocumentViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def ocr_text(self, request, pk=None):
         """
-        Retrieve the full OCR text for a document.
+        Retrieve the OCR text for a document, whole or by pages.
+        
+        ?pages=3, ?pages=3-5 or ?pages=3- returns these pages only (at most
+        OCR_TEXT_MAX_PAGES), read from the database without loading the
+        rest of the text. Responses carry an ETag for revalidation.
         """
         document = self.get_object()
         
-        try:
-            ocr_data = document.ocr_data
-            serializer = DocumentOCRSerializer(ocr_data)
-            return Response(serializer.data)
-        except DocumentOCR.DoesNotExist:
+        ocr_data = DocumentOCR.objects.filter(document=document).defer('full_text').first()
+        if ocr_data is None:
             return Response(
                 {"message": "No OCR data available for this document."},
                 status=status.HTTP_404_NOT_FOUND
             )
+        
+        pages = request.query_params.get('pages')
+        etag = ocr_etag(ocr_data.id, ocr_data.updated_at, pages or '')
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        
+        if pages is None:
+            return set_validators(Response(DocumentOCRSerializer(ocr_data).data), etag)
+        
+        try:
+            page_range = parse_page_range(pages, getattr(settings, 'OCR_TEXT_MAX_PAGES', 20))
+        except ValueError as e:
+            return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        serializer = DocumentOCRPagesSerializer(ocr_data, context={'page_range': page_range})
+        return set_validators(Response(serializer.data), etag)
+    
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """
+        Find the documents whose OCR text is most similar to this document's.
+        """
+        from apps.ai.similarity import get_similarity_index
+        
+        document = self.get_object()
+        
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 50)
+        except (TypeError, ValueError):
+            limit = 10
+        
+        index = get_similarity_index()
+        if index is None:
+            return Response(
+                {"message": "The similarity index has not been built yet."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+        
+        # Documents not indexed yet are embedded on the fly
+        vector = index.get_vector(document.id)
+        if vector is None:
+            ocr_data = DocumentOCR.objects.filter(document=document).first()
+            vector = index.embed(ocr_data.full_text) if ocr_data else None
+        if vector is None:
+            return Response([])
+        
+        # Over-fetch: some matches may not be visible to the user
+        matches = dict(index.search(
+            vector, k=limit * 4, nprobe=getattr(settings, 'SIMILARITY_NPROBE', 8), exclude=document.id
+        ))
+        documents = self.get_queryset().filter(id__in=matches).prefetch_related('tags')
+        documents = sorted(documents, key=lambda doc: matches[doc.id], reverse=True)[:limit]
+        
+        data = DocumentListSerializer(documents, many=True, context={'request': request}).data
+        for item in data:
+            item['similarity'] = round(matches[item['id']], 4)
+        return Response(data)
     
     @action(detail=False, methods=['get'])
     def export_csv(self, request):
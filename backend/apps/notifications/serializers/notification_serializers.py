@@ -24,15 +24,13 @@ class NotificationSerializer(serializers.ModelSerializer):
     
     def get_document_title(self, obj):
         """Get the title of the related document if it exists."""
-        if obj.document:
+        if obj.document_id:
             return obj.document.title
         return None
     
     def get_document_id(self, obj):
         """Get the ID of the related document if it exists."""
-        if obj.document:
-            return obj.document.id
-        return None
+        return obj.document_id
     
     def get_time_since(self, obj):
         """Get a human-readable time since the notification was created."""
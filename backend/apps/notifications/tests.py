@@ -0,0 +1,49 @@
+"""Tests for notification functionality."""
+
+from django.test import override_settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from apps.documents.models import Document
+from apps.notifications.views.notification_views import NotificationViewSet
+from config.query_budget import QueryBudgetTestMixin
+from config.testing import TemporaryMediaTestCase
+
+User = get_user_model()
+
+
+@override_settings(QUERY_BUDGET_MODE='raise')
+class NotificationQueryBudgetTestCase(QueryBudgetTestMixin, TemporaryMediaTestCase):
+    """Test cases for the query budgets of the notification endpoints."""
+
+    def setUp(self):
+        """Set up test environment."""
+        self.user = User.objects.create_user(username='clerk', password='testpassword')
+        self.create_documents(2)
+        self.client = APIClient()
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def create_documents(self, count):
+        """Create documents, each notifying its uploader."""
+        for i in range(count):
+            Document.objects.create(
+                title=f'Report {i}', uploaded_by=self.user, is_ocr_processed=True,
+                file=SimpleUploadedFile('doc.pdf', b'%PDF-1.4', content_type='application/pdf'),
+            )
+
+    def test_list_within_budget(self):
+        """Test that listing notifications stays within its budget."""
+        with self.assertWithinQueryBudget(NotificationViewSet, 'list'):
+            response = self.client.get('/api/notifications/')
+
+        self.assertEqual(len(response.data), 2)
+        self.assertEqual(response.data[0]['document_title'], 'Report 1')
+
+    def test_list_has_no_n_plus_one(self):
+        """Test that the related documents are not loaded once per notification."""
+        for url in ['/api/notifications/', '/api/notifications/recent/']:
+            with self.subTest(url=url):
+                self.assertConstantQueries(lambda: self.client.get(url), lambda: self.create_documents(3))
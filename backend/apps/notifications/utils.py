@@ -28,3 +28,52 @@ def send_notification_to_user(user_id, notification_data):
             "content": notification_json
         }
     )
+
+
+def notify_bulk_upload(user, documents):
+    """
+    Notify a user once about a batch of uploaded documents.
+    
+    A single notification (and WebSocket message) stands for the whole
+    batch instead of one per document.
+    
+    Args:
+        user: The user who uploaded the documents
+        documents: The created documents
+    
+    Returns:
+        Notification: The created notification, or None for an empty batch
+    """
+    from apps.notifications.models import Notification
+    
+    documents = list(documents)
+    if not documents:
+        return None
+    
+    count = len(documents)
+    if count == 1:
+        message = f'Your document "{documents[0].title}" has been uploaded successfully.'
+    else:
+        message = f'{count} documents have been uploaded successfully.'
+    
+    notification = Notification.objects.create(
+        user=user,
+        notification_type='document_upload',
+        title='Documents Uploaded' if count > 1 else 'Document Uploaded',
+        message=message,
+        document=documents[0] if count == 1 else None
+    )
+    
+    send_notification_to_user(user.id, {
+        'id': notification.id,
+        'type': notification.notification_type,
+        'title': notification.title,
+        'message': notification.message,
+        'is_read': notification.is_read,
+        'created_at': notification.created_at.isoformat(),
+        'document_id': notification.document_id,
+        'document_title': documents[0].title if count == 1 else None,
+        'document_ids': [document.id for document in documents]
+    })
+    
+    return notification
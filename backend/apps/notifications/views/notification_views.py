@@ -14,11 +14,21 @@ class NotificationViewSet(viewsets.ModelViewSet):
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
     
+    # Maximum queries per request, authentication included (see config.query_budget)
+    query_budget = {
+        'list': 3,
+        'retrieve': 3,
+        'recent': 3,
+        'unread_count': 2,
+        'mark_all_as_read': 2,
+        '*': 5,
+    }
+    
     def get_queryset(self):
         """Return notifications for the current user, ordered by creation date."""
         return Notification.objects.filter(
             user=self.request.user
-        ).order_by('-created_at')
+        ).select_related('document').order_by('-created_at')
     
     def perform_create(self, serializer):
         """Save the user when creating a notification."""
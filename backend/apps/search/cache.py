@@ -0,0 +1,92 @@
+"""In-process cache of search results."""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from apps.documents.utils.cache_utils import get_generation
+
+# Search results depend on documents and on department/folder names
+SEARCH_GENERATIONS = ('documents', 'metadata')
+
+
+def normalize_query_params(query_params):
+    """
+    Normalize search parameters so equivalent searches share a cache key.
+    
+    Empty values and client-side cache busters (parameters starting with
+    an underscore) are dropped, keys are sorted and list values are sorted.
+    """
+    normalized = []
+    for key in sorted(query_params.keys()):
+        if key.startswith('_'):
+            continue
+        values = sorted(value.strip() for value in query_params.getlist(key) if value.strip())
+        if values:
+            normalized.append((key, tuple(values)))
+    return tuple(normalized)
+
+
+def get_user_scope(user):
+    """Return the visibility scope of a user: staff see every document."""
+    if user.is_staff:
+        return 'staff'
+    return f'user:{user.pk}'
+
+
+class SearchResultCache:
+    """
+    Thread-safe LRU cache with a time-to-live for search responses.
+    
+    Keys embed the data generations, so any document change makes all
+    earlier entries unreachable; they are then evicted by LRU or TTL.
+    """
+    
+    def __init__(self, max_entries=512, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def make_key(self, request):
+        """Build the cache key for a search request."""
+        return (
+            tuple(get_generation(name) for name in SEARCH_GENERATIONS),
+            get_user_scope(request.user),
+            request.get_host(),
+            normalize_query_params(request.query_params),
+        )
+    
+    def get(self, key):
+        """Return the cached value for a key, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+    
+    def set(self, key, value):
+        """Store a value, evicting the least recently used entries if full."""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        """Remove every entry."""
+        with self._lock:
+            self._entries.clear()
+
+
+search_cache = SearchResultCache(
+    max_entries=getattr(settings, 'SEARCH_CACHE_MAX_ENTRIES', 512),
+    ttl=getattr(settings, 'SEARCH_CACHE_TTL', 300),
+)
@@ -0,0 +1,130 @@
+"""Circuit breaker protecting searches against an unavailable Elasticsearch."""
+
+import threading
+import time
+
+from django.conf import settings
+from elasticsearch.exceptions import ConnectionError as ESConnectionError, TransportError
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the circuit is open."""
+
+
+def is_elasticsearch_unavailable(exc):
+    """
+    Tell whether an exception means Elasticsearch is down or overloaded.
+
+    Connection errors, timeouts and 5xx/429 responses count as failures;
+    errors caused by the request itself (e.g. a malformed query) do not.
+    """
+    if isinstance(exc, ESConnectionError):
+        return True
+    if isinstance(exc, TransportError):
+        status_code = exc.status_code
+        return isinstance(status_code, int) and (status_code >= 500 or status_code == 429)
+    return False
+
+
+class CircuitBreaker:
+    """
+    Thread-safe circuit breaker with closed, open and half-open states.
+
+    The circuit opens after ``failure_threshold`` consecutive failures and
+    rejects calls for ``recovery_timeout`` seconds. It then lets a single
+    probe call through (half-open): a success closes the circuit again,
+    a failure re-opens it for another ``recovery_timeout``.
+    """
+
+    def __init__(self, name, failure_threshold=5, recovery_timeout=30, is_failure=None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.is_failure = is_failure or (lambda exc: True)
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        """Current state, moving from open to half-open once the timeout elapsed."""
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+                self._state = HALF_OPEN
+                self._probing = False
+            return self._state
+
+    def allow_request(self):
+        """Tell whether a call may proceed, reserving the probe when half-open."""
+        state = self.state
+        with self._lock:
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        """Close the circuit after a successful call."""
+        with self._lock:
+            if self._state != CLOSED:
+                print(f"Circuit breaker '{self.name}' closed")
+            self._state = CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        """Count a failed call, opening the circuit past the threshold."""
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    print(f"Circuit breaker '{self.name}' opened after {self._failures} failures")
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+
+    def call(self, func, *args, **kwargs):
+        """
+        Call a function through the breaker.
+
+        Raises:
+            CircuitOpenError: If the circuit is open
+        """
+        if not self.allow_request():
+            raise CircuitOpenError(f"Circuit breaker '{self.name}' is open")
+
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            if self.is_failure(e):
+                self.record_failure()
+            else:
+                # The service answered, the error is ours
+                self.record_success()
+            raise
+
+        self.record_success()
+        return result
+
+    def reset(self):
+        """Close the circuit and forget past failures."""
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._probing = False
+
+
+elasticsearch_breaker = CircuitBreaker(
+    'elasticsearch',
+    failure_threshold=getattr(settings, 'ELASTICSEARCH_BREAKER_FAILURE_THRESHOLD', 5),
+    recovery_timeout=getattr(settings, 'ELASTICSEARCH_BREAKER_RECOVERY_TIMEOUT', 30),
+    is_failure=is_elasticsearch_unavailable,
+)
@@ -1,9 +1,28 @@
 """Elasticsearch documents for the search app."""
 
+from django.conf import settings
 from django_elasticsearch_dsl import Document, fields
 from django_elasticsearch_dsl.registries import registry
+from elasticsearch_dsl import MetaField
 
-from apps.documents.models import Document as DocumentModel, Tag
+from apps.ai.ocr import split_ocr_pages
+from apps.documents.models import Document as DocumentModel, DocumentOCR, Tag
+
+
+def chunk_text(text, size):
+    """Split text into chunks of at most `size` characters at whitespace."""
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = start + size
+        if end < len(text):
+            # Break on the last whitespace so words are not cut in half
+            split_at = text.rfind(' ', start, end)
+            if split_at > start:
+                end = split_at
+        chunks.append(text[start:end].strip())
+        start = end
+    return [chunk for chunk in chunks if chunk]
 
 
 @registry.register_document
@@ -33,6 +52,9 @@ class DocumentDocument(Document):
         'email': fields.TextField(),
     })
     
+    # Exact values so the document type can be filtered and aggregated on
+    document_type = fields.KeywordField()
+    
     # Date fields with specific formats for better search
     created_at = fields.DateField()
     updated_at = fields.DateField()
@@ -47,6 +69,20 @@ class DocumentDocument(Document):
         }
     )
     
+    # Full OCR text, one nested object per page chunk so matches deep inside
+    # long documents are found and reported with their page number
+    ocr_chunks = fields.NestedField(properties={
+        'page': fields.IntegerField(),
+        'chunk': fields.IntegerField(),
+        'text': fields.TextField(analyzer='standard'),
+    })
+    
+    class Meta:
+        """Mapping options."""
+        
+        # The chunk text is searchable but not stored a second time in _source
+        source = MetaField(excludes=['ocr_chunks.text'])
+    
     class Index:
         """Meta class for Elasticsearch index."""
         
@@ -77,12 +113,31 @@ class DocumentDocument(Document):
         fields = [
             'id',
             'title',
-            'document_type',
             'description',
             'reference_number',
             'is_ocr_processed',
         ]
     
+    def get_queryset(self):
+        """Return the documents to index with their related objects preloaded."""
+        return super().get_queryset().select_related(
+            'department', 'folder', 'uploaded_by', 'ocr_data'
+        ).prefetch_related('tags')
+    
+    def prepare_ocr_chunks(self, instance):
+        """Split the full OCR text into per-page, size-bounded chunks."""
+        try:
+            full_text = instance.ocr_data.full_text
+        except DocumentOCR.DoesNotExist:
+            return []
+        
+        chunk_size = getattr(settings, 'ELASTICSEARCH_OCR_CHUNK_SIZE', 2000)
+        chunks = []
+        for page, page_text in split_ocr_pages(full_text):
+            for i, text in enumerate(chunk_text(page_text, chunk_size)):
+                chunks.append({'page': page, 'chunk': i, 'text': text})
+        return chunks
+    
     def get_instances_from_related(self, related_instance):
         """Get instances from related models."""
         if isinstance(related_instance, Tag):
@@ -1,8 +1,18 @@
 """Elasticsearch search utilities."""
 
+from django.conf import settings
+from django.db.models import Case, When
 from elasticsearch_dsl import Q
+from apps.documents.models import Document
+from apps.search.circuit_breaker import CircuitOpenError, elasticsearch_breaker
 from apps.search.documents import DocumentDocument
 
+# _source fields needed to render a result exactly like DocumentListSerializer
+LIST_SOURCE_FIELDS = [
+    'id', 'title', 'document_type', 'reference_number', 'date',
+    'tags', 'uploaded_by.username', 'created_at', 'is_ocr_processed',
+]
+
 
 def elasticsearch_search(query_params, user=None, use_elasticsearch=True):
     """
@@ -16,19 +26,44 @@ def elasticsearch_search(query_params, user=None, use_elasticsearch=True):
     Returns:
         QuerySet of Document objects matching the search criteria
     """
+    from apps.search.utils import advanced_search
+    
     # Check if Elasticsearch is available
     if not use_elasticsearch:
-        from apps.search.utils import advanced_search
         return advanced_search(query_params, user)
     
-    # Start with an empty search
-    search = DocumentDocument.search()
+    # Execute search, skipping Elasticsearch while the circuit is open
+    try:
+        search_results = elasticsearch_breaker.call(build_elasticsearch_query(query_params, user).execute)
+    except CircuitOpenError:
+        return advanced_search(query_params, user)
+    
+    # Convert back to Django QuerySet for consistency with the API
+    doc_ids = [hit.meta.id for hit in search_results]
+    return hydrate_documents(doc_ids)
+
+
+def build_elasticsearch_query(query_params, user=None):
+    """
+    Build the Elasticsearch query for an advanced search without executing it.
+    
+    Args:
+        query_params: Dictionary of query parameters
+        user: User object to filter documents by user if not admin
+        
+    Returns:
+        elasticsearch_dsl Search object
+    """
+    # Start with an empty search, failing fast rather than holding the request
+    search = DocumentDocument.search().params(
+        request_timeout=getattr(settings, 'ELASTICSEARCH_SEARCH_TIMEOUT', 3)
+    )
     
     # Filter by user if not admin
     if user and not user.is_staff:
         search = search.filter('term', uploaded_by__id=user.id)
     
-    # Text search (across multiple fields)
+    # Text search (across multiple fields and the full OCR text)
     text_query = query_params.get('q', '')
     if text_query:
         # Multi-field search with boosting
@@ -38,7 +73,7 @@ def elasticsearch_search(query_params, user=None, use_elasticsearch=True):
                 fields=['title^3', 'content_text^2', 'reference_number^2', 
                         'description', 'document_type', 'tags.name'],
                 fuzziness="AUTO"
-            )
+            ) | ocr_chunks_query(text_query, 'text_pages')
         )
     
     # Department filter
@@ -62,7 +97,9 @@ def elasticsearch_search(query_params, user=None, use_elasticsearch=True):
     # Content-specific search
     content_query = query_params.get('content_query', '')
     if content_query:
-        search = search.query('match', content_text=content_query)
+        search = search.query(
+            Q('match', content_text=content_query) | ocr_chunks_query(content_query, 'content_pages')
+        )
     
     # Document type filter
     doc_type = query_params.get('document_type', '')
@@ -99,31 +136,151 @@ def elasticsearch_search(query_params, user=None, use_elasticsearch=True):
     if uploader_id and user and user.is_staff:
         search = search.filter('term', uploaded_by__id=uploader_id)
     
-    # Ordering
+    # Ordering, with the id as tie-breaker so deep pagination is stable
     ordering = query_params.get('ordering', '-created_at')
     if ordering.startswith('-'):
-        search = search.sort({ordering[1:]: {"order": "desc"}})
+        search = search.sort({ordering[1:]: {"order": "desc"}}, {"id": {"order": "desc"}})
     else:
-        search = search.sort({ordering: {"order": "asc"}})
+        search = search.sort({ordering: {"order": "asc"}}, {"id": {"order": "asc"}})
     
-    # Execute search
-    search_results = search.execute()
+    return search
+
+
+def ocr_chunks_query(text, name):
+    """
+    Build a nested query over the OCR text chunks.
     
-    # Get Django models from Elasticsearch results
-    from django.db.models import prefetch_related_objects
-    doc_ids = [hit.meta.id for hit in search_results]
+    Matching chunks are returned as inner hits carrying only their page
+    number (from doc values), which get_matching_pages() reads back.
+    """
+    return Q(
+        'nested',
+        path='ocr_chunks',
+        query=Q('match', ocr_chunks__text=text),
+        inner_hits={
+            'name': name,
+            'size': getattr(settings, 'ELASTICSEARCH_MATCHING_PAGES_LIMIT', 20),
+            '_source': False,
+            'docvalue_fields': ['ocr_chunks.page'],
+        },
+    )
+
+
+def add_facet_aggregations(search):
+    """
+    Add the facet aggregations to a search so they run in the same request.
     
-    # Convert back to Django QuerySet for consistency with the API
-    from apps.documents.models import Document
+    Args:
+        search: elasticsearch_dsl Search object
+        
+    Returns:
+        A new Search object with the facet aggregations
+    """
+    search = search._clone()
+    search.aggs.bucket('department', 'terms', field='department.id', size=100)
+    search.aggs.bucket('folder', 'terms', field='folder.id', size=500)
+    search.aggs.bucket('document_type', 'terms', field='document_type', size=50)
+    search.aggs.bucket('is_ocr_processed', 'terms', field='is_ocr_processed')
+    search.aggs.bucket(
+        'date', 'date_histogram', field='date',
+        calendar_interval='month', format='yyyy-MM', min_doc_count=1
+    )
+    return search
+
+
+def parse_facet_aggregations(aggregations):
+    """
+    Convert the facet aggregations of a response to the facet format.
+    
+    Args:
+        aggregations: The raw 'aggregations' dictionary of the response
+        
+    Returns:
+        Dictionary in the same format as apps.search.utils.facet_counts()
+    """
+    from apps.search.utils import build_facets
+    
+    def buckets(name, key='key'):
+        return [(bucket[key], bucket['doc_count']) for bucket in aggregations[name]['buckets']]
+    
+    return build_facets(
+        department=buckets('department'),
+        folder=buckets('folder'),
+        document_type=buckets('document_type'),
+        # Boolean terms come back as 0/1 keys
+        is_ocr_processed=[(bool(key), count) for key, count in buckets('is_ocr_processed')],
+        date=buckets('date', key='key_as_string'),
+    )
+
+
+def get_matching_pages(hit):
+    """
+    Get the OCR page numbers that matched the text query for a raw hit.
+    
+    Args:
+        hit: Raw hit dictionary from the Elasticsearch response
+        
+    Returns:
+        Sorted list of unique page numbers
+    """
+    pages = set()
+    for inner in (hit.get('inner_hits') or {}).values():
+        for chunk in inner['hits']['hits']:
+            pages.update(chunk.get('fields', {}).get('ocr_chunks.page', []))
+    return sorted(pages)
+
+
+def hydrate_documents(doc_ids):
+    """
+    Load Document objects for Elasticsearch hits, preserving the hit order.
+    
+    Args:
+        doc_ids: Ordered list of document IDs
+        
+    Returns:
+        QuerySet of Document objects in the same order as doc_ids
+    """
     queryset = Document.objects.filter(id__in=doc_ids)
     
     # Ensure same ordering as search results
-    from django.db.models import Case, When
-    preserved_order = Case(*[When(pk=pk, then=pos) for pos, pk in enumerate(doc_ids)])
-    queryset = queryset.order_by(preserved_order)
+    if doc_ids:
+        preserved_order = Case(*[When(pk=pk, then=pos) for pos, pk in enumerate(doc_ids)])
+        queryset = queryset.order_by(preserved_order)
     
     # Prefetch related objects
     queryset = queryset.select_related('department', 'folder', 'uploaded_by')
     queryset = queryset.prefetch_related('tags')
     
     return queryset
+
+
+def serialize_hit(source):
+    """
+    Render an Elasticsearch _source like DocumentListSerializer would.
+    
+    Args:
+        source: The _source dictionary of a hit
+        
+    Returns:
+        dict with the same keys and value formats as DocumentListSerializer
+    """
+    created_at = source.get('created_at')
+    # Match DRF's ISO 8601 rendering of UTC datetimes
+    if created_at and created_at.endswith('+00:00'):
+        created_at = created_at[:-6] + 'Z'
+    
+    return {
+        'id': source.get('id'),
+        'title': source.get('title'),
+        'document_type': source.get('document_type'),
+        'reference_number': source.get('reference_number'),
+        'date': source.get('date'),
+        'tags': [
+            {'id': tag.get('id'), 'name': tag.get('name')}
+            for tag in source.get('tags') or []
+        ],
+        'uploaded_by_username': (source.get('uploaded_by') or {}).get('username'),
+        'created_at': created_at,
+        'is_ocr_processed': source.get('is_ocr_processed'),
+    }
+
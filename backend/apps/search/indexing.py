@@ -0,0 +1,193 @@
+"""Queued, batched Elasticsearch indexing for documents.
+
+Model signals only record which document ids changed. The pending ids are
+coalesced per document and flushed once per request, Celery task or
+transaction, and the actual indexing happens off the request path with the
+bulk API. Events raised in a transaction that rolls back are dropped.
+"""
+
+import threading
+from contextlib import contextmanager
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django_elasticsearch_dsl.apps import DEDConfig
+
+from apps.documents.utils.cache_utils import bump_generation
+
+INDEX = 'index'
+DELETE = 'delete'
+
+_state = threading.local()
+
+
+class _Batch:
+    """Indexing events collected until the batch closes."""
+
+    def __init__(self, in_atomic):
+        self.events = {}
+        # Opened inside a transaction: its events share the transaction's fate
+        self.in_atomic = in_atomic
+
+
+def _get_batches():
+    """Return the stack of open batches of the current thread."""
+    if not hasattr(_state, 'batches'):
+        _state.batches = []
+    return _state.batches
+
+
+def queue_document(document_id, action=INDEX):
+    """
+    Queue a document for (re)indexing or removal from the search index.
+
+    Repeated events for the same document are coalesced: the last action wins.
+    """
+    queue_documents([document_id], action)
+
+
+def queue_documents(document_ids, action=INDEX):
+    """Queue several documents for the same indexing action."""
+    if not DEDConfig.autosync_enabled():
+        return
+
+    events = {document_id: action for document_id in document_ids if document_id is not None}
+    if events:
+        _queue_events(events)
+
+
+def _queue_events(events):
+    """
+    Route indexing events to where they wait for their flush.
+
+    Events raised inside a transaction only count once it commits: they
+    are held by an on_commit callback, which Django drops if the
+    transaction (or the savepoint they were raised in) rolls back. A batch
+    opened inside the transaction holds them instead, and hands them over
+    to such a callback when it closes (events of a savepoint rolled back
+    inside it are still sent: bulk_index_documents checks them against
+    the database).
+    """
+    batches = _get_batches()
+    in_atomic = transaction.get_connection().in_atomic_block
+    if batches and (batches[-1].in_atomic or not in_atomic):
+        batches[-1].events.update(events)
+    elif in_atomic:
+        transaction.on_commit(partial(_record_events, events))
+    else:
+        _record_events(events)
+
+
+def _record_events(events):
+    """Add committed events to the open batch, or flush them straight away."""
+    batches = _get_batches()
+    if batches:
+        batches[-1].events.update(events)
+    else:
+        flush_events(events)
+
+
+def begin_batch(**kwargs):
+    """Start collecting indexing events until the matching end_batch()."""
+    _get_batches().append(_Batch(transaction.get_connection().in_atomic_block))
+
+
+def end_batch(**kwargs):
+    """Close a batch, handing its events over to the enclosing batch or transaction, or flushing them."""
+    batches = _get_batches()
+    if not batches:
+        return
+    batch = batches.pop()
+    if batch.events:
+        _queue_events(batch.events)
+
+
+@contextmanager
+def indexing_batch():
+    """Context manager coalescing all indexing events raised inside it."""
+    begin_batch()
+    try:
+        yield
+    finally:
+        end_batch()
+
+
+def flush_events(events):
+    """
+    Hand indexing events over to a background worker.
+
+    Args:
+        events: dict mapping document ids to INDEX or DELETE
+    """
+    index_ids = [doc_id for doc_id, action in events.items() if action == INDEX]
+    delete_ids = [doc_id for doc_id, action in events.items() if action == DELETE]
+
+    try:
+        from config.celery import app
+        app.send_task('index_documents', args=[index_ids, delete_ids])
+    except Exception as e:
+        print(f"Error queuing indexing task: {str(e)}")
+        # Fallback: index in a background thread so the request is not blocked
+        thread = threading.Thread(
+            target=bulk_index_documents,
+            args=(index_ids, delete_ids),
+            daemon=True,
+        )
+        thread.start()
+
+
+def bulk_index_documents(index_ids, delete_ids=None):
+    """
+    Index and delete documents in Elasticsearch using the bulk API.
+    
+    The database is the source of truth: ids queued for indexing that no
+    longer exist are removed, and ids queued for deletion that still exist
+    (e.g. the delete was rolled back) are reindexed instead.
+
+    The index is then refreshed and the 'documents' generation bumped:
+    searches cached before the changes were searchable are dropped.
+
+    Args:
+        index_ids: IDs of documents to (re)index
+        delete_ids: IDs of documents to remove from the index
+
+    Returns:
+        dict with the number of indexed and deleted documents
+    """
+    from apps.documents.models import Document
+    from apps.search.documents import DocumentDocument
+
+    chunk_size = getattr(settings, 'ELASTICSEARCH_INDEX_CHUNK_SIZE', 500)
+    doc = DocumentDocument()
+    indexed = 0
+    deleted = 0
+
+    requested_ids = sorted(set(index_ids or []) | set(delete_ids or []))
+    missing_ids = []
+
+    for start in range(0, len(requested_ids), chunk_size):
+        chunk = requested_ids[start:start + chunk_size]
+        existing_ids = set(
+            Document.objects.filter(id__in=chunk).values_list('id', flat=True)
+        )
+        missing_ids.extend(doc_id for doc_id in chunk if doc_id not in existing_ids)
+
+        if existing_ids:
+            queryset = doc.get_queryset().filter(id__in=existing_ids)
+            success, _ = doc.update(queryset, refresh=False)
+            indexed += success
+
+    if missing_ids:
+        actions = (
+            {'_op_type': DELETE, '_index': doc._index._name, '_id': doc_id}
+            for doc_id in missing_ids
+        )
+        doc.bulk(actions, raise_on_error=False, refresh=False)
+        deleted = len(missing_ids)
+
+    if requested_ids:
+        doc._index.refresh()
+        bump_generation('documents')
+
+    return {"indexed": indexed, "deleted": deleted}
@@ -2,10 +2,13 @@
 Management command to rebuild the Elasticsearch index.
 """
 
+from django.apps import apps
 from django.core.management.base import BaseCommand
 from django.conf import settings
 from django_elasticsearch_dsl.registries import registry
 
+from apps.search.reindex import IndexRebuilder
+
 
 class Command(BaseCommand):
     """Rebuild all Elasticsearch indices."""
@@ -24,7 +27,27 @@ class Command(BaseCommand):
         parser.add_argument(
             '--recreate',
             action='store_true',
-            help='Recreate the indices from scratch'
+            help='Recreate the indices from scratch, ignoring any interrupted rebuild'
+        )
+        
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Number of parallel indexing workers'
+        )
+        
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of documents per bulk request'
+        )
+        
+        parser.add_argument(
+            '--keep-old',
+            action='store_true',
+            help='Keep the previous index after swapping the alias'
         )
     
     def handle(self, *args, **options):
@@ -40,23 +63,26 @@ class Command(BaseCommand):
         recreate = options.get('recreate')
         
         try:
-            # If specific models are provided
+            # If specific models are provided, update their documents in place
             if models:
                 for model_name in models:
                     app_label, model_name = model_name.split('.')
                     self.stdout.write(f'Rebuilding index for {app_label}.{model_name}')
-                    registry.update(app_label, model_name)
+                    model = apps.get_model(app_label, model_name)
+                    for doc_class in registry.get_documents([model]):
+                        doc = doc_class()
+                        doc.update(doc.get_indexing_queryset(), parallel=True)
                     self.stdout.write(self.style.SUCCESS(f'Successfully rebuilt index for {app_label}.{model_name}'))
             else:
-                # Otherwise, rebuild all indices
-                if recreate:
-                    self.stdout.write('Recreating indices from scratch...')
-                    registry.delete_all()
-                    self.stdout.write('All indices deleted')
-                
-                self.stdout.write('Rebuilding indices...')
-                registry.rebuild()
-                self.stdout.write(self.style.SUCCESS('Successfully rebuilt all indices'))
+                # Otherwise, build a new index and swap the alias to it.
+                # Searches keep using the current index until the swap.
+                rebuilder = IndexRebuilder(
+                    workers=options['workers'],
+                    batch_size=options['batch_size'],
+                    stdout=self.stdout
+                )
+                index_name = rebuilder.rebuild(resume=not recreate, keep_old=options['keep_old'])
+                self.stdout.write(self.style.SUCCESS(f'Successfully rebuilt all indices into {index_name}'))
         
         except Exception as e:
             self.stderr.write(self.style.ERROR(f'Error rebuilding indices: {str(e)}'))
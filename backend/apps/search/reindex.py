@@ -0,0 +1,269 @@
+"""Zero-downtime, parallel rebuild of the documents search index.
+
+The documents are bulk indexed into a new versioned index by parallel
+workers, each handling an id range. The ``documents`` alias is then swapped
+to the new index in a single atomic call, so searches keep hitting the
+previous index for the whole rebuild.
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from elasticsearch.helpers import bulk, scan
+from elasticsearch_dsl.connections import connections
+
+from apps.documents.models import Document
+from apps.search.documents import DocumentDocument
+
+
+def get_state_file():
+    """Return the path of the file recording the progress of a rebuild."""
+    return getattr(
+        settings, 'ELASTICSEARCH_REINDEX_STATE_FILE',
+        os.path.join(settings.BASE_DIR, '.reindex_state.json')
+    )
+
+
+def load_state(state_file):
+    """Load the state of an interrupted rebuild, if any."""
+    if not os.path.exists(state_file):
+        return None
+    with open(state_file) as f:
+        return json.load(f)
+
+
+def save_state(state_file, state):
+    """Atomically persist the rebuild state."""
+    tmp_file = f"{state_file}.tmp"
+    with open(tmp_file, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_file, state_file)
+
+
+def get_partitions(partition_count):
+    """
+    Split the document id space into contiguous [start, end) ranges.
+
+    Args:
+        partition_count: Number of ranges to create
+
+    Returns:
+        List of [start, end) pairs covering every existing document id
+    """
+    bounds = Document.objects.aggregate(min_id=Min('id'), max_id=Max('id'))
+    if bounds['min_id'] is None:
+        return []
+
+    min_id, max_id = bounds['min_id'], bounds['max_id'] + 1
+    step = max((max_id - min_id) // partition_count + 1, 1)
+    return [
+        [start, min(start + step, max_id)]
+        for start in range(min_id, max_id, step)
+    ]
+
+
+class IndexRebuilder:
+    """Rebuild the documents index into a new index and swap the alias."""
+
+    def __init__(self, workers=4, batch_size=500, state_file=None, stdout=None):
+        self.doc = DocumentDocument()
+        self.alias = DocumentDocument._index._name
+        self.client = connections.get_connection()
+        self.workers = workers
+        self.batch_size = batch_size
+        self.state_file = state_file or get_state_file()
+        self.stdout = stdout
+        self._lock = threading.Lock()
+        self._indexed = 0
+        self._started = None
+
+    def log(self, message):
+        """Write a progress message."""
+        if self.stdout:
+            self.stdout.write(message)
+
+    def rebuild(self, resume=True, keep_old=False):
+        """
+        Build a fresh index, swap the alias to it and drop the old indices.
+
+        Args:
+            resume: Continue an interrupted rebuild recorded in the state file
+            keep_old: Keep the previous indices instead of deleting them
+
+        Returns:
+            Name of the new index
+        """
+        state = load_state(self.state_file) if resume else None
+        if state and self.client.indices.exists(index=state['index']):
+            self.log(f"Resuming rebuild of {state['index']} "
+                     f"({len(state['completed'])}/{len(state['partitions'])} partitions done)")
+        else:
+            state = self._start()
+
+        self._index_partitions(state)
+        self._finish_index(state['index'])
+        old_indices = self.swap_alias(state['index'])
+        self.catch_up(parse_datetime(state['started_at']))
+
+        if not keep_old:
+            for index in old_indices:
+                self.client.indices.delete(index=index, ignore=[404])
+                self.log(f"Deleted old index {index}")
+
+        if os.path.exists(self.state_file):
+            os.remove(self.state_file)
+        return state['index']
+
+    def _start(self):
+        """Create the new versioned index and record the partitions to build."""
+        index_name = f"{self.alias}_{timezone.now().strftime('%Y%m%d%H%M%S')}"
+        index = DocumentDocument._index.clone(name=index_name)
+        index.create()
+
+        # No refreshes or replicas while bulk loading
+        self.client.indices.put_settings(
+            index=index_name,
+            body={'index': {'refresh_interval': '-1', 'number_of_replicas': 0}}
+        )
+
+        state = {
+            'index': index_name,
+            'started_at': timezone.now().isoformat(),
+            'partitions': get_partitions(self.workers * 4),
+            'completed': [],
+        }
+        save_state(self.state_file, state)
+        self.log(f"Created index {index_name} ({len(state['partitions'])} partitions)")
+        return state
+
+    def _index_partitions(self, state):
+        """Bulk index every pending partition with a pool of workers."""
+        pending = [p for p in state['partitions'] if p not in state['completed']]
+        self._indexed = 0
+        self._started = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {
+                executor.submit(self._index_partition, state['index'], start, end): [start, end]
+                for start, end in pending
+            }
+            for future in as_completed(futures):
+                future.result()
+                with self._lock:
+                    state['completed'].append(futures[future])
+                    save_state(self.state_file, state)
+                    elapsed = max(time.monotonic() - self._started, 1e-6)
+                    self.log(
+                        f"Partition {futures[future]} done: {self._indexed} documents, "
+                        f"{self._indexed / elapsed:.0f} docs/sec"
+                    )
+
+    def _index_partition(self, index_name, start, end):
+        """Index the documents whose id is in [start, end)."""
+        try:
+            queryset = self.doc.get_queryset().filter(id__gte=start, id__lt=end).order_by('id')
+            success, _ = bulk(
+                self.client,
+                self._actions(queryset.iterator(chunk_size=self.batch_size), index_name),
+                chunk_size=self.batch_size,
+                refresh=False,
+            )
+            with self._lock:
+                self._indexed += success
+        finally:
+            # Worker threads own their database connection
+            connection.close()
+
+    def _actions(self, documents, index_name):
+        """Generate bulk actions targeting the new index."""
+        for action in self.doc.get_actions(documents, 'index'):
+            action['_index'] = index_name
+            yield action
+
+    def _finish_index(self, index_name):
+        """Restore the regular index settings once bulk loading is done."""
+        replicas = DocumentDocument._index._settings.get('number_of_replicas', 1)
+        self.client.indices.put_settings(
+            index=index_name,
+            body={'index': {'refresh_interval': None, 'number_of_replicas': replicas}}
+        )
+        self.client.indices.refresh(index=index_name)
+
+    def swap_alias(self, index_name):
+        """
+        Atomically point the alias at the new index.
+
+        Returns:
+            List of the indices the alias pointed to before the swap
+        """
+        actions = [{'add': {'index': index_name, 'alias': self.alias}}]
+        old_indices = []
+
+        if self.client.indices.exists_alias(name=self.alias):
+            old_indices = [
+                index for index in self.client.indices.get_alias(name=self.alias)
+                if index != index_name
+            ]
+            actions = [
+                {'remove': {'index': index, 'alias': self.alias}} for index in old_indices
+            ] + actions
+        elif self.client.indices.exists(index=self.alias):
+            # Legacy concrete index named like the alias: replace it in the same call
+            actions.append({'remove_index': {'index': self.alias}})
+
+        self.client.indices.update_aliases(body={'actions': actions})
+        self.log(f"Alias {self.alias} now points to {index_name}")
+        return old_indices
+
+    def catch_up(self, started_at):
+        """
+        Apply the changes made while the rebuild was running.
+
+        Live updates went to the previous index through the alias, so
+        documents whose fields, tags or OCR text changed since the rebuild
+        started are reindexed, and documents deleted in the meantime are
+        removed.
+        """
+        since = started_at - timedelta(minutes=1)
+        changed = self.doc.get_queryset().filter(
+            Q(updated_at__gte=since) | Q(tags_changed_at__gte=since) | Q(ocr_data__updated_at__gte=since)
+        )
+        success, _ = self.doc.update(changed.iterator(chunk_size=self.batch_size), refresh=False)
+
+        # The indexed ids are checked against the database chunk by chunk
+        deleted = 0
+        chunk = []
+        for hit in scan(self.client, index=self.alias, _source=False, size=self.batch_size):
+            chunk.append(int(hit['_id']))
+            if len(chunk) >= self.batch_size:
+                deleted += self._delete_missing(chunk)
+                chunk = []
+        if chunk:
+            deleted += self._delete_missing(chunk)
+        self.log(f"Caught up {success} updated and {deleted} deleted documents")
+
+    def _delete_missing(self, indexed_ids):
+        """
+        Remove from the index the documents of a chunk of ids that no longer exist.
+
+        Returns:
+            Number of documents removed
+        """
+        existing = set(Document.objects.filter(id__in=indexed_ids).values_list('id', flat=True))
+        deleted_ids = [doc_id for doc_id in indexed_ids if doc_id not in existing]
+        if deleted_ids:
+            bulk(
+                self.client,
+                ({'_op_type': 'delete', '_index': self.alias, '_id': doc_id} for doc_id in deleted_ids),
+                raise_on_error=False,
+            )
+        return len(deleted_ids)
@@ -0,0 +1,79 @@
+"""Signal processor queueing Elasticsearch updates instead of indexing inline."""
+
+from celery.signals import task_prerun, task_postrun
+from django.core.signals import request_started, request_finished
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+from django_elasticsearch_dsl.signals import BaseSignalProcessor
+
+from apps.documents.models import Document, DocumentOCR, Tag
+from apps.search import indexing
+
+
+class QueuedSignalProcessor(BaseSignalProcessor):
+    """
+    Record changed documents and index them in bulk off the request path.
+
+    Events are coalesced per document id for the duration of a request or a
+    Celery task and flushed once as a single ``index_documents`` task.
+    """
+
+    def setup(self):
+        post_save.connect(self.handle_save)
+        post_delete.connect(self.handle_delete)
+        pre_delete.connect(self.handle_pre_delete)
+        m2m_changed.connect(self.handle_m2m_changed, sender=Document.tags.through)
+
+        # Batch every event raised while serving a request or running a task
+        request_started.connect(indexing.begin_batch)
+        request_finished.connect(indexing.end_batch)
+        task_prerun.connect(indexing.begin_batch)
+        task_postrun.connect(indexing.end_batch)
+
+    def teardown(self):
+        post_save.disconnect(self.handle_save)
+        post_delete.disconnect(self.handle_delete)
+        pre_delete.disconnect(self.handle_pre_delete)
+        m2m_changed.disconnect(self.handle_m2m_changed, sender=Document.tags.through)
+
+        request_started.disconnect(indexing.begin_batch)
+        request_finished.disconnect(indexing.end_batch)
+        task_prerun.disconnect(indexing.begin_batch)
+        task_postrun.disconnect(indexing.end_batch)
+
+    def handle_save(self, sender, instance, **kwargs):
+        """Queue the document(s) affected by a saved instance."""
+        if sender is Document:
+            indexing.queue_document(instance.pk)
+        elif sender is DocumentOCR:
+            indexing.queue_document(instance.document_id)
+        elif sender is Tag:
+            indexing.queue_documents(
+                instance.documents.values_list('id', flat=True)
+            )
+
+    def handle_pre_delete(self, sender, instance, **kwargs):
+        """Remember the documents of a tag before the relation disappears."""
+        if sender is Tag:
+            instance._indexed_document_ids = list(
+                instance.documents.values_list('id', flat=True)
+            )
+
+    def handle_delete(self, sender, instance, **kwargs):
+        """Queue the removal or reindexing of the affected document(s)."""
+        if sender is Document:
+            indexing.queue_document(instance.pk, indexing.DELETE)
+        elif sender is DocumentOCR:
+            indexing.queue_document(instance.document_id)
+        elif sender is Tag:
+            indexing.queue_documents(getattr(instance, '_indexed_document_ids', []))
+
+    def handle_m2m_changed(self, sender, instance, action, reverse=False, pk_set=None, **kwargs):
+        """Queue documents whose tags were added, removed or cleared."""
+        if action not in ('post_add', 'post_remove', 'post_clear'):
+            return
+
+        if not reverse:
+            indexing.queue_document(instance.pk)
+        elif pk_set:
+            # tag.documents.add(...) style change: pk_set holds document ids
+            indexing.queue_documents(pk_set)
@@ -0,0 +1,11 @@
+"""Celery tasks for the search app."""
+
+from celery import shared_task
+
+from apps.search.indexing import bulk_index_documents
+
+
+@shared_task(name="index_documents")
+def index_documents(index_ids, delete_ids=None):
+    """Celery task to bulk index and delete documents in Elasticsearch."""
+    return bulk_index_documents(index_ids, delete_ids)
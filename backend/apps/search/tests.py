@@ -0,0 +1,604 @@
+"""Tests for search functionality."""
+
+from unittest.mock import patch
+from django.test import override_settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.contrib.auth import get_user_model
+
+from apps.documents.models import Document, Tag
+from apps.search import indexing
+from config.query_budget import QueryBudgetTestMixin
+from config.testing import TemporaryMediaTestCase
+
+User = get_user_model()
+
+
+@override_settings(ELASTICSEARCH_DSL_AUTOSYNC=True)
+class QueuedIndexingTestCase(TemporaryMediaTestCase):
+    """Test cases for the queued Elasticsearch indexer."""
+    
+    def setUp(self):
+        """Set up test environment."""
+        # Events left over by other tests on this thread
+        indexing._state.__dict__.clear()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword'
+        )
+    
+    def create_document(self, title):
+        """Create a document without triggering OCR."""
+        return Document.objects.create(
+            title=title,
+            file=SimpleUploadedFile('doc.pdf', b'%PDF-1.4', content_type='application/pdf'),
+            uploaded_by=self.user,
+            is_ocr_processed=True
+        )
+    
+    @patch('config.celery.app.send_task')
+    def test_events_are_coalesced_per_batch(self, mock_send_task):
+        """Test that repeated saves in a batch are flushed as a single task."""
+        with self.captureOnCommitCallbacks(execute=True), indexing.indexing_batch():
+            document = self.create_document('Invoice 1')
+            document.title = 'Invoice 1 (updated)'
+            document.save()
+            tag = Tag.objects.create(name='invoices')
+            document.tags.add(tag)
+            other = self.create_document('Invoice 2')
+            other_id = other.id
+            other.delete()
+            mock_send_task.assert_not_called()
+        
+        mock_send_task.assert_called_once_with(
+            'index_documents', args=[[document.id], [other_id]]
+        )
+    
+    @patch('config.celery.app.send_task')
+    def test_rolled_back_events_are_discarded(self, mock_send_task):
+        """Test that the events of a rolled back transaction are not sent with the next flush."""
+        from django.db import transaction
+        
+        document = self.create_document('Contract')
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    Document.objects.filter(id=document.id).delete()
+                    indexing.queue_document(document.id, indexing.DELETE)
+                    raise RuntimeError('rolled back')
+            except RuntimeError:
+                pass
+            other = self.create_document('Invoice')
+        
+        mock_send_task.assert_called_once_with('index_documents', args=[[other.id], []])
+    
+    @patch('config.celery.app.send_task')
+    def test_flush_waits_for_transaction_commit(self, mock_send_task):
+        """Test that events inside a transaction are flushed on commit."""
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            document = self.create_document('Contract')
+            mock_send_task.assert_not_called()
+        
+        self.assertTrue(callbacks)
+        mock_send_task.assert_called_once_with('index_documents', args=[[document.id], []])
+
+    
+    @patch('apps.search.documents.DocumentDocument.bulk')
+    @patch('apps.search.documents.DocumentDocument.update', return_value=(1, []))
+    def test_indexing_invalidates_cached_searches(self, mock_update, mock_bulk):
+        """Test that cached searches are dropped once the changes are searchable."""
+        from apps.documents.utils.cache_utils import get_generation
+        from apps.search.documents import DocumentDocument
+        
+        document = self.create_document('Invoice 1')
+        generation = get_generation('documents')
+        with patch.object(DocumentDocument._index, 'refresh') as mock_refresh:
+            # Searches cached until the refresh may hold the previous hits
+            mock_refresh.side_effect = lambda *args, **kwargs: self.assertEqual(
+                get_generation('documents'), generation
+            )
+            result = indexing.bulk_index_documents([document.id], [document.id + 1])
+        
+        self.assertEqual(result, {"indexed": 1, "deleted": 1})
+        mock_refresh.assert_called_once()
+        self.assertNotEqual(get_generation('documents'), generation)
+
+class SourceSerializationTestCase(TemporaryMediaTestCase):
+    """Test cases for rendering search results from the Elasticsearch _source."""
+    
+    def test_serialize_hit_matches_list_serializer(self):
+        """Test that _source rendering is identical to DocumentListSerializer."""
+        import json
+        from datetime import date
+        from elasticsearch.serializer import JSONSerializer
+        from apps.documents.serializers.document_serializers import DocumentListSerializer
+        from apps.search.documents import DocumentDocument
+        from apps.search.elasticsearch_utils import serialize_hit
+        
+        user = User.objects.create_user(username='archivist', password='testpassword')
+        document = Document.objects.create(
+            title='Bill of lading',
+            document_type='bill_of_lading',
+            reference_number='BL-42',
+            date=date(2025, 6, 21),
+            file=SimpleUploadedFile('bl.pdf', b'%PDF-1.4', content_type='application/pdf'),
+            uploaded_by=user,
+            is_ocr_processed=True
+        )
+        document.tags.set([Tag.objects.create(name='shipping'), Tag.objects.create(name='2025')])
+        document = DocumentDocument().get_queryset().get(pk=document.pk)
+        
+        # Round-trip through the Elasticsearch JSON serializer like indexing does
+        source = json.loads(JSONSerializer().dumps(DocumentDocument().prepare(document)))
+        expected = json.loads(json.dumps(DocumentListSerializer(document).data))
+        
+        self.assertEqual(serialize_hit(source), expected)
+
+
+class FakeSearch:
+    """Minimal stand-in for an elasticsearch_dsl Search over sorted ids."""
+    
+    def __init__(self, ids, params=None, calls=None):
+        self.ids = ids
+        self.params = params or {}
+        self.calls = calls if calls is not None else []
+    
+    def _clone(self, **params):
+        return FakeSearch(self.ids, {**self.params, **params}, self.calls)
+    
+    def extra(self, **kwargs):
+        return self._clone(**kwargs)
+    
+    def source(self, fields):
+        return self._clone(_source=fields)
+    
+    def __getitem__(self, item):
+        return self._clone(from_=item.start, size=item.stop - item.start)
+    
+    def execute(self):
+        self.calls.append(self.params)
+        start = self.params.get('from_', 0)
+        if 'search_after' in self.params:
+            start = self.ids.index(self.params['search_after'][0]) + 1
+        hits = [
+            {'_id': str(doc_id), '_source': {'id': doc_id}, 'sort': [doc_id]}
+            for doc_id in self.ids[start:start + self.params.get('size', 10)]
+        ]
+        response = type('Response', (), {})()
+        response.to_dict = lambda: {'hits': {'hits': hits, 'total': {'value': len(self.ids)}}}
+        return response
+
+
+@override_settings(ELASTICSEARCH_MAX_RESULT_WINDOW=20)
+class SearchPaginationTestCase(TemporaryMediaTestCase):
+    """Test cases for Elasticsearch-native pagination."""
+    
+    def paginate(self, search, url):
+        from rest_framework.request import Request
+        from rest_framework.test import APIRequestFactory
+        from apps.search.views import DocumentSearchPagination
+        
+        paginator = DocumentSearchPagination()
+        request = Request(APIRequestFactory().get(url))
+        hits = paginator.paginate_search(search, request)
+        return [hit['_source']['id'] for hit in hits], paginator.get_paginated_response([]).data
+    
+    def test_shallow_page_uses_from_size(self):
+        """Test that shallow pages are fetched with from/size and an exact count."""
+        search = FakeSearch(list(range(1, 36)))
+        ids, data = self.paginate(search, '/api/search/advanced/?page=2&page_size=5')
+        
+        self.assertEqual(ids, [6, 7, 8, 9, 10])
+        self.assertEqual(data['count'], 35)
+        self.assertEqual(search.calls, [{'track_total_hits': True, 'from_': 5, 'size': 5}])
+        self.assertNotIn('search_after', data['next'])
+    
+    def test_deep_page_uses_search_after(self):
+        """Test that pages past the result window are fetched with search_after."""
+        search = FakeSearch(list(range(1, 36)))
+        ids, data = self.paginate(search, '/api/search/advanced/?page=5&page_size=5')
+        self.assertEqual(ids, [21, 22, 23, 24, 25])
+        self.assertEqual(search.calls[-1]['search_after'], [20])
+        
+        # The next link carries a cursor so the following page needs no seek
+        search.calls.clear()
+        ids, data = self.paginate(search, data['next'])
+        self.assertEqual(ids, [26, 27, 28, 29, 30])
+        self.assertEqual(len(search.calls), 1)
+        self.assertEqual(data['count'], 35)
+
+
+class ReindexPartitionTestCase(TemporaryMediaTestCase):
+    """Test cases for the parallel index rebuild."""
+    
+    def test_partitions_cover_every_document(self):
+        """Test that the id range partitions cover each document exactly once."""
+        from apps.search.reindex import get_partitions
+        
+        user = User.objects.create_user(username='indexer', password='testpassword')
+        ids = [
+            Document.objects.create(
+                title=f'Document {i}',
+                file=SimpleUploadedFile('doc.pdf', b'%PDF-1.4', content_type='application/pdf'),
+                uploaded_by=user,
+                is_ocr_processed=True
+            ).id
+            for i in range(7)
+        ]
+        
+        partitions = get_partitions(3)
+        covered = [doc_id for doc_id in ids for start, end in partitions if start <= doc_id < end]
+        
+        self.assertLessEqual(len(partitions), 3)
+        self.assertEqual(covered, ids)
+        # Partitions are deterministic so an interrupted rebuild can resume
+        self.assertEqual(partitions, get_partitions(3))
+    
+    @patch('config.celery.app.send_task')
+    def test_catch_up_applies_changes_made_during_the_rebuild(self, mock_send_task):
+        """Test that tag, OCR and field changes and deletions made during a rebuild are applied."""
+        from datetime import timedelta
+        from django.utils import timezone
+        from apps.documents.models import DocumentOCR
+        from apps.search.reindex import IndexRebuilder
+        
+        user = User.objects.create_user(username='indexer', password='testpassword')
+        untouched, retagged, reprocessed, edited, deleted = [
+            Document.objects.create(
+                title=f'Document {i}',
+                file=SimpleUploadedFile('doc.pdf', b'%PDF-1.4', content_type='application/pdf'),
+                uploaded_by=user,
+                is_ocr_processed=True
+            )
+            for i in range(5)
+        ]
+        DocumentOCR.objects.create(document=reprocessed, full_text='first pass')
+        started_at = timezone.now()
+        long_ago = started_at - timedelta(hours=1)
+        Document.objects.update(updated_at=long_ago)
+        DocumentOCR.objects.update(updated_at=long_ago)
+        
+        retagged.tags.add(Tag.objects.create(name='urgent'))
+        ocr = DocumentOCR.objects.get(document=reprocessed)
+        ocr.full_text = 'second pass'
+        ocr.save()
+        edited.title = 'Edited'
+        edited.save()
+        deleted_id = deleted.id
+        deleted.delete()
+        
+        reindexed, deletes = [], []
+        
+        def update(documents, **kwargs):
+            reindexed.extend(document.id for document in documents)
+            return len(reindexed), []
+        
+        def bulk(client, actions, **kwargs):
+            deletes.append([action['_id'] for action in actions])
+        
+        hits = [{'_id': str(doc_id)} for doc_id in (untouched.id, retagged.id, reprocessed.id, edited.id, deleted_id)]
+        with patch('apps.search.reindex.connections.get_connection'), \
+                patch('apps.search.reindex.scan', return_value=iter(hits)), \
+                patch('apps.search.reindex.bulk', side_effect=bulk), \
+                patch('apps.search.documents.DocumentDocument.update', side_effect=update):
+            IndexRebuilder(batch_size=2).catch_up(started_at)
+        
+        self.assertEqual(sorted(reindexed), [retagged.id, reprocessed.id, edited.id])
+        self.assertEqual(deletes, [[deleted_id]])
+
+
+class OCRChunkIndexingTestCase(TemporaryMediaTestCase):
+    """Test cases for indexing the full OCR text in chunks."""
+    
+    @override_settings(ELASTICSEARCH_OCR_CHUNK_SIZE=20)
+    def test_prepare_ocr_chunks(self):
+        """Test that OCR text is indexed as page-numbered, size-bounded chunks."""
+        from apps.documents.models import DocumentOCR
+        from apps.search.documents import DocumentDocument
+        
+        user = User.objects.create_user(username='scanner', password='testpassword')
+        document = Document.objects.create(
+            title='Long contract',
+            file=SimpleUploadedFile('contract.pdf', b'%PDF-1.4', content_type='application/pdf'),
+            uploaded_by=user,
+            is_ocr_processed=True
+        )
+        DocumentOCR.objects.create(
+            document=document,
+            full_text="\n--- Page 1 ---\nshort\n--- Page 2 ---\nthe penalty clause applies after ninety days"
+        )
+        document = DocumentDocument().get_queryset().get(pk=document.pk)
+        chunks = DocumentDocument().prepare_ocr_chunks(document)
+        
+        self.assertEqual(chunks[0], {'page': 1, 'chunk': 0, 'text': 'short'})
+        self.assertTrue(all(chunk['page'] == 2 for chunk in chunks[1:]))
+        self.assertTrue(all(len(chunk['text']) <= 20 for chunk in chunks))
+        self.assertEqual(
+            ' '.join(chunk['text'] for chunk in chunks[1:]),
+            'the penalty clause applies after ninety days'
+        )
+    
+    def test_get_matching_pages(self):
+        """Test reading matching page numbers from nested inner hits."""
+        from apps.search.elasticsearch_utils import get_matching_pages
+        
+        hit = {'inner_hits': {'text_pages': {'hits': {'hits': [
+            {'fields': {'ocr_chunks.page': [7]}},
+            {'fields': {'ocr_chunks.page': [3]}},
+            {'fields': {'ocr_chunks.page': [7]}},
+        ]}}}}
+        self.assertEqual(get_matching_pages(hit), [3, 7])
+
+
+class FacetCountsTestCase(TemporaryMediaTestCase):
+    """Test cases for faceted search counts."""
+    
+    def setUp(self):
+        """Set up test environment."""
+        from datetime import date
+        from apps.documents.models import Department, Folder
+        
+        self.user = User.objects.create_user(username='clerk', password='testpassword')
+        self.finance = Department.objects.create(name='Finance', code='FIN')
+        self.commercial = Department.objects.create(name='Commercial', code='COM')
+        self.invoices = Folder.objects.create(name='Invoices', department=self.finance)
+        
+        for title, department, folder, doc_type, day in [
+            ('Invoice 1', self.finance, self.invoices, 'invoice', date(2025, 6, 1)),
+            ('Invoice 2', self.finance, self.invoices, 'invoice', date(2025, 6, 20)),
+            ('Contract', self.commercial, None, 'contract', date(2025, 7, 3)),
+            ('Undated', None, None, 'other', None),
+        ]:
+            Document.objects.create(
+                title=title, department=department, folder=folder, document_type=doc_type,
+                date=day, uploaded_by=self.user, is_ocr_processed=True,
+                file=SimpleUploadedFile('doc.pdf', b'%PDF-1.4', content_type='application/pdf'),
+            )
+    
+    def test_facet_counts_single_query(self):
+        """Test that every facet is computed from one grouped query."""
+        from apps.search.utils import facet_counts
+        
+        with self.assertNumQueries(3):  # grouped counts + department and folder names
+            facets = facet_counts(Document.objects.all())
+        
+        self.assertEqual(facets['department'], [
+            {'id': self.finance.id, 'name': 'Finance', 'count': 2},
+            {'id': self.commercial.id, 'name': 'Commercial', 'count': 1},
+        ])
+        self.assertEqual(facets['folder'], [{'id': self.invoices.id, 'name': 'Invoices', 'count': 2}])
+        self.assertEqual(facets['document_type'][0], {'value': 'invoice', 'count': 2})
+        self.assertEqual(facets['is_ocr_processed'], [{'value': True, 'count': 4}])
+        self.assertEqual(facets['date'], [{'value': '2025-06', 'count': 2}, {'value': '2025-07', 'count': 1}])
+    
+    def test_facet_counts_respect_filters(self):
+        """Test that facets are computed over the filtered documents only."""
+        from django.http import QueryDict
+        from apps.search.utils import advanced_search, facet_counts
+        
+        facets = facet_counts(advanced_search(QueryDict('document_type=contract'), self.user))
+        self.assertEqual(facets['department'], [{'id': self.commercial.id, 'name': 'Commercial', 'count': 1}])
+        self.assertEqual(facets['document_type'], [{'value': 'contract', 'count': 1}])
+    
+    def test_parse_facet_aggregations(self):
+        """Test that Elasticsearch aggregations use the same facet format."""
+        from apps.search.elasticsearch_utils import parse_facet_aggregations
+        
+        aggregations = {
+            'department': {'buckets': [{'key': self.finance.id, 'doc_count': 2}]},
+            'folder': {'buckets': [{'key': self.invoices.id, 'doc_count': 2}]},
+            'document_type': {'buckets': [{'key': 'invoice', 'doc_count': 2}]},
+            'is_ocr_processed': {'buckets': [{'key': 1, 'key_as_string': 'true', 'doc_count': 2}]},
+            'date': {'buckets': [{'key': 1748736000000, 'key_as_string': '2025-06', 'doc_count': 2}]},
+        }
+        facets = parse_facet_aggregations(aggregations)
+        
+        self.assertEqual(facets['department'], [{'id': self.finance.id, 'name': 'Finance', 'count': 2}])
+        self.assertEqual(facets['is_ocr_processed'], [{'value': True, 'count': 2}])
+        self.assertEqual(facets['date'], [{'value': '2025-06', 'count': 2}])
+
+
+class SearchCacheTestCase(TemporaryMediaTestCase):
+    """Test cases for the search result cache."""
+    
+    def setUp(self):
+        """Set up test environment."""
+        from rest_framework.test import APIClient
+        from apps.search.cache import search_cache
+        
+        search_cache.clear()
+        self.user = User.objects.create_user(username='clerk', password='testpassword')
+        self.other = User.objects.create_user(username='other', password='testpassword')
+        self.document = Document.objects.create(
+            title='Invoice 1', uploaded_by=self.user, is_ocr_processed=True,
+            file=SimpleUploadedFile('doc.pdf', b'%PDF-1.4', content_type='application/pdf'),
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+    
+    def test_equivalent_queries_share_a_key(self):
+        """Test that parameter order, blanks and cache busters are ignored."""
+        from django.http import QueryDict
+        from apps.search.cache import normalize_query_params
+        
+        self.assertEqual(
+            normalize_query_params(QueryDict('q=invoice&document_type=&page=1&_t=123')),
+            normalize_query_params(QueryDict('page=1&q= invoice')),
+        )
+    
+    def test_repeated_search_is_cached(self):
+        """Test that a repeated search does not hit the database."""
+        url = '/api/search/advanced/?q=Invoice'
+        first = self.client.get(url)
+        self.assertEqual(first.data['count'], 1)
+        
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+        self.assertEqual(second.data, first.data)
+    
+    def test_cache_is_scoped_per_user(self):
+        """Test that users never see results cached for another scope."""
+        url = '/api/search/advanced/?q=Invoice'
+        self.client.get(url)
+        
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.client.get(url).data['count'], 0)
+    
+    def test_document_changes_invalidate_cache(self):
+        """Test that saving a document drops the cached results."""
+        url = '/api/search/advanced/?q=Invoice'
+        self.client.get(url)
+        
+        self.document.title = 'Receipt'
+        self.document.save()
+        self.assertEqual(self.client.get(url).data['count'], 0)
+
+
+class CircuitBreakerTestCase(TemporaryMediaTestCase):
+    """Test cases for the Elasticsearch circuit breaker."""
+    
+    def setUp(self):
+        """Set up test environment."""
+        from apps.search.circuit_breaker import CircuitBreaker, is_elasticsearch_unavailable
+        
+        self.breaker = CircuitBreaker(
+            'test', failure_threshold=2, recovery_timeout=30, is_failure=is_elasticsearch_unavailable
+        )
+    
+    def fail(self):
+        """Simulate an unreachable cluster."""
+        from elasticsearch.exceptions import ConnectionError
+        raise ConnectionError('N/A', 'Connection refused')
+    
+    def trip(self):
+        """Open the circuit."""
+        for _ in range(2):
+            with self.assertRaises(Exception):
+                self.breaker.call(self.fail)
+    
+    def test_opens_after_consecutive_failures(self):
+        """Test that the circuit opens and then rejects calls without running them."""
+        from apps.search.circuit_breaker import OPEN, CircuitOpenError
+        
+        self.trip()
+        self.assertEqual(self.breaker.state, OPEN)
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.call(self.fail)
+    
+    def test_query_errors_do_not_trip(self):
+        """Test that errors caused by the request itself are not counted."""
+        from elasticsearch.exceptions import RequestError
+        from apps.search.circuit_breaker import CLOSED
+        
+        def bad_query():
+            raise RequestError(400, 'parsing_exception')
+        
+        for _ in range(3):
+            with self.assertRaises(RequestError):
+                self.breaker.call(bad_query)
+        self.assertEqual(self.breaker.state, CLOSED)
+    
+    def test_half_open_probe(self):
+        """Test that a single probe is let through after the recovery timeout."""
+        from apps.search.circuit_breaker import CLOSED, HALF_OPEN
+        
+        self.trip()
+        with patch('apps.search.circuit_breaker.time.monotonic', return_value=10 ** 9):
+            self.assertEqual(self.breaker.state, HALF_OPEN)
+            self.assertTrue(self.breaker.allow_request())
+            self.assertFalse(self.breaker.allow_request())
+            self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CLOSED)
+    
+    def test_view_skips_elasticsearch_while_open(self):
+        """Test that searches fall back to the database without calling Elasticsearch."""
+        from rest_framework.test import APIClient
+        from apps.search.cache import search_cache
+        from apps.search.circuit_breaker import elasticsearch_breaker
+        
+        search_cache.clear()
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username='clerk', password='testpassword'))
+        
+        self.addCleanup(elasticsearch_breaker.reset)
+        for _ in range(elasticsearch_breaker.failure_threshold):
+            elasticsearch_breaker.record_failure()
+        with patch('apps.search.views.build_elasticsearch_query') as mock_build:
+            response = client.get('/api/search/advanced/?q=Invoice&use_elasticsearch=true')
+        
+        mock_build.assert_not_called()
+        self.assertEqual(response.data['count'], 0)
+    
+    def test_database_errors_are_not_elasticsearch_errors(self):
+        """Test that a failure after the Elasticsearch request is raised, not counted by the breaker."""
+        from django.db import DatabaseError
+        from rest_framework.test import APIClient
+        from apps.search.cache import search_cache
+        from apps.search.circuit_breaker import CLOSED, elasticsearch_breaker
+        
+        search_cache.clear()
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username='clerk', password='testpassword'))
+        
+        self.addCleanup(elasticsearch_breaker.reset)
+        with patch('apps.search.views.build_elasticsearch_query', return_value=FakeSearch([1, 2])), \
+                patch('apps.search.views.hydrate_documents', side_effect=DatabaseError('database is down')), \
+                patch.object(elasticsearch_breaker, 'record_success') as mock_success, \
+                patch('apps.search.views.advanced_search') as mock_fallback:
+            with self.assertRaises(DatabaseError):
+                client.get('/api/search/advanced/?q=Invoice&use_elasticsearch=true&include_related_details=true')
+        
+        # Only the Elasticsearch request itself went through the breaker
+        mock_success.assert_called_once_with()
+        mock_fallback.assert_not_called()
+        self.assertEqual(elasticsearch_breaker.state, CLOSED)
+
+
+@override_settings(QUERY_BUDGET_MODE='raise')
+class SearchQueryBudgetTestCase(QueryBudgetTestMixin, TemporaryMediaTestCase):
+    """Test cases for the query budgets of the search endpoints."""
+    
+    def setUp(self):
+        """Set up test environment."""
+        from rest_framework.test import APIClient
+        from rest_framework_simplejwt.tokens import RefreshToken
+        
+        self.user = User.objects.create_user(username='clerk', password='testpassword')
+        self.tag = Tag.objects.create(name='invoices')
+        self.create_documents(2)
+        self.client = APIClient()
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+    
+    def create_documents(self, count):
+        """Create tagged documents."""
+        for i in range(count):
+            document = Document.objects.create(
+                title=f'Invoice {i}', uploaded_by=self.user, is_ocr_processed=True,
+                file=SimpleUploadedFile('doc.pdf', b'%PDF-1.4', content_type='application/pdf'),
+            )
+            document.tags.add(self.tag)
+    
+    def search(self, url):
+        """Run a search, bypassing the result cache."""
+        from apps.search.cache import search_cache
+        
+        search_cache.clear()
+        return self.client.get(url)
+    
+    def test_search_within_budget(self):
+        """Test that the search endpoints stay within their budgets."""
+        from apps.search.views import AdvancedSearchView, SearchSuggestionsView
+        
+        with self.assertWithinQueryBudget(AdvancedSearchView, 'get'):
+            response = self.search('/api/search/advanced/?q=invoice&facets=true')
+        self.assertEqual(response.data['count'], 2)
+        
+        with self.assertWithinQueryBudget(SearchSuggestionsView, 'get'):
+            self.client.get('/api/search/suggestions/?q=inv')
+    
+    def test_search_has_no_n_plus_one(self):
+        """Test that tags and uploaders are not loaded once per result."""
+        self.assertConstantQueries(
+            lambda: self.search('/api/search/advanced/?q=invoice'), lambda: self.create_documents(3)
+        )
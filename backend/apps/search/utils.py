@@ -1,7 +1,9 @@
 """Search utilities for advanced document search."""
 
-from django.db.models import Q
-from apps.documents.models import Document, Tag
+from collections import Counter
+from django.db.models import Count, Q
+from django.db.models.functions import TruncMonth
+from apps.documents.models import Document, Tag, Department, Folder
 
 
 def advanced_search(query_params, user=None):
@@ -17,10 +19,10 @@ def advanced_search(query_params, user=None):
     """
     # Start with all documents or user's documents
     # Always include department and folder for better frontend display
+    # (uploaded_by and tags are read by the list serializer for every row)
+    documents = Document.objects.select_related('department', 'folder', 'uploaded_by').prefetch_related('tags')
     if user and not user.is_staff:
-        documents = Document.objects.select_related('department', 'folder').filter(uploaded_by=user)
-    else:
-        documents = Document.objects.select_related('department', 'folder').all()
+        documents = documents.filter(uploaded_by=user)
     
     # Text search (across multiple fields)
     text_query = query_params.get('q', '')
@@ -98,6 +100,72 @@ def advanced_search(query_params, user=None):
     return documents
 
 
+def facet_counts(documents):
+    """
+    Count documents per department, folder, type, OCR status and month.
+    
+    All facets come from a single grouped query over the filtered queryset;
+    the groups are then rolled up per facet in Python.
+    
+    Args:
+        documents: QuerySet of documents, already filtered and scoped
+        
+    Returns:
+        Dictionary mapping each facet to a list of values and counts
+    """
+    rows = documents.order_by().values(
+        'department_id', 'folder_id', 'document_type', 'is_ocr_processed',
+        month=TruncMonth('date'),
+    ).annotate(count=Count('id', distinct=True))
+    
+    counters = {name: Counter() for name in ('department', 'folder', 'document_type', 'is_ocr_processed', 'date')}
+    for row in rows:
+        count = row['count']
+        counters['department'][row['department_id']] += count
+        counters['folder'][row['folder_id']] += count
+        counters['document_type'][row['document_type']] += count
+        counters['is_ocr_processed'][row['is_ocr_processed']] += count
+        counters['date'][row['month'].strftime('%Y-%m') if row['month'] else None] += count
+    
+    return build_facets(**{
+        # Documents without a value are not a facet bucket
+        name: [(value, count) for value, count in counter.most_common() if value is not None]
+        for name, counter in counters.items()
+    })
+
+
+def build_facets(department, folder, document_type, is_ocr_processed, date):
+    """
+    Build the facet response from (value, count) pairs.
+    
+    Department and folder ids are resolved to names; dates are sorted
+    chronologically and the other facets by decreasing count.
+    """
+    department_names = dict(
+        Department.objects.filter(id__in=[value for value, _ in department]).values_list('id', 'name')
+    )
+    folder_names = dict(
+        Folder.objects.filter(id__in=[value for value, _ in folder]).values_list('id', 'name')
+    )
+    
+    def by_count(pairs):
+        return sorted(pairs, key=lambda pair: -pair[1])
+    
+    return {
+        'department': [
+            {'id': value, 'name': department_names.get(value), 'count': count}
+            for value, count in by_count(department)
+        ],
+        'folder': [
+            {'id': value, 'name': folder_names.get(value), 'count': count}
+            for value, count in by_count(folder)
+        ],
+        'document_type': [{'value': value, 'count': count} for value, count in by_count(document_type)],
+        'is_ocr_processed': [{'value': value, 'count': count} for value, count in by_count(is_ocr_processed)],
+        'date': [{'value': value, 'count': count} for value, count in sorted(date)],
+    }
+
+
 def search_suggestions(query, limit=10):
     """
     Get search suggestions based on partial query.
@@ -1,12 +1,25 @@
 """Search views for advanced document search."""
 
+import base64
+import json
+
 from rest_framework import views, status, permissions
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 from django.conf import settings
+from django.core.paginator import Page, Paginator
+from elasticsearch.exceptions import ElasticsearchException
 from apps.documents.serializers.document_serializers import DocumentListSerializer, DocumentSerializer
-from apps.search.utils import advanced_search, search_suggestions
-from apps.search.elasticsearch_utils import elasticsearch_search
+from apps.documents.serializers.values_serializers import DocumentListValuesSerializer
+from apps.search.cache import search_cache
+from apps.search.circuit_breaker import OPEN, CircuitOpenError, elasticsearch_breaker
+from apps.search.utils import advanced_search, facet_counts, search_suggestions
+from apps.search.elasticsearch_utils import (
+    LIST_SOURCE_FIELDS, add_facet_aggregations, build_elasticsearch_query, get_matching_pages,
+    hydrate_documents, parse_facet_aggregations, serialize_hit
+)
 
 
 class DocumentSearchPagination(PageNumberPagination):
@@ -14,6 +27,117 @@ class DocumentSearchPagination(PageNumberPagination):
     page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 100
+    search_after_query_param = 'search_after'
+    _next_search_after = None
+    aggregations = None
+    
+    def paginate_search(self, search, request, view=None):
+        """
+        Paginate an Elasticsearch search inside Elasticsearch itself.
+        
+        Shallow pages use from/size. Pages past the index's max result window
+        use search_after, either from the cursor carried by the previous
+        page's next link or by walking the sorted results up to the offset.
+        The total count is exact thanks to track_total_hits. Every request
+        to Elasticsearch goes through the circuit breaker.
+        
+        Returns:
+            List of raw hit dictionaries for the requested page
+        """
+        page_size = self.get_page_size(request)
+        page_number = request.query_params.get(self.page_query_param, 1)
+        try:
+            page_number = int(page_number)
+            if page_number < 1:
+                raise ValueError
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number, message='That page number is not an integer'
+            ))
+        
+        offset = (page_number - 1) * page_size
+        max_window = getattr(settings, 'ELASTICSEARCH_MAX_RESULT_WINDOW', 10000)
+        search = search.extra(track_total_hits=True)
+        
+        if offset + page_size <= max_window:
+            search = search[offset:offset + page_size]
+        else:
+            search_after = self._decode_search_after(request, offset)
+            if search_after is None:
+                search_after = self._seek(search, offset, max_window)
+            if search_after is None:
+                raise NotFound(self.invalid_page_message.format(
+                    page_number=page_number, message='That page contains no results'
+                ))
+            search = search.extra(size=page_size, search_after=search_after)
+        
+        result = elasticsearch_breaker.call(search.execute).to_dict()
+        hits, total = result['hits']['hits'], result['hits']['total']['value']
+        self.aggregations = result.get('aggregations', {})
+        
+        paginator = Paginator([], page_size)
+        # Django's paginator only needs the count to compute page links
+        paginator.count = total
+        if page_number > paginator.num_pages:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number, message='That page contains no results'
+            ))
+        
+        self.page = Page(hits, page_number, paginator)
+        self.request = request
+        self._next_search_after = None
+        if hits and self.page.has_next() and offset + 2 * page_size > max_window:
+            self._next_search_after = {'offset': offset + page_size, 'sort': hits[-1].get('sort')}
+        return hits
+    
+    def _decode_search_after(self, request, offset):
+        """Return the search_after sort values carried by the request, if valid."""
+        token = request.query_params.get(self.search_after_query_param)
+        if not token:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+        except (ValueError, TypeError):
+            return None
+        if cursor.get('offset') != offset:
+            return None
+        return cursor.get('sort')
+    
+    def _seek(self, search, offset, max_window):
+        """Walk the sorted results with search_after to the sort values before offset."""
+        search = search.source(False).extra(track_total_hits=False)
+        search_after = None
+        skipped = 0
+        while skipped < offset:
+            step = search.extra(size=min(max_window, offset - skipped))
+            if search_after is not None:
+                step = step.extra(search_after=search_after)
+            hits = elasticsearch_breaker.call(step.execute).to_dict()['hits']['hits']
+            if not hits:
+                return None
+            search_after = hits[-1]['sort']
+            skipped += len(hits)
+        return search_after
+    
+    def get_next_link(self):
+        """Add a search_after cursor to the next link when it points past the window."""
+        url = super().get_next_link()
+        if url is None:
+            return None
+        url = remove_query_param(url, self.search_after_query_param)
+        if self._next_search_after:
+            token = base64.urlsafe_b64encode(
+                json.dumps(self._next_search_after).encode('utf-8')
+            ).decode('ascii')
+            url = replace_query_param(url, self.search_after_query_param, token)
+        return url
+    
+    def get_previous_link(self):
+        """Drop any search_after cursor from the previous link."""
+        url = super().get_previous_link()
+        if url is None:
+            return None
+        return remove_query_param(url, self.search_after_query_param)
 
 
 class AdvancedSearchView(views.APIView):
@@ -23,39 +147,114 @@ class AdvancedSearchView(views.APIView):
     permission_classes = [permissions.IsAuthenticated]
     pagination_class = DocumentSearchPagination
     
+    # Maximum queries per request, authentication included (see
+    # config.query_budget): count, page, tags and the facet aggregations
+    query_budget = 6
+    
     def get(self, request):
-        """Perform advanced search on documents."""
+        """Perform advanced search on documents, serving repeated searches from the cache."""
+        # Keyed on the normalized query, the user's visibility scope and the
+        # data generations, so results are dropped as soon as documents change
+        cache_key = search_cache.make_key(request)
+        data = search_cache.get(cache_key)
+        if data is not None:
+            return Response(data)
+        
+        response = self.search(request)
+        search_cache.set(cache_key, response.data)
+        return response
+    
+    def search(self, request):
+        """Run the search and build the paginated response."""
         # Check if we should use Elasticsearch
         use_elasticsearch = request.query_params.get('use_elasticsearch', '').lower() == 'true'
         use_es = hasattr(settings, 'ELASTICSEARCH_DSL') and use_elasticsearch
         
-        # Try Elasticsearch first if requested
-        if use_es:
-            try:
-                documents = elasticsearch_search(request.query_params, request.user)
-            except Exception as e:
-                # If Elasticsearch fails, fall back to regular search
-                print(f"Elasticsearch error: {str(e)}")
-                documents = advanced_search(request.query_params, request.user)
-        else:
-            # Use regular search
-            documents = advanced_search(request.query_params, request.user)
-        
         # Check if we need to include related details
         include_related = request.query_params.get('include_related_details', '').lower() == 'true'
         serializer_class = DocumentSerializer if include_related else DocumentListSerializer
         
-        # Paginate results
+        # Facet counts are computed for the same filters and user scope
+        include_facets = request.query_params.get('facets', '').lower() == 'true'
+        
         paginator = self.pagination_class()
-        page = paginator.paginate_queryset(documents, request, view=self)
+        
+        # Skip Elasticsearch entirely while the circuit breaker is open,
+        # instead of waiting for a timeout on every request. Only the
+        # requests to Elasticsearch go through the breaker: errors of the
+        # database or of the serialization are not Elasticsearch's.
+        if use_es and elasticsearch_breaker.state != OPEN:
+            try:
+                return self.search_elasticsearch(
+                    request, paginator, serializer_class, include_related, include_facets
+                )
+            except CircuitOpenError:
+                pass
+            except ElasticsearchException as e:
+                # If Elasticsearch fails, fall back to regular search
+                print(f"Elasticsearch error: {str(e)}")
+        
+        # Use regular search
+        documents = advanced_search(request.query_params, request.user)
+        
+        # List results are rendered from values() rows (same output as
+        # DocumentListSerializer, without model instances)
+        if serializer_class is DocumentListSerializer:
+            values_serializer = DocumentListValuesSerializer()
+            page = paginator.paginate_queryset(values_serializer.get_queryset(documents), request, view=self)
+            data = values_serializer.render(page) if page is not None else None
+        else:
+            page = paginator.paginate_queryset(documents, request, view=self)
+            data = serializer_class(page, many=True, context={'request': request}).data if page is not None else None
         
         if page is not None:
-            serializer = serializer_class(page, many=True, context={'request': request})
-            return paginator.get_paginated_response(serializer.data)
+            response = paginator.get_paginated_response(data)
+            if include_facets:
+                response.data['facets'] = facet_counts(documents)
+            return response
         
         # If no pagination, return all results
         serializer = serializer_class(documents, many=True, context={'request': request})
         return Response(serializer.data)
+    
+    def search_elasticsearch(self, request, paginator, serializer_class, include_related, include_facets):
+        """
+        Run the search in Elasticsearch and build the paginated response.
+        
+        Pagination happens inside Elasticsearch; list results are rendered
+        straight from the _source, only the detailed representation needs
+        the database.
+        """
+        serve_from_source = not include_related and getattr(settings, 'ELASTICSEARCH_SERVE_FROM_SOURCE', True)
+        search = build_elasticsearch_query(request.query_params, request.user)
+        search = search.source(LIST_SOURCE_FIELDS if serve_from_source else False)
+        if include_facets:
+            # Aggregations run in the same request as the page of hits
+            search = add_facet_aggregations(search)
+        hits = paginator.paginate_search(search, request, view=self)
+        
+        if serve_from_source:
+            data = [serialize_hit(hit['_source']) for hit in hits]
+        else:
+            documents = hydrate_documents([int(hit['_id']) for hit in hits])
+            if serializer_class is DocumentListSerializer:
+                values_serializer = DocumentListValuesSerializer()
+                data = values_serializer.render(values_serializer.get_queryset(documents))
+            else:
+                data = serializer_class(documents, many=True, context={'request': request}).data
+        
+        # Report the OCR pages where the text query matched
+        matching_pages = {
+            int(hit['_id']): get_matching_pages(hit) for hit in hits if 'inner_hits' in hit
+        }
+        for item in data:
+            if item['id'] in matching_pages:
+                item['matching_pages'] = matching_pages[item['id']]
+        
+        response = paginator.get_paginated_response(data)
+        if include_facets:
+            response.data['facets'] = parse_facet_aggregations(paginator.aggregations)
+        return response
 
 
 class SearchSuggestionsView(views.APIView):
@@ -64,6 +263,9 @@ class SearchSuggestionsView(views.APIView):
     """
     permission_classes = [permissions.IsAuthenticated]
     
+    # Maximum queries per request, authentication included (see config.query_budget)
+    query_budget = 4
+    
     def get(self, request):
         """Get search suggestions based on a partial query."""
         query = request.query_params.get('q', '')
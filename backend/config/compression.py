@@ -0,0 +1,166 @@
+"""Negotiated gzip and brotli compression of responses.
+
+``CompressionMiddleware`` compresses text responses (JSON, OCR text,
+CSV exports...) with the best encoding the client accepts: brotli when
+the ``brotli`` package is installed, gzip otherwise. Responses smaller
+than ``COMPRESSION_MIN_SIZE`` bytes are left alone, and streaming
+responses are compressed chunk by chunk as they are sent.
+
+Media that is already compressed (PDFs, images, Excel files...) is not
+compressed again. Neither are file downloads: they advertise byte
+ranges, which must refer to the file itself, and are often sent by the
+front proxy (X-Accel-Redirect / X-Sendfile) with an empty body.
+"""
+
+import gzip
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    'text/',
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'application/xhtml+xml',
+    'application/problem+json',
+    'image/svg+xml',
+)
+
+SENDFILE_HEADERS = ('X-Accel-Redirect', 'X-Sendfile')
+
+
+def is_compressible(content_type):
+    """Tell whether a content type is worth compressing (text, not compressed media)."""
+    media_type = content_type.split(';')[0].strip().lower()
+    return media_type.startswith(COMPRESSIBLE_TYPES) or media_type.endswith(('+json', '+xml'))
+
+
+def parse_accept_encoding(header):
+    """
+    Parse an Accept-Encoding header.
+
+    Returns:
+        dict mapping each coding (lowercase, '*' included) to its q-value
+    """
+    codings = {}
+    for item in (header or '').split(','):
+        coding, _, params = item.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        codings[coding] = quality
+    return codings
+
+
+def select_encoding(header):
+    """
+    Return the encoding to compress a response with, or None.
+
+    Brotli is preferred when available and accepted with the same
+    preference as gzip.
+    """
+    codings = parse_accept_encoding(header)
+    available = ['br', 'gzip'] if brotli is not None else ['gzip']
+    best, best_quality = None, 0.0
+    for coding in available:
+        quality = codings.get(coding, codings.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def brotli_sequence(sequence, quality):
+    """Compress a sequence of byte chunks with brotli, flushing after every chunk like compress_sequence."""
+    compressor = brotli.Compressor(quality=quality)
+    for item in sequence:
+        data = compressor.process(item) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class CompressionMiddleware:
+    """
+    Middleware compressing text responses with gzip or brotli.
+
+    See the module docstring for what is compressed. Settings:
+    ``COMPRESSION_MIN_SIZE`` (bytes), ``COMPRESSION_GZIP_LEVEL`` and
+    ``COMPRESSION_BROTLI_QUALITY``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not self.should_compress(response):
+            return response
+
+        # The response depends on Accept-Encoding even when sent uncompressed
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = select_encoding(request.headers.get('Accept-Encoding'))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                return response
+            if response.has_header('Content-Length') and int(response['Content-Length']) < self.min_size():
+                return response
+            response.streaming_content = self.compress_stream(response.streaming_content, encoding)
+            del response['Content-Length']
+        else:
+            if len(response.content) < self.min_size():
+                return response
+            compressed = self.compress(response.content, encoding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        # The compressed bytes differ from the uncompressed representation
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
+
+    def should_compress(self, response):
+        """Tell whether a response may be compressed, whatever the client accepts."""
+        if response.status_code != 200 or response.has_header('Content-Encoding'):
+            return False
+        if response.has_header('Content-Range') or response.get('Accept-Ranges', 'none') != 'none':
+            return False
+        if any(response.has_header(header) for header in SENDFILE_HEADERS):
+            return False
+        return is_compressible(response.get('Content-Type', ''))
+
+    def min_size(self):
+        return getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+
+    def compress(self, content, encoding):
+        """Compress a whole response body."""
+        if encoding == 'br':
+            return brotli.compress(content, quality=getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 4))
+        return gzip.compress(content, compresslevel=getattr(settings, 'COMPRESSION_GZIP_LEVEL', 6), mtime=0)
+
+    def compress_stream(self, sequence, encoding):
+        """Compress a streaming response body chunk by chunk."""
+        if encoding == 'br':
+            return brotli_sequence(sequence, getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 4))
+        return compress_sequence(sequence)
@@ -0,0 +1,207 @@
+"""Per-endpoint database query budgets.
+
+API views declare how many queries a request may run with a
+``query_budget`` attribute: either an int, or a dict keyed by viewset
+action (or by lowercase HTTP method for plain API views), where ``'*'``
+covers the actions not listed. Budgets count every query of the request,
+authentication and middleware included.
+
+``QueryBudgetMiddleware`` counts the queries of each request and, depending
+on ``QUERY_BUDGET_MODE``, logs (``'log'``) or raises (``'raise'``) when an
+endpoint goes over its budget. ``QueryBudgetTestMixin`` checks the same
+budgets, and the absence of N+1 queries, from the test suite.
+"""
+
+import threading
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext
+
+QUERY_COUNT_HEADER = 'X-Query-Count'
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised in 'raise' mode when a request runs more queries than its budget."""
+
+
+def get_query_budget(view_class, action):
+    """
+    Return the query budget a view declares for an action.
+
+    Args:
+        view_class: APIView or ViewSet class
+        action: Viewset action name, or lowercase HTTP method
+
+    Returns:
+        int budget, or None when the view declares none
+    """
+    budget = getattr(view_class, 'query_budget', None)
+    if isinstance(budget, dict):
+        return budget.get(action, budget.get('*'))
+    return budget
+
+
+def resolve_endpoint(request, view_func):
+    """
+    Return the (view class, action) a DRF view function serves for a request.
+
+    Returns:
+        (view_class, action), or (None, None) for non-DRF views
+    """
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return None, None
+    method = request.method.lower()
+    actions = getattr(view_func, 'actions', None)
+    if actions:
+        return view_class, actions.get(method, method)
+    return view_class, method
+
+
+class QueryCounter:
+    """Database execute wrapper counting the queries run through it."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class QueryStats:
+    """Thread-safe per-endpoint query statistics of this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, endpoint, count, budget):
+        """Record the query count of one request."""
+        with self._lock:
+            stats = self._stats.setdefault(endpoint, {
+                'requests': 0, 'queries': 0, 'max': 0, 'over_budget': 0, 'budget': budget,
+            })
+            stats['requests'] += 1
+            stats['queries'] += count
+            stats['max'] = max(stats['max'], count)
+            if budget is not None and count > budget:
+                stats['over_budget'] += 1
+
+    def snapshot(self):
+        """Return a copy of the statistics, keyed by endpoint."""
+        with self._lock:
+            return {endpoint: dict(stats) for endpoint, stats in self._stats.items()}
+
+    def clear(self):
+        """Forget every recorded request."""
+        with self._lock:
+            self._stats.clear()
+
+
+query_stats = QueryStats()
+
+
+def get_mode():
+    """Return the configured mode: 'off', 'log' or 'raise'."""
+    return getattr(settings, 'QUERY_BUDGET_MODE', 'off')
+
+
+class QueryBudgetMiddleware:
+    """
+    Middleware counting the database queries of every API request.
+
+    The count is recorded per endpoint in ``query_stats`` and returned in
+    the ``X-Query-Count`` header; requests over the budget their view
+    declares are logged, or fail in 'raise' mode (meant for development
+    and CI). Nothing is counted when ``QUERY_BUDGET_MODE`` is 'off'.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = get_mode()
+        if mode == 'off':
+            return self.get_response(request)
+
+        counter = QueryCounter()
+        request._query_budget_endpoint = (None, None)
+        with ExitStack() as stack:
+            for conn in connections.all():
+                stack.enter_context(conn.execute_wrapper(counter))
+            response = self.get_response(request)
+
+        view_class, action = request._query_budget_endpoint
+        if view_class is None:
+            return response
+
+        budget = get_query_budget(view_class, action)
+        endpoint = f"{view_class.__name__}.{action}"
+        query_stats.record(endpoint, counter.count, budget)
+        response[QUERY_COUNT_HEADER] = str(counter.count)
+
+        if budget is not None and counter.count > budget:
+            message = (
+                f"Query budget exceeded: {request.method} {request.path} ({endpoint}) "
+                f"ran {counter.count} queries, budget is {budget}"
+            )
+            if mode == 'raise':
+                raise QueryBudgetExceeded(message)
+            print(message)
+
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        """Remember which view and action serve the request."""
+        if hasattr(request, '_query_budget_endpoint'):
+            request._query_budget_endpoint = resolve_endpoint(request, view_func)
+        return None
+
+
+class QueryBudgetTestMixin:
+    """TestCase mixin checking query budgets and detecting N+1 queries."""
+
+    @contextmanager
+    def assertWithinQueryBudget(self, view_class, action):
+        """
+        Fail if the block runs more queries than the view's budget for an action.
+
+        Usage:
+            with self.assertWithinQueryBudget(DocumentViewSet, 'list'):
+                self.client.get('/api/documents/')
+        """
+        budget = get_query_budget(view_class, action)
+        self.assertIsNotNone(budget, f"{view_class.__name__} declares no query budget for '{action}'")
+        with CaptureQueriesContext(connection) as context:
+            yield context
+        self.assertLessEqual(
+            len(context), budget,
+            f"{view_class.__name__}.{action} ran {len(context)} queries, budget is {budget}:\n"
+            + '\n'.join(query['sql'] for query in context.captured_queries)
+        )
+
+    def assertConstantQueries(self, request, add_rows):
+        """
+        Fail if a request runs more queries once more rows are returned.
+
+        Args:
+            request: Callable performing the request under test
+            add_rows: Callable creating more rows for the request to return
+        """
+        # Each request is run once beforehand, so that reloads of cached
+        # data invalidated by the new rows are not counted
+        request()
+        with CaptureQueriesContext(connection) as before:
+            request()
+        add_rows()
+        request()
+        with CaptureQueriesContext(connection) as after:
+            request()
+        self.assertEqual(
+            len(after), len(before),
+            f"Query count grew from {len(before)} to {len(after)} with more rows (N+1):\n"
+            + '\n'.join(query['sql'] for query in after.captured_queries)
+        )
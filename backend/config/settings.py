@@ -58,7 +58,9 @@ LOCAL_APPS = [
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
+    'config.query_budget.QueryBudgetMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'config.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -101,6 +103,12 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Cache shared by every process: the search cache and the metadata tree
+# are invalidated through it, so a process-local backend serves stale data
+CACHES = {
+    'default': env.cache('CACHE_URL', default='redis://localhost:6379/1'),
+}
+
 # Database
 DATABASES = {
     'default': {
@@ -140,6 +148,17 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Store document files once per distinct content, under their SHA-256
+# (see documents.storage); files stored before are moved by the
+# migrate_document_files command
+DOCUMENTS_CONTENT_ADDRESSED = env.bool('DOCUMENTS_CONTENT_ADDRESSED', default=True)
+
+# Document downloads handed to the front proxy (see documents.utils.download_utils):
+# None to serve files from Django, 'nginx' (X-Accel-Redirect to an internal
+# location aliasing MEDIA_ROOT at SENDFILE_URL_PREFIX), 'apache' or 'lighttpd' (X-Sendfile)
+SENDFILE_BACKEND = env('SENDFILE_BACKEND', default=None)
+SENDFILE_URL_PREFIX = env('SENDFILE_URL_PREFIX', default='/protected-media/')
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -147,10 +166,27 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'authentication.User'
 
 # REST Framework
+# JSON encoding and decoding of API requests and responses: 'orjson' (see
+# config.renderers; falls back to the json module when orjson is missing)
+# or 'json' for DRF's own renderer and parser
+API_JSON_BACKEND = env('API_JSON_BACKEND', default='orjson')
+JSON_RENDERER, JSON_PARSER = {
+    'orjson': ('config.renderers.ORJSONRenderer', 'config.renderers.ORJSONParser'),
+}.get(API_JSON_BACKEND, ('rest_framework.renderers.JSONRenderer', 'rest_framework.parsers.JSONParser'))
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        JSON_RENDERER,
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        JSON_PARSER,
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
@@ -181,6 +217,36 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+# Print diagnostics (with extra count queries) for department/folder filters
+DOCUMENTS_DEBUG_FILTERS = env.bool('DOCUMENTS_DEBUG_FILTERS', default=False)
+
+# Bulk upload (see DocumentViewSet.bulk_upload)
+BULK_UPLOAD_MAX_FILES = env.int('BULK_UPLOAD_MAX_FILES', default=500)
+DATA_UPLOAD_MAX_NUMBER_FILES = BULK_UPLOAD_MAX_FILES
+
+# Bulk tag, move and delete (see DocumentViewSet.bulk_tag)
+BULK_OPERATION_MAX_DOCUMENTS = env.int('BULK_OPERATION_MAX_DOCUMENTS', default=5000)
+
+# Resumable chunked uploads (see DocumentViewSet.upload): partial files are
+# kept in UPLOAD_TEMP_DIR until finalized, or deleted by the
+# cleanup_upload_sessions command once idle for UPLOAD_SESSION_EXPIRY seconds
+UPLOAD_TEMP_DIR = env('UPLOAD_TEMP_DIR', default=str(BASE_DIR / 'upload_sessions'))
+UPLOAD_SESSION_EXPIRY = env.int('UPLOAD_SESSION_EXPIRY', default=24 * 3600)
+UPLOAD_CHUNK_MAX_SIZE = env.int('UPLOAD_CHUNK_MAX_SIZE', default=16 * 1024 * 1024)
+UPLOAD_MAX_SIZE = env.int('UPLOAD_MAX_SIZE', default=2 * 1024 ** 3)
+
+# Negotiated gzip/brotli compression of text responses (see config.compression)
+COMPRESSION_MIN_SIZE = env.int('COMPRESSION_MIN_SIZE', default=1024)
+COMPRESSION_GZIP_LEVEL = env.int('COMPRESSION_GZIP_LEVEL', default=6)
+COMPRESSION_BROTLI_QUALITY = env.int('COMPRESSION_BROTLI_QUALITY', default=4)
+
+# Maximum number of OCR text pages returned by one ocr_text?pages= request
+OCR_TEXT_MAX_PAGES = env.int('OCR_TEXT_MAX_PAGES', default=20)
+
+# Per-endpoint query budgets declared on the API views (see config.query_budget):
+# 'off', 'log' to print requests over budget, or 'raise' to fail them
+QUERY_BUDGET_MODE = env('QUERY_BUDGET_MODE', default='off')
+
 # DRF Spectacular (API documentation)
 SPECTACULAR_SETTINGS = {
     'TITLE': 'MAFCI DigiArchive API',
@@ -194,11 +260,55 @@ TESSERACT_CMD = env('TESSERACT_CMD', default='tesseract')
 # OpenAI
 OPENAI_API_KEY = env('OPENAI_API_KEY', default='')
 
+# Similar documents index (see apps.ai.similarity)
+SIMILARITY_INDEX_PATH = env('SIMILARITY_INDEX_PATH', default=os.path.join(BASE_DIR, 'similarity_index.npz'))
+SIMILARITY_FEATURES = env.int('SIMILARITY_FEATURES', default=2 ** 15)
+SIMILARITY_DIMENSIONS = env.int('SIMILARITY_DIMENSIONS', default=100)
+SIMILARITY_SAMPLE_SIZE = env.int('SIMILARITY_SAMPLE_SIZE', default=5000)
+SIMILARITY_NPROBE = env.int('SIMILARITY_NPROBE', default=8)
+
+# Estimated Jaccard similarity of OCR texts above which a document is
+# flagged as a near-duplicate (see apps.ai.dedup)
+DEDUP_THRESHOLD = env.float('DEDUP_THRESHOLD', default=0.8)
+
 # Elasticsearch settings
 ELASTICSEARCH_DSL = {
     'default': {
         'hosts': env('ELASTICSEARCH_HOST', default='localhost:9200'),
         'use_ssl': env('ELASTICSEARCH_USE_SSL', default=False),
         'verify_certs': env('ELASTICSEARCH_VERIFY_CERTS', default=False),
+        # Pooled connections with short timeouts: a slow cluster must not
+        # hold request workers
+        'timeout': env.int('ELASTICSEARCH_TIMEOUT', default=10),
+        'max_retries': env.int('ELASTICSEARCH_MAX_RETRIES', default=1),
+        'retry_on_timeout': env.bool('ELASTICSEARCH_RETRY_ON_TIMEOUT', default=False),
+        'maxsize': env.int('ELASTICSEARCH_POOL_SIZE', default=25),
     },
 }
+
+# Timeout of search requests, and circuit breaker skipping Elasticsearch
+# after consecutive failures until a probe request succeeds again
+ELASTICSEARCH_SEARCH_TIMEOUT = env.int('ELASTICSEARCH_SEARCH_TIMEOUT', default=3)
+ELASTICSEARCH_BREAKER_FAILURE_THRESHOLD = env.int('ELASTICSEARCH_BREAKER_FAILURE_THRESHOLD', default=5)
+ELASTICSEARCH_BREAKER_RECOVERY_TIMEOUT = env.int('ELASTICSEARCH_BREAKER_RECOVERY_TIMEOUT', default=30)
+
+# Queue index updates and flush them in bulk from a Celery task instead of
+# round-tripping to Elasticsearch inside every save()
+ELASTICSEARCH_DSL_SIGNAL_PROCESSOR = 'apps.search.signals.QueuedSignalProcessor'
+ELASTICSEARCH_INDEX_CHUNK_SIZE = env.int('ELASTICSEARCH_INDEX_CHUNK_SIZE', default=500)
+
+# Render search list results from the Elasticsearch _source instead of
+# re-loading every hit from the database
+ELASTICSEARCH_SERVE_FROM_SOURCE = env.bool('ELASTICSEARCH_SERVE_FROM_SOURCE', default=True)
+
+# Pages past this offset are fetched with search_after instead of from/size
+# (must match the index's index.max_result_window)
+ELASTICSEARCH_MAX_RESULT_WINDOW = env.int('ELASTICSEARCH_MAX_RESULT_WINDOW', default=10000)
+
+# Full OCR text is indexed as per-page chunks of at most this many characters
+ELASTICSEARCH_OCR_CHUNK_SIZE = env.int('ELASTICSEARCH_OCR_CHUNK_SIZE', default=2000)
+ELASTICSEARCH_MATCHING_PAGES_LIMIT = env.int('ELASTICSEARCH_MATCHING_PAGES_LIMIT', default=20)
+
+# Per-process cache of search responses, invalidated on any document change
+SEARCH_CACHE_MAX_ENTRIES = env.int('SEARCH_CACHE_MAX_ENTRIES', default=512)
+SEARCH_CACHE_TTL = env.int('SEARCH_CACHE_TTL', default=300)
@@ -0,0 +1,37 @@
+"""Base test case for tests saving files."""
+
+import os
+import shutil
+import tempfile
+
+from django.test import TestCase, override_settings
+
+
+class TemporaryMediaTestCase(TestCase):
+    """
+    TestCase storing uploaded files in a temporary MEDIA_ROOT.
+
+    Documents created by the tests save their files through the document
+    storage: without this, they would land in the real media directory and
+    outlive the rolled back rows referencing them. The files of each test
+    are removed after it, and the directory after the class.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp(prefix='test_media_')
+        cls.addClassCleanup(shutil.rmtree, cls.media_root, ignore_errors=True)
+        media_override = override_settings(MEDIA_ROOT=cls.media_root)
+        media_override.enable()
+        cls.addClassCleanup(media_override.disable)
+        super().setUpClass()
+
+    def tearDown(self):
+        """Remove the files saved by the test."""
+        super().tearDown()
+        for name in os.listdir(self.media_root):
+            path = os.path.join(self.media_root, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.remove(path)
@@ -1,43 +1,103 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef, useCallback } from 'react';
 
 interface OCRTextProps {
   documentId: number;
   apiBaseUrl?: string;
 }
 
+interface OCRPage {
+  page: number;
+  text: string;
+}
+
+interface OCRPagesResponse {
+  page_count: number;
+  text_length: number;
+  processed_at: string;
+  pages: OCRPage[];
+}
+
+// Pages requested at once (the API returns at most OCR_TEXT_MAX_PAGES)
+const PAGE_WINDOW = 10;
+
 const DocumentOCRView: React.FC<OCRTextProps> = ({ documentId, apiBaseUrl = '/api' }) => {
-  const [ocrText, setOcrText] = useState<string>('');
+  const [pages, setPages] = useState<OCRPage[]>([]);
+  const [pageCount, setPageCount] = useState<number>(0);
+  const [textLength, setTextLength] = useState<number>(0);
+  const [hasMore, setHasMore] = useState<boolean>(false);
   const [loading, setLoading] = useState<boolean>(true);
+  const [loadingMore, setLoadingMore] = useState<boolean>(false);
   const [error, setError] = useState<string | null>(null);
   const [isProcessing, setIsProcessing] = useState<boolean>(false);
+  const scrollRef = useRef<HTMLDivElement>(null);
+  const sentinelRef = useRef<HTMLDivElement>(null);
+  // Responses to requests made for another document (or before a reload) are ignored
+  const requestRef = useRef<number>(0);
+
+  // Fetch a window of pages of the OCR text
+  const fetchPages = async (firstPage: number): Promise<OCRPagesResponse> => {
+    const lastPage = firstPage + PAGE_WINDOW - 1;
+    const response = await fetch(`${apiBaseUrl}/documents/${documentId}/ocr_text/?pages=${firstPage}-${lastPage}`, {
+      headers: {
+        'Authorization': `Bearer ${localStorage.getItem('auth_token') || ''}`,
+        'Content-Type': 'application/json'
+      }
+    });
+    
+    if (!response.ok) {
+      throw new Error(`HTTP error ${response.status}`);
+    }
+    
+    return response.json();
+  };
 
-  // Fetch OCR text
+  // Fetch the first pages of the OCR text
   const fetchOCRText = async () => {
+    const request = ++requestRef.current;
     setLoading(true);
     try {
-      const response = await fetch(`${apiBaseUrl}/documents/${documentId}/ocr_text/`, {
-        headers: {
-          'Authorization': `Bearer ${localStorage.getItem('auth_token') || ''}`,
-          'Content-Type': 'application/json'
-        }
-      });
-      
-      if (!response.ok) {
-        throw new Error(`HTTP error ${response.status}`);
-      }
-      
-      const data = await response.json();
-      setOcrText(data.full_text);
+      const data = await fetchPages(1);
+      if (request !== requestRef.current) return;
+      setPages(data.pages);
+      setPageCount(data.page_count);
+      setTextLength(data.text_length);
+      setHasMore(data.pages.length > 0 && data.pages.length < data.page_count);
       setError(null);
     } catch (err: any) {
+      if (request !== requestRef.current) return;
       console.error('OCR fetch error:', err);
       setError('Failed to load OCR data. It may not be available for this document.');
-      setOcrText('');
+      setPages([]);
+      setHasMore(false);
     } finally {
-      setLoading(false);
+      if (request === requestRef.current) {
+        setLoading(false);
+      }
     }
   };
 
+  // Fetch the next pages, when the end of the loaded text is scrolled into view
+  const fetchMorePages = useCallback(async () => {
+    if (loadingMore || !hasMore || pages.length === 0) return;
+    const request = requestRef.current;
+    setLoadingMore(true);
+    try {
+      const data = await fetchPages(pages[pages.length - 1].page + 1);
+      if (request !== requestRef.current) return;
+      const loaded = pages.length + data.pages.length;
+      setPages(previous => [...previous, ...data.pages]);
+      setHasMore(data.pages.length > 0 && loaded < data.page_count);
+    } catch (err: any) {
+      if (request !== requestRef.current) return;
+      console.error('OCR pages fetch error:', err);
+      setHasMore(false);
+    } finally {
+      if (request === requestRef.current) {
+        setLoadingMore(false);
+      }
+    }
+  }, [documentId, apiBaseUrl, pages, hasMore, loadingMore]);
+
   // Process OCR
   const processOCR = async () => {
     setIsProcessing(true);
@@ -71,6 +131,21 @@ const DocumentOCRView: React.FC<OCRTextProps> = ({ documentId, apiBaseUrl = '/ap
     }
   }, [documentId]);
 
+  // Also loads the next pages when the first ones don't fill the view
+  useEffect(() => {
+    if (!hasMore || !scrollRef.current || !sentinelRef.current) return;
+    const observer = new IntersectionObserver(
+      entries => {
+        if (entries.some(entry => entry.isIntersecting)) {
+          fetchMorePages();
+        }
+      },
+      { root: scrollRef.current, rootMargin: '200px' }
+    );
+    observer.observe(sentinelRef.current);
+    return () => observer.disconnect();
+  }, [loading, hasMore, fetchMorePages]);
+
   return (
     <div className="mt-2">
       {loading ? (
@@ -117,9 +192,24 @@ const DocumentOCRView: React.FC<OCRTextProps> = ({ documentId, apiBaseUrl = '/ap
           )}
         </div>
       ) : (
-        <div className="p-4 bg-gray-50 rounded-md overflow-auto max-h-72">
-          <pre className="text-xs text-gray-700 whitespace-pre-wrap font-mono">{ocrText || 'Aucun texte n\'a été extrait lors du traitement OCR.'}</pre>
-          {ocrText && <p className="mt-3 text-xs text-gray-500">Le traitement OCR a extrait {ocrText.split(' ').length} mots.</p>}
+        <div ref={scrollRef} className="p-4 bg-gray-50 rounded-md overflow-auto max-h-72">
+          {pages.length === 0 ? (
+            <pre className="text-xs text-gray-700 whitespace-pre-wrap font-mono">Aucun texte n'a été extrait lors du traitement OCR.</pre>
+          ) : (
+            pages.map(page => (
+              <div key={page.page} className="mb-3">
+                {pageCount > 1 && <p className="text-xs font-semibold text-gray-500 mb-1">Page {page.page}</p>}
+                <pre className="text-xs text-gray-700 whitespace-pre-wrap font-mono">{page.text}</pre>
+              </div>
+            ))
+          )}
+          <div ref={sentinelRef} />
+          {loadingMore && <p className="text-xs text-gray-500">Chargement des pages suivantes...</p>}
+          {pages.length > 0 && (
+            <p className="mt-3 text-xs text-gray-500">
+              Le traitement OCR a extrait {textLength} caractères sur {pageCount} page{pageCount > 1 ? 's' : ''}.
+            </p>
+          )}
         </div>
       )}
     </div>
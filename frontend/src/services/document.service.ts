@@ -37,8 +37,10 @@ export interface Document {
   is_ocr_processed?: boolean;
   ocr_data?: {
     id: number;
-    full_text: string;
+    page_count: number;
+    text_length: number;
     processed_at: string;
+    updated_at: string;
   };
   status?: string;
 }
@@ -10,8 +10,10 @@ export interface Tag {
 
 export interface OCRData {
   id: number;
-  full_text: string;
+  page_count: number;
+  text_length: number;
   processed_at: string;
+  updated_at: string;
 }
 
 export interface Document {